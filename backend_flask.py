@@ -1,8 +1,15 @@
-from flask import Flask, jsonify
-import random
+from flask import Flask, Response, jsonify, request
+import itertools
+import os
+import threading
+
+from quote_cache import PayloadCache, encode, make_payload
+from quote_sampling import BagState, bag_draw
+from quote_store import QuoteStore, create_store
 
 app = Flask(__name__)
 
+# Seed for a new store; point QUOTES_DB at a bigger one built with quote_store.py
 quotes = [
     "Discipline is stronger than motivation.",
     "Code, sleep, repeat.",
@@ -10,13 +17,216 @@ quotes = [
     "Never stop learning."
 ]
 
+QUOTES_DB = os.environ.get("QUOTES_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "quotes.db"))
+store = None  # Opened by open_store(): at server startup, or else by the first request
+store_lock = threading.Lock()
+
+# QUOTES_CACHE=0 serves every response through jsonify, for comparison
+app.config["PAYLOAD_CACHE"] = os.environ.get("QUOTES_CACHE", "1") != "0"
+payloads = PayloadCache()
+HOME = {"message": "Welcome to your first backend!"}
+HOME_PAYLOAD = make_payload(HOME)
+
+MAX_BATCH = 1000  # Most quotes /quotes?n= returns; /quotes/stream has no such need
+MAX_STREAM = 10_000_000
+STREAM_CHUNK = 500  # Quotes fetched and written per step of a stream
+MAX_INT = 2**63 - 1  # Largest integer SQLite can take as a parameter
+
+# How /quotes picks: uniformly, in proportion to each quote's weight, or
+# from the client's shuffle bag (no repeats until every quote has been seen)
+MODES = ("uniform", "weighted", "bag")
+BAG_COOKIE = "quote_bag"
+
+
+def open_store():
+    """Open QUOTES_DB, writing the seed quotes to it first if there is no such file"""
+    global store
+    with store_lock:
+        if store is None:
+            if not os.path.exists(QUOTES_DB):
+                create_store(QUOTES_DB, ((quote, "") for quote in quotes))
+            store = QuoteStore(QUOTES_DB)
+    return store
+
+
+class BadRequest(Exception):
+    pass
+
+
+@app.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({"error": str(error)}), 400
+
+
+class NotFound(Exception):
+    pass
+
+
+@app.errorhandler(NotFound)
+def not_found(error):
+    return jsonify({"error": str(error)}), 404
+
+
+def require_weights():
+    # Stores imported before weights were checked may have none to draw by
+    if store.max_id and store.weighted_sampler() is None:
+        raise NotFound("no quote has a weight above zero")
+
+
+def int_arg(name, default):
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be a whole number")
+    if value < 0:
+        raise BadRequest(f"{name} must not be negative")
+    if value > MAX_INT:
+        raise BadRequest(f"{name} is too large")
+    return value
+
+
+def page_response(results, next_after):
+    return jsonify({"results": [quote_json(quote) for quote in results], "next": next_after})
+
+
+def quote_json(quote):
+    return {"quote": quote["text"], "id": quote["id"], "author": quote["author"]}
+
+
+def cached_response(payload, cache_control):
+    """Send a pre-serialized payload, or an empty 304 if the client already has it"""
+    # If-None-Match compares weakly, so W/"..." from a proxy still matches
+    if request.if_none_match.contains_weak(payload.etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload.body, mimetype="application/json")
+    response.set_etag(payload.etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def quote_response(quote_id, cache_control):
+    """Response for one quote, or None if there is no such quote"""
+    def build():
+        quote = store.get(quote_id)
+        return quote_json(quote) if quote else None
+
+    if not app.config["PAYLOAD_CACHE"]:
+        body = build()
+        return jsonify(body) if body else None
+    payload = payloads.get(quote_id, build, store.generation)
+    return cached_response(payload, cache_control) if payload else None
+
+
+def mode_arg(modes=MODES):
+    mode = request.args.get("mode", "uniform")
+    if mode not in modes:
+        raise BadRequest(f"mode must be one of {', '.join(modes)}")
+    return mode
+
+
+def draw_ids(mode, count):
+    """Ids of `count` quotes drawn by `mode`, and the client's new bag in bag mode"""
+    if not store.max_id:
+        return [], None
+    if mode == "uniform":
+        return [store.random_id() for _ in range(count)], None
+    if mode == "weighted":
+        require_weights()
+        return [store.weighted_id() for _ in range(count)], None
+    # The bag travels with the client: ?bag= or the cookie set last time
+    bag = BagState.parse(request.args.get("bag") or request.cookies.get(BAG_COOKIE))
+    ids = []
+    for _ in range(count):
+        index, bag = bag_draw(bag, store.max_id)
+        ids.append(index + 1)
+    return ids, bag
+
+
+@app.before_request
+def notice_new_corpus():
+    (open_store() if store is None else store).refresh()  # Not `store or`: len() counts every row
+
+
 @app.route('/')
 def home():
-    return jsonify({"message": "Welcome to your first backend!"})
+    if not app.config["PAYLOAD_CACHE"]:
+        return jsonify(HOME)
+    return cached_response(HOME_PAYLOAD, "public, max-age=86400")
 
 @app.route('/quotes')
 def get_quote():
-    return jsonify({"quote": random.choice(quotes)})
+    mode = mode_arg()
+    if "n" in request.args:
+        n = int_arg("n", 1)
+        if not 1 <= n <= MAX_BATCH:
+            raise BadRequest(f"n must be between 1 and {MAX_BATCH}; use /quotes/stream for more")
+        ids, bag = draw_ids(mode, n)
+        response = jsonify({"quotes": [quote_json(quote) for quote in store.get_many(ids)]})
+    else:
+        # A new quote every time, so caches must ask again (and may get a 304)
+        ids, bag = draw_ids(mode, 1)
+        response = quote_response(ids[0], "no-cache") if ids else None
+        if response is None:
+            return jsonify({"error": "no quotes"}), 404
+    if bag is not None:
+        response.set_cookie(BAG_COOKIE, bag.token(), max_age=30 * 86400, httponly=True, samesite="Lax")
+        response.headers["X-Quote-Bag"] = bag.token()
+    return response
+
+@app.route('/quotes/<int:quote_id>')
+def get_quote_by_id(quote_id):
+    # Quotes only change with the corpus, so a minute's staleness is fine
+    response = quote_response(quote_id, "public, max-age=60")
+    if response is None:
+        return jsonify({"error": "no such quote"}), 404
+    return response
+
+@app.route('/quotes/stream')
+def stream_quotes():
+    # Newline-delimited JSON, one quote per line, fetched and encoded while it
+    # is sent: memory stays the same however many quotes are asked for
+    order = request.args.get("order", "random")
+    if order not in ("random", "id"):
+        raise BadRequest("order must be random or id")
+    n = int_arg("n", 1000 if order == "random" else MAX_STREAM)
+    if n > MAX_STREAM:
+        raise BadRequest(f"n must be at most {MAX_STREAM}")
+    after = int_arg("after", 0)
+    weighted = mode_arg(("uniform", "weighted")) == "weighted"
+    if weighted and order == "random":
+        require_weights()
+
+    def lines():
+        if order == "id":
+            quotes = itertools.islice(store.scan(after, STREAM_CHUNK), n)
+        else:
+            quotes = (quote for start in range(0, n, STREAM_CHUNK)
+                      for quote in store.sample(min(STREAM_CHUNK, n - start), weighted))
+        chunk = []
+        for quote in quotes:
+            chunk.append(encode(quote_json(quote)))
+            if len(chunk) == STREAM_CHUNK:
+                yield b"".join(chunk)
+                chunk.clear()
+        if chunk:
+            yield b"".join(chunk)
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
+@app.route('/quotes/list')
+def list_quotes():
+    # Keyset pagination: pass back "next" as ?after= to get the following page
+    return page_response(*store.page(int_arg("after", 0), int_arg("limit", 20)))
+
+@app.route('/quotes/search')
+def search_quotes():
+    query = request.args.get("q", "").strip()
+    if not query:
+        raise BadRequest("q is required")
+    return page_response(*store.search(query, int_arg("after", 0), int_arg("limit", 20)))
 
 if __name__ == '__main__':
+    open_store()
     app.run(debug=True)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Balance simulator for "The Mysterious Castle".
+
+Plays a great many headless games of the original castle with a simple
+bot and reports, for every combination of encounter settings, how often
+it survives and wins, the scores it ends with and how many actions a win
+takes:
+
+    python castle_balance.py --games 1000000 --chance 0.2,0.3,0.4 --damage-scale 0.5,1,2
+
+The bot takes every item it sees, drinks a potion when its health drops
+below --heal-below, answers the riddle correctly with probability
+--riddle-skill and otherwise walks through a random exit, until it wins,
+dies or reaches --max-actions.
+
+Games are not played through Game: the rules the bot can run into
+(moving, encounters, items, the potion, the riddle, winning) are
+replayed on NumPy arrays with one entry per game, so every step rolls
+the dice for a whole batch at once.  Batches run on a process pool and
+each gets its own random stream spawned from one SeedSequence, so the
+results depend only on --seed, not on the number of workers.  --verify N
+plays N games through the real engine with the same bot as a check on
+the model.
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+import terminal_player_game
+from castle_world import BUILTIN_ROOMS
+from terminal_player_game import ENCOUNTERS, Game
+
+MAX_SCORE = 1024  # Score histogram size; higher scores land in the last bin
+POTION_HEAL = 30  # What Player.heal gets from "use potion"
+
+
+class Settings(NamedTuple):
+    """One point of the parameter grid"""
+    chance: float
+    damage_scale: float
+    heal_below: int
+    riddle_skill: float
+    max_actions: int
+
+
+def scaled_encounters(damage_scale: float):
+    """ENCOUNTERS with every harmful encounter's damage scaled (heals unchanged)"""
+    return [(text, round(damage * damage_scale) if damage > 0 else damage)
+            for text, damage in ENCOUNTERS]
+
+
+# =============================================================================
+# Vectorized model
+# =============================================================================
+
+class CastleModel:
+    """The original castle as arrays: exits per room and items as bit masks"""
+
+    def __init__(self, rooms: Dict[str, dict] = BUILTIN_ROOMS, start: str = "entrance"):
+        names = list(rooms)
+        index = {name: i for i, name in enumerate(names)}
+        width = max(len(room.get("connections", {})) for room in rooms.values())
+        self.start = index[start]
+        self.exits = np.zeros((len(names), max(width, 1)), np.int64)
+        self.exit_count = np.zeros(len(names), np.int64)
+        self.items = np.zeros(len(names), np.int64)  # Bits of the items lying in each room
+        self.riddle = np.zeros(len(names), bool)
+        self.orb = np.zeros(len(names), np.int64)  # Bit of the orb a solved riddle leaves
+        self.item_names: List[str] = []
+
+        def new_item(name):
+            self.item_names.append(name)
+            if len(self.item_names) > 63:
+                raise ValueError("too many items to simulate")
+            return 1 << (len(self.item_names) - 1)
+
+        for i, name in enumerate(names):
+            room = rooms[name]
+            targets = [index[target] for target in room.get("connections", {}).values()]
+            self.exits[i, :len(targets)] = targets
+            self.exit_count[i] = len(targets)
+            # Bits in room order, so the lowest untaken bit is the item listed first
+            for item in room.get("items", []):
+                self.items[i] |= new_item(item)
+            if room.get("puzzle") == "riddle":
+                self.riddle[i] = True
+                self.orb[i] = new_item("glowing orb")
+                self.items[i] |= self.orb[i]
+        self.locked = int(np.bitwise_or.reduce(self.orb))  # Orbs appear only once earned
+        self.chest = 1 << self.item_names.index("treasure chest")
+        self.potion = 1 << self.item_names.index("potion")
+
+
+def empty_tally(max_actions: int) -> Dict[str, np.ndarray]:
+    return {
+        "outcomes": np.zeros(3, np.int64),  # won, died, out of actions
+        "score": np.zeros(MAX_SCORE, np.int64),
+        "win_actions": np.zeros(max_actions + 1, np.int64),
+        "death_actions": np.zeros(max_actions + 1, np.int64),
+    }
+
+
+def merge(tally: Dict[str, np.ndarray], other: Dict[str, np.ndarray]) -> None:
+    for key, counts in other.items():
+        tally[key] += counts
+
+
+def simulate(settings: Settings, games: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Play `games` games at once; returns their tally"""
+    model = CastleModel()
+    rng = np.random.default_rng(seed)
+    damage = np.array([damage for _, damage in scaled_encounters(settings.damage_scale)], np.int64)
+    tally = empty_tally(settings.max_actions)
+
+    # One entry per game still running; finished games are compacted away
+    location = np.full(games, model.start, np.int64)
+    health = np.full(games, 100, np.int64)
+    score = np.zeros(games, np.int64)
+    taken = np.zeros(games, np.int64)  # Items picked up
+    used = np.zeros(games, np.int64)  # Items used up (the potion)
+    locked = np.full(games, model.locked, np.int64)
+    visited = np.full(games, 1 << model.start, np.int64)
+
+    for action in range(1, settings.max_actions + 1):
+        count = len(location)
+        if not count:
+            break
+        # Choose: heal, else take the first item in sight, else move
+        in_sight = model.items[location] & ~taken & ~locked
+        heal = (health < settings.heal_below) & ((taken & ~used & model.potion) != 0)
+        take = ~heal & (in_sight != 0)
+        move = ~heal & ~take
+
+        health = np.where(heal, np.minimum(health + POTION_HEAL, 100), health)
+        used |= np.where(heal, model.potion, 0)
+
+        item = in_sight & -in_sight
+        taken |= np.where(take, item, 0)
+        score += 10 * take
+        won = take & (item == model.chest)
+
+        exits = model.exit_count[location]
+        move &= exits > 0
+        choice = (rng.random(count) * exits).astype(np.int64)
+        location = np.where(move, model.exits[location, np.minimum(choice, model.exits.shape[1] - 1)], location)
+        encounter = move & (rng.random(count) < settings.chance)
+        hit = damage[rng.integers(0, len(damage), count)]
+        health = np.where(encounter, np.clip(health - hit, 0, 100), health)
+        died = health <= 0
+
+        first_visit = move & (((visited >> location) & 1) == 0)
+        visited |= np.where(move, np.left_shift(1, location), 0)
+        solved = first_visit & model.riddle[location] & ~died & (rng.random(count) < settings.riddle_skill)
+        score += 50 * solved
+        locked &= ~np.where(solved, model.orb[location], 0)
+
+        done = won | died
+        if action == settings.max_actions:
+            done[:] = True
+        if done.any():
+            tally["outcomes"] += [won.sum(), died.sum(), (done & ~won & ~died).sum()]
+            tally["score"] += np.bincount(np.minimum(score[done], MAX_SCORE - 1), minlength=MAX_SCORE)
+            tally["win_actions"][action] += won.sum()
+            tally["death_actions"][action] += died.sum()
+            keep = ~done
+            location, health, score = location[keep], health[keep], score[keep]
+            taken, used, locked, visited = taken[keep], used[keep], locked[keep], visited[keep]
+    return tally
+
+
+# =============================================================================
+# The same bot playing the real engine
+# =============================================================================
+
+@contextlib.contextmanager
+def engine_settings(settings: Settings):
+    """The engine's encounter settings and dice as `settings` wants them, put back afterwards"""
+    saved = terminal_player_game.ENCOUNTER_CHANCE, terminal_player_game.ENCOUNTERS, random.getstate()
+    terminal_player_game.ENCOUNTER_CHANCE = settings.chance
+    terminal_player_game.ENCOUNTERS = scaled_encounters(settings.damage_scale)
+    try:
+        yield
+    finally:
+        terminal_player_game.ENCOUNTER_CHANCE, terminal_player_game.ENCOUNTERS, state = saved
+        random.setstate(state)
+
+
+def engine_tally(settings: Settings, games: int, seed: int) -> Dict[str, np.ndarray]:
+    """Play `games` games through Game with the model's bot"""
+    rng = random.Random(seed)
+    tally = empty_tally(settings.max_actions)
+    with engine_settings(settings), open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(games):
+            random.seed(rng.getrandbits(64))  # The engine's own dice
+            game = Game(item_delay=0)
+            game.start_game("bot")
+            player = game.player
+            actions = 0
+            while True:
+                if game.pending_puzzle:
+                    game.process_command("echo" if rng.random() < settings.riddle_skill else "wind")
+                    continue
+                room = game.rooms[player.location]
+                if player.health < settings.heal_below and "potion" in player.inventory:
+                    command = "use potion"
+                elif room.items:
+                    command = "take " + next(iter(room.items))
+                else:
+                    command = "move " + rng.choice(list(room.connections))
+                game.process_command(command)
+                actions += 1
+                if game.has_won() or not player.is_alive or actions == settings.max_actions:
+                    break
+            outcome = 0 if game.has_won() else 1 if not player.is_alive else 2
+            tally["outcomes"][outcome] += 1
+            tally["score"][min(player.score, MAX_SCORE - 1)] += 1
+            if outcome == 0:
+                tally["win_actions"][actions] += 1
+            elif outcome == 1:
+                tally["death_actions"][actions] += 1
+            game.close()
+    return tally
+
+
+# =============================================================================
+# Report
+# =============================================================================
+
+def percentiles(histogram: np.ndarray, ps=(10, 50, 90)) -> List[int]:
+    """Values at the given percentiles of a histogram of counts by value"""
+    total = histogram.sum()
+    if not total:
+        return [0] * len(ps)
+    cumulative = np.cumsum(histogram)
+    return [int(np.searchsorted(cumulative, total * p / 100)) for p in ps]
+
+
+HEADER = (f"{'chance':>7}{'damage':>7}{'games':>10}{'survive':>9}{'win':>7}{'stuck':>7}"
+          f"{'score mean':>11}{'p10/p50/p90':>13}{'win actions p10/p50/p90':>25}{'died at p50':>12}")
+
+
+def report_line(settings: Settings, tally: Dict[str, np.ndarray], label: str = "") -> str:
+    won, died, stuck = tally["outcomes"]
+    games = won + died + stuck
+    scores = tally["score"]
+    mean = (scores * np.arange(len(scores))).sum() / games
+    score_p = "/".join(map(str, percentiles(scores)))
+    win_p = "/".join(map(str, percentiles(tally["win_actions"]))) if won else "-"
+    death_p = percentiles(tally["death_actions"], (50,))[0] if died else "-"
+    return (f"{settings.chance:>7.2f}{settings.damage_scale:>6g}x{games:>10,}{(games - died) / games:>9.1%}"
+            f"{won / games:>7.1%}{stuck / games:>7.1%}{mean:>11.1f}{score_p:>13}{win_p:>25}{death_p:>12}"
+            f"{label}")
+
+
+def parse_list(text: str) -> List[float]:
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo balance simulator for the castle game")
+    parser.add_argument("--games", type=int, default=1_000_000, help="games per parameter combination")
+    parser.add_argument("--chance", type=parse_list, default=[0.3],
+                        help="comma-separated encounter chances to try")
+    parser.add_argument("--damage-scale", type=parse_list, default=[1.0],
+                        help="comma-separated multipliers for encounter damage")
+    parser.add_argument("--heal-below", type=int, default=50, help="bot drinks a potion below this health")
+    parser.add_argument("--riddle-skill", type=float, default=0.5, help="chance the bot solves the riddle")
+    parser.add_argument("--max-actions", type=int, default=200, help="give up after this many actions")
+    parser.add_argument("--batch", type=int, default=100_000, help="games per task")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="also play N games per combination through the real engine")
+    args = parser.parse_args()
+
+    grid = [Settings(chance, scale, args.heal_below, args.riddle_skill, args.max_actions)
+            for chance in args.chance for scale in args.damage_scale]
+    tasks = [(settings, min(args.batch, args.games - start))
+             for settings in grid for start in range(0, args.games, args.batch)]
+    seeds = np.random.SeedSequence(args.seed).spawn(len(tasks))
+
+    start = time.perf_counter()
+    tallies = {settings: empty_tally(args.max_actions) for settings in grid}
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = [(settings, pool.submit(simulate, settings, games, seed))
+                   for (settings, games), seed in zip(tasks, seeds)]
+        for settings, future in futures:
+            merge(tallies[settings], future.result())
+    elapsed = time.perf_counter() - start
+
+    print(HEADER)
+    for settings in grid:
+        print(report_line(settings, tallies[settings]))
+        if args.verify:
+            print(report_line(settings, engine_tally(settings, args.verify, args.seed), "  (engine)"))
+    total = args.games * len(grid)
+    print(f"\n{total:,} simulated games in {elapsed:.1f} s on {args.workers} workers "
+          f"({total / elapsed:,.0f} games/s)")
+
+
+if __name__ == "__main__":
+    main()
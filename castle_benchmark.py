@@ -0,0 +1,247 @@
+"""
+Benchmarks for "The Mysterious Castle".
+
+    python castle_benchmark.py sessions --sessions 2000 --commands 30
+
+`sessions` starts that many games side by side in one process, plays a
+few random commands in each (as castle_server.py would) and reports the
+memory each session costs: Python objects (traced with tracemalloc) and
+resident memory, which also counts each session's SQLite world.  It
+also prints the size of one Player and one Room with what they own.
+
+    python castle_benchmark.py routes --rooms 100000 --targets 20
+
+`routes` generates a castle, then times loading its room graph, building
+next-hop tables for random targets, looking up next steps, and how many
+cached tables survive exits being closed and opened again.
+
+    python castle_benchmark.py timelines --rooms 10000 --branches 1000
+
+`timelines` plays into a generated castle, then branches that many
+alternate timelines from one position (rewind, play a few random
+commands, keep the end state) and reports the time and memory per
+branch, next to what deep-copying every room and the player costs.
+"""
+
+import argparse
+import contextlib
+import copy
+import gc
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from castle_routes import RouteTable
+from castle_world import CastleWorld, generate_rooms, write_world
+from terminal_player_game import Game, Room
+
+
+def rss_kb() -> int:
+    """Resident memory of this process, from /proc"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def deep_size(obj, seen=None) -> int:
+    """Bytes held by an object and everything it references, counted once"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+def session_memory(args):
+    commands = ["look", "inventory", "score", "n", "s", "e", "w", "take key",
+                "take sword", "take potion", "explore", "use potion"]
+    rng = random.Random(0)
+    games = []
+
+    gc.collect()
+    tracemalloc.start()
+    base_traced = tracemalloc.get_traced_memory()[0]
+    base_rss = rss_kb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.sessions):
+            game = Game(item_delay=0)
+            game.start_game(f"bot{i}")
+            for _ in range(args.commands):
+                game.process_command(rng.choice(commands))
+            games.append(game)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0] - base_traced
+    rss = rss_kb() - base_rss
+    tracemalloc.stop()
+
+    player = games[0].player
+    room = games[0].rooms[player.location]
+    print(f"{args.sessions} sessions x {args.commands} commands in {elapsed:.2f} s")
+    print(f"Python objects: {traced / args.sessions:,.0f} bytes per session")
+    print(f"resident memory: {rss * 1024 / args.sessions:,.0f} bytes per session (includes SQLite)")
+    print(f"one Player: {deep_size(player):,} bytes, one Room: {deep_size(room):,} bytes")
+    for game in games:
+        game.close()
+
+
+def route_tables(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "castle.db")
+        connection = sqlite3.connect(path)
+        write_world(connection, generate_rooms(args.rooms, seed=0))
+        connection.close()
+        world = CastleWorld.open(path, Room)
+
+        start = time.perf_counter()
+        routes = RouteTable(world, max_targets=args.targets)
+        print(f"{len(routes):,} rooms: graph loaded in {time.perf_counter() - start:.2f} s")
+
+        rng = random.Random(0)
+        names = routes.names
+        targets = [rng.choice(names) for _ in range(args.targets)]
+        start = time.perf_counter()
+        for target in targets:
+            routes.distance(names[0], target)
+        build = (time.perf_counter() - start) / len(targets)
+        print(f"next-hop table: {build * 1000:.1f} ms to build, "
+              f"{len(names) * 5 / 1024:,.0f} KB each")
+
+        pairs = [(rng.choice(names), rng.choice(targets)) for _ in range(100000)]
+        start = time.perf_counter()
+        for origin, target in pairs:
+            routes.next_step(origin, target)
+        lookup = (time.perf_counter() - start) / len(pairs)
+        print(f"next_step lookup: {lookup * 1e6:.2f} us")
+
+        # Doors slam shut and open again: remove one exit, then put it back
+        kept = 0
+        start = time.perf_counter()
+        for _ in range(args.edits):
+            name = rng.choice(names)
+            connections = dict(world[name].connections)
+            closed = dict(connections)
+            del closed[rng.choice(list(closed))]
+            for state in (closed, connections):
+                routes.update_room(name, state)
+                kept += len(routes.tables)
+                for target in targets:
+                    routes.distance(names[0], target)  # Rebuild whatever was dropped
+        elapsed = time.perf_counter() - start
+        changes = args.edits * 2
+        print(f"{changes} exit changes: {kept / changes / len(targets):.0%} of cached tables kept, "
+              f"{routes.builds - len(targets)} rebuilds, {elapsed / changes * 1000:.2f} ms per change")
+        routes.close()
+        world.close()
+
+
+def timelines(args):
+    commands = ["n", "s", "e", "w", "take potion", "take herbs", "take gold coin", "take candle",
+                "take rope", "explore", "look"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "castle.db")
+        connection = sqlite3.connect(path)
+        write_world(connection, generate_rooms(args.rooms, seed=0))
+        connection.close()
+
+        rng = random.Random(0)
+        random.seed(0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            game = Game(path, item_delay=0)
+            game.start_game("bot")
+            for _ in range(200):
+                game.process_command(rng.choice(commands))
+            origin = game.snapshot()
+
+            def branch():
+                ends = []
+                for _ in range(args.branches):
+                    game.restore(origin)
+                    for _ in range(args.steps):
+                        if game.pending_puzzle:
+                            game.process_command("echo")
+                        game.process_command(rng.choice(commands))
+                    ends.append(game.snapshot())
+                game.history.reset(game.snapshot())  # Keep only the end states alive
+                return ends
+
+            start = time.perf_counter()
+            branch()
+            elapsed = time.perf_counter() - start
+
+            gc.collect()
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            ends = branch()
+            gc.collect()
+            held = tracemalloc.get_traced_memory()[0] - base
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for state in ends[:100]:
+                game.restore(state)
+            restore = (time.perf_counter() - start) / min(100, len(ends))
+
+            start = time.perf_counter()
+            copies = 10
+            for _ in range(copies):
+                copy.deepcopy((game.player, [game.rooms[name] for name in game.rooms.room_names()]))
+            deep = (time.perf_counter() - start) / copies
+            size = deep_size([game.rooms[name] for name in game.rooms.room_names()])
+        game.close()
+
+    print(f"{args.branches} timelines of {args.steps} commands from one position in {elapsed:.2f} s "
+          f"({elapsed / args.branches * 1000:.2f} ms each, including play)")
+    print(f"memory kept per timeline end state: {held / args.branches:,.0f} bytes; "
+          f"restore between states: {restore * 1e6:.0f} us")
+    print(f"deep copy of the whole {args.rooms:,}-room world instead: {deep * 1000:.1f} ms "
+          f"and {size:,} bytes per copy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Castle adventure benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sessions = commands.add_parser("sessions", help="memory per concurrent game session")
+    sessions.add_argument("--sessions", type=int, default=2000)
+    sessions.add_argument("--commands", type=int, default=30, help="commands played per session")
+
+    routes = commands.add_parser("routes", help="shortest-route tables on a generated castle")
+    routes.add_argument("--rooms", type=int, default=100000)
+    routes.add_argument("--targets", type=int, default=20, help="cached next-hop tables")
+    routes.add_argument("--edits", type=int, default=20, help="doors closed and reopened")
+
+    branches = commands.add_parser("timelines", help="branching alternate timelines with undo states")
+    branches.add_argument("--rooms", type=int, default=10000)
+    branches.add_argument("--branches", type=int, default=1000)
+    branches.add_argument("--steps", type=int, default=10, help="commands played in each timeline")
+    args = parser.parse_args()
+
+    if args.command == "sessions":
+        session_memory(args)
+    elif args.command == "routes":
+        route_tables(args)
+    elif args.command == "timelines":
+        timelines(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Command registry for "The Mysterious Castle".
+
+Game methods register themselves as commands with a verb, aliases,
+shortcuts (words that stand for the command plus fixed arguments, like
+"n" for "move north") and an arity:
+
+    COMMANDS = CommandTable()
+
+    class Game:
+        @COMMANDS.register("inventory", aliases=["i"], help="Show your inventory")
+        def _show_inventory(self): ...
+
+All words go into a prefix trie.  Every prefix that names exactly one
+command is then flattened into a dict, so dispatching a command line is
+one dict lookup however many commands there are, and "inv" works as
+well as "inventory".  Exact words always win over abbreviations.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class Command(NamedTuple):
+    """A registered command"""
+    verb: str
+    handler: Callable
+    min_args: int
+    max_args: Optional[int]  # None = any number, joined into one argument
+    usage: str
+    help: str
+
+
+class CommandTable:
+    """Commands by verb, alias, shortcut or unambiguous prefix"""
+
+    def __init__(self):
+        self.commands: Dict[str, Command] = {}
+        self.words: Dict[str, Tuple[str, Tuple[str, ...]]] = {}  # word -> (verb, bound args)
+        self._lookup = None  # Every resolvable word and prefix, built on first use
+        self._trie = None
+
+    def register(self, verb: str, aliases: Sequence[str] = (), shortcuts: Dict[str, Sequence[str]] = None,
+                 args: Tuple[int, Optional[int]] = (0, 0), usage: str = None, help: str = ""):
+        """Decorator registering a method as the handler of `verb`
+
+        `args` is (min, max) words after the verb; with max None the
+        remaining words are passed as one space-joined argument.
+        """
+        def decorator(func):
+            self.commands[verb] = Command(verb, func, args[0], args[1], usage or verb, help)
+            for word in (verb, *aliases):
+                self.words[word] = (verb, ())
+            for word, bound in (shortcuts or {}).items():
+                self.words[word] = (verb, tuple(bound))
+            self._lookup = None
+            return func
+        return decorator
+
+    # =========================================================================
+    # Resolving words
+    # =========================================================================
+
+    def _build(self) -> None:
+        """Insert every word into a trie and flatten the unambiguous prefixes"""
+        trie = {}
+        for word, target in self.words.items():
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+                node.setdefault("", set()).add(target)  # Targets below this prefix
+
+        lookup = {}
+        for word in self.words:
+            node = trie
+            for length, char in enumerate(word, 1):
+                node = node[char]
+                if len(node[""]) == 1:
+                    lookup.setdefault(word[:length], next(iter(node[""])))
+        lookup.update(self.words)  # Exact words beat abbreviations
+        self._trie, self._lookup = trie, lookup
+
+    def resolve(self, word: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+        """(verb, bound args) for a word or abbreviation, None if unknown or ambiguous"""
+        if self._lookup is None:
+            self._build()
+        return self._lookup.get(word)
+
+    def candidates(self, prefix: str) -> List[str]:
+        """Verbs an ambiguous prefix could mean"""
+        if self._trie is None:
+            self._build()
+        node = self._trie
+        for char in prefix:
+            if char not in node:
+                return []
+            node = node[char]
+        return sorted({verb for verb, _ in node[""]})
+
+    # =========================================================================
+    # Dispatch
+    # =========================================================================
+
+    def dispatch(self, target, words: List[str]):
+        """Run the command line `words` (already split) on `target`
+
+        Returns the handler's result, or None after printing why the line
+        could not be run.
+        """
+        resolved = self.resolve(words[0])
+        if resolved is None:
+            matches = self.candidates(words[0]) if words[0] else []
+            if len(matches) > 1:
+                print(f"'{words[0]}' could mean: {', '.join(matches)}")
+            else:
+                print("Unknown command. Type 'help' for available commands.")
+            return None
+
+        verb, bound = resolved
+        command = self.commands[verb]
+        args = [*bound, *words[1:]]
+        if len(args) < command.min_args or (command.max_args is not None and len(args) > command.max_args):
+            print(f"Usage: {command.usage}")
+            return None
+        if command.max_args is None and len(args) > command.min_args:
+            keep = max(command.min_args - 1, 0)
+            args = [*args[:keep], " ".join(args[keep:])]
+        return command.handler(target, *args)
+
+    def help_lines(self) -> List[str]:
+        """One line per command, in registration order"""
+        return [f"- {command.usage}: {command.help}" for command in self.commands.values()]
@@ -0,0 +1,217 @@
+"""
+Undo, redo and snapshots for "The Mysterious Castle".
+
+A GameState is immutable: the player's fields as a tuple plus a
+PersistentMap from room name to the room's stored JSON, holding only the
+rooms that differ from the base world.  PersistentMap is a hash array
+mapped trie: setting a key copies just the path from the root to that
+key (a handful of small nodes) and shares everything else with the map
+it came from.  Recording a state after a command therefore costs memory
+and time in proportion to what the command changed, and thousands of
+states, snapshots and branched timelines can share one world.
+
+diff() walks two maps side by side and skips every subtree the two
+share, so moving the live game from one state to another touches only
+the rooms that differ between them.
+"""
+
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_BITS = 64
+_MISSING = object()
+
+
+class _Node:
+    """Trie node: a bitmap of occupied slots and the occupants in slot order"""
+    __slots__ = ("bitmap", "slots")
+
+    def __init__(self, bitmap: int, slots: tuple):
+        self.bitmap = bitmap
+        self.slots = slots  # Each a child node or a (hash, key, value) leaf
+
+
+class _Collision:
+    """Leaves whose hashes agree in every bit"""
+    __slots__ = ("leaves",)
+
+    def __init__(self, leaves: tuple):
+        self.leaves = leaves
+
+
+def _hash(key) -> int:
+    return hash(key) & ((1 << HASH_BITS) - 1)
+
+
+def _pair(first: tuple, second: tuple, shift: int):
+    """Smallest subtree holding two leaves with different keys"""
+    if shift >= HASH_BITS:
+        return _Collision((first, second))
+    a, b = (first[0] >> shift) & MASK, (second[0] >> shift) & MASK
+    if a == b:
+        return _Node(1 << a, (_pair(first, second, shift + BITS),))
+    return _Node((1 << a) | (1 << b), (first, second) if a < b else (second, first))
+
+
+def _set(node, leaf: tuple, shift: int):
+    """Copy of `node` with `leaf` in it, or `node` itself if nothing changes"""
+    h, key, value = leaf
+    if isinstance(node, _Collision):
+        for i, old in enumerate(node.leaves):
+            if old[1] == key:
+                if old[2] == value:
+                    return node
+                return _Collision(node.leaves[:i] + (leaf,) + node.leaves[i + 1:])
+        return _Collision(node.leaves + (leaf,))
+
+    bit = 1 << ((h >> shift) & MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.slots[:index] + (leaf,) + node.slots[index:])
+    slot = node.slots[index]
+    if isinstance(slot, tuple):
+        if slot[1] == key:
+            if slot[2] == value:
+                return node
+            child = leaf
+        else:
+            child = _pair(slot, leaf, shift + BITS)
+    else:
+        child = _set(slot, leaf, shift + BITS)
+        if child is slot:
+            return node
+    return _Node(node.bitmap, node.slots[:index] + (child,) + node.slots[index + 1:])
+
+
+def _leaves(node) -> Iterator[tuple]:
+    if isinstance(node, tuple):
+        yield node
+    elif isinstance(node, _Collision):
+        yield from node.leaves
+    elif node is not None:
+        for slot in node.slots:
+            yield from _leaves(slot)
+
+
+def _diff(a, b, out: set) -> None:
+    """Add to `out` every key whose value differs between subtrees a and b"""
+    if a is b:
+        return  # Shared: nothing below differs
+    if isinstance(a, _Node) and isinstance(b, _Node):
+        for bit in range(1 << BITS):
+            mask = 1 << bit
+            x = a.slots[(a.bitmap & (mask - 1)).bit_count()] if a.bitmap & mask else None
+            y = b.slots[(b.bitmap & (mask - 1)).bit_count()] if b.bitmap & mask else None
+            _diff(x, y, out)
+        return
+    left = {leaf[1]: leaf[2] for leaf in _leaves(a)}
+    right = {leaf[1]: leaf[2] for leaf in _leaves(b)}
+    for key in left.keys() | right.keys():
+        if left.get(key, _MISSING) != right.get(key, _MISSING):
+            out.add(key)
+
+
+class PersistentMap:
+    """Immutable hash map; set() returns a new map sharing all unchanged nodes"""
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, root: _Node = None, size: int = 0):
+        self._root = root if root is not None else _Node(0, ())
+        self._size = size
+
+    @classmethod
+    def from_items(cls, items) -> "PersistentMap":
+        result = cls()
+        for key, value in items:
+            result = result.set(key, value)
+        return result
+
+    def get(self, key, default=None):
+        h = _hash(key)
+        node, shift = self._root, 0
+        while True:
+            if isinstance(node, _Collision):
+                for leaf in node.leaves:
+                    if leaf[1] == key:
+                        return leaf[2]
+                return default
+            bit = 1 << ((h >> shift) & MASK)
+            if not node.bitmap & bit:
+                return default
+            node = node.slots[(node.bitmap & (bit - 1)).bit_count()]
+            if isinstance(node, tuple):
+                return node[2] if node[1] == key else default
+            shift += BITS
+
+    def set(self, key, value) -> "PersistentMap":
+        root = _set(self._root, (_hash(key), key, value), 0)
+        if root is self._root:
+            return self
+        return PersistentMap(root, self._size + (key not in self))
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return self._size
+
+    def items(self) -> Iterator[Tuple]:
+        for _, key, value in _leaves(self._root):
+            yield key, value
+
+    def diff(self, other: "PersistentMap") -> set:
+        """Keys whose values differ between the two maps (or that only one has)"""
+        out = set()
+        _diff(self._root, other._root, out)
+        return out
+
+
+# =============================================================================
+# Game states
+# =============================================================================
+
+class GameState(NamedTuple):
+    """Everything undo and snapshots restore; never modified once made"""
+    turn: int
+    player: tuple  # Values of PLAYER_FIELDS, with the inventory as a tuple
+    pending_puzzle: Optional[str]
+    rooms: PersistentMap  # Room name -> stored JSON, for rooms that differ from the base world
+
+
+class GameHistory:
+    """Undo and redo stacks plus named snapshots of GameStates"""
+
+    def __init__(self, max_undo: int = 1000):
+        self.current: Optional[GameState] = None
+        self.undo_stack = deque(maxlen=max_undo)  # Oldest states fall off the end
+        self.redo_stack: List[GameState] = []
+        self.snapshots: Dict[str, GameState] = {}
+
+    def reset(self, state: GameState) -> None:
+        """Start a new timeline at `state` (snapshots are kept)"""
+        self.current = state
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def record(self, state: GameState) -> None:
+        """Make `state` current; the old one can be undone back to"""
+        if self.current is not None:
+            self.undo_stack.append(self.current)
+        self.redo_stack.clear()
+        self.current = state
+
+    def undo(self) -> Optional[GameState]:
+        if not self.undo_stack:
+            return None
+        self.redo_stack.append(self.current)
+        self.current = self.undo_stack.pop()
+        return self.current
+
+    def redo(self) -> Optional[GameState]:
+        if not self.redo_stack:
+            return None
+        self.undo_stack.append(self.current)
+        self.current = self.redo_stack.pop()
+        return self.current
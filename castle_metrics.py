@@ -0,0 +1,209 @@
+"""
+Instrumentation for "The Mysterious Castle".
+
+GameMetrics keeps one latency histogram per command verb and forwards
+structured events (command, room, latency, score change, ...) to an
+optional EventSink.  The hot path only records into a histogram and
+appends a dict to a list; a background thread serializes and writes the
+events in batches, and `sample_every` keeps one event in N when the full
+stream would be too much.
+
+LatencyHistogram is HDR-style: values below 256 ns are counted exactly
+and above that every power of two is split into 128 buckets, so any
+recorded value is reported within 1% using a few thousand counters,
+however many samples go in.
+"""
+
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+SUB_BITS = 7  # 128 buckets per power of two: ~0.8% precision
+SUB_COUNT = 1 << SUB_BITS
+MAX_BITS = 42  # Buckets reach 2**41 ns (~37 minutes); larger values are clamped
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative integer latencies in nanoseconds"""
+
+    def __init__(self):
+        self.counts = [0] * ((MAX_BITS - SUB_BITS) * SUB_COUNT)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        exponent = value.bit_length() - SUB_BITS - 1
+        if exponent <= 0:
+            return value  # Exact below 2 * SUB_COUNT
+        return exponent * SUB_COUNT + (value >> exponent)
+
+    @staticmethod
+    def _highest(index: int) -> int:
+        """Largest value that lands in bucket `index`"""
+        if index < 2 * SUB_COUNT:
+            return index
+        exponent = index // SUB_COUNT - 1
+        mantissa = index - exponent * SUB_COUNT
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        index = min(self._index(value), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        """Value at or below which p percent of the samples fall"""
+        return self.percentiles([p])[0]
+
+    def percentiles(self, ps) -> List[int]:
+        """percentile() for each of the ascending `ps`, in one pass over the buckets"""
+        if not self.total:
+            return [0] * len(ps)
+        ranks = [max(1, round(self.total * p / 100)) for p in ps]
+        values = []
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while len(values) < len(ranks) and seen >= ranks[len(values)]:
+                values.append(min(self._highest(index), self.max))
+            if len(values) == len(ranks):
+                break
+        return values + [self.max] * (len(ranks) - len(values))
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, min, max and percentiles, in microseconds"""
+        if not self.total:
+            return {"count": 0}
+        stats = {"count": self.total, "mean_us": round(self.sum / self.total / 1000, 2),
+                 "min_us": round(self.min / 1000, 2), "max_us": round(self.max / 1000, 2)}
+        for p, value in zip(PERCENTILES, self.percentiles(PERCENTILES)):
+            stats[f"p{p:g}_us"] = round(value / 1000, 2)
+        return stats
+
+
+class EventSink:
+    """Sampled, buffered JSON-lines event writer; a background thread does the I/O"""
+
+    def __init__(self, path: str, sample_every: int = 1, batch: int = 1024):
+        self.path = path
+        self.sample_every = max(1, sample_every)
+        self.batch = batch
+        self.seen = 0
+        self.written = 0
+        self.dropped = 0  # Events in batches that failed to write
+        self.error: Optional[Exception] = None  # The latest such failure
+        self._buffer = []
+        self._queue = queue.Queue()
+        self._file = open(path, "a")
+        self._thread = threading.Thread(target=self._writer, name="event-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, event: dict) -> None:
+        """Buffer one event (or skip it, when sampling)"""
+        self.seen += 1
+        if self.seen % self.sample_every:
+            return
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch:
+            self._hand_off()
+
+    def _hand_off(self) -> None:
+        batch, self._buffer = self._buffer, []
+        self._queue.put(batch)
+
+    def _writer(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                self._queue.task_done()
+                return
+            try:
+                self._file.write("".join(json.dumps(event) + "\n" for event in batch))
+                self._file.flush()
+                self.written += len(batch)
+            except Exception as e:
+                # Lose this batch, not the thread: flush() waits on every later one
+                self.dropped += len(batch)
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Write everything buffered so far and wait for it"""
+        if self._buffer:
+            self._hand_off()
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write what is left, stop the thread and report any events lost"""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self.dropped:
+            print(f"{self.path}: {self.dropped} events lost ({self.error})", file=sys.stderr)
+
+
+class GameMetrics:
+    """Per-verb latency histograms plus an optional structured event stream"""
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.sink: Optional[EventSink] = None
+
+    def open_sink(self, path: str, sample_every: int = 1) -> None:
+        """Start writing events to `path` as JSON lines"""
+        self.sink = EventSink(path, sample_every)
+
+    def command(self, verb: str, room: str, latency_ns: int, score_delta: int, player: str) -> None:
+        """Record one processed command"""
+        histogram = self.histograms.get(verb)
+        if histogram is None:
+            histogram = self.histograms[verb] = LatencyHistogram()
+        histogram.record(latency_ns)
+        if self.sink is not None:
+            self.sink.emit({"t": time.time(), "event": "command", "verb": verb, "room": room,
+                            "latency_us": latency_ns / 1000, "score_delta": score_delta,
+                            "player": player})
+
+    def event(self, name: str, **fields) -> None:
+        """Record any other game event"""
+        if self.sink is not None:
+            fields.update(t=time.time(), event=name)
+            self.sink.emit(fields)
+
+    def summary(self) -> Dict[str, dict]:
+        return {verb: histogram.summary() for verb, histogram in sorted(self.histograms.items())}
+
+    def report_lines(self) -> List[str]:
+        """A table of the per-verb latencies"""
+        columns = ["count", "mean_us"] + [f"p{p:g}_us" for p in PERCENTILES] + ["max_us"]
+        lines = [f"{'verb':<12}" + "".join(f"{column:>11}" for column in columns)]
+        for verb, stats in self.summary().items():
+            lines.append(f"{verb:<12}" + "".join(f"{stats.get(column, 0):>11}" for column in columns))
+        return lines
+
+    def dump(self, path: str) -> None:
+        """Write the histogram summaries as JSON"""
+        with open(path, "w") as f:
+            json.dump({"commands": self.summary()}, f, indent=2)
+
+    def close(self) -> None:
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
@@ -0,0 +1,219 @@
+"""
+Shortest routes between castle rooms.
+
+RouteTable reads the room graph of a CastleWorld once: room names become
+integer ids and each room's exits go into a flat array with one slot
+per direction.  A next-hop table for a target room is one breadth-first
+search backwards from the target: for every room it stores the exit to
+take next and the number of hops left, so "which way to X?" is a single
+lookup from anywhere in the castle.
+
+Tables are built the first time a target is asked for and kept for the
+most recently used targets (storing every pair up front would need
+rooms x rooms entries, far too many for a generated castle).  When a
+room's exits change only the tables the change affects are dropped:
+
+- a removed exit matters only to targets whose route left through it;
+- an added exit matters only to targets it brings closer.
+
+    routes = RouteTable(world)
+    routes.next_step("entrance", "treasure_room")  # "north"
+
+Games share one table per map through shared_table(): it is built from
+the world as stored, the first time any game asks, and never follows a
+game's own changes, so a server pays for it once rather than per session.
+"""
+
+import os
+from array import array
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+
+class RouteTable:
+    """Cached next-hop tables over a CastleWorld's room graph"""
+
+    def __init__(self, world, max_targets: int = 32, follow_changes: bool = True):
+        self.world = world if follow_changes else None  # Only kept to stop listening
+        self.max_targets = max_targets
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.directions: List[str] = []  # Direction names by code
+        self.width = 0  # Exit slots per room (len(directions))
+        self.links = array("i")  # links[room * width + code] = neighbour id, or -1
+        # Who leads into each room, as a CSR index built at load time; exits
+        # added later go to extra_incoming.  Entries are checked against
+        # links when used, so exits removed later are simply skipped.
+        self.incoming_start = array("i")
+        self.incoming = array("i")  # room * width + code of the exit
+        self.extra_incoming: Dict[int, List[int]] = {}
+        self.tables = OrderedDict()  # target id -> (next codes, distances)
+        self.builds = 0
+        self._load(world, follow_changes)
+        if follow_changes:
+            world.add_listener(self.update_room)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # =========================================================================
+    # Graph
+    # =========================================================================
+
+    def _id(self, name: str) -> int:
+        room = self.ids.get(name)
+        if room is None:
+            room = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.links.extend([-1] * self.width)
+            if self.incoming_start:
+                self.incoming_start.append(self.incoming_start[-1])  # Nothing leads in yet
+            self.tables.clear()  # Tables are sized for the old room count
+        return room
+
+    def _code(self, direction: str) -> int:
+        """Code of a direction name, widening every room's exit slots for a new one"""
+        try:
+            return self.directions.index(direction)
+        except ValueError:
+            pass
+        old, self.width = self.width, self.width + 1
+        self.directions.append(direction)
+        links = array("i", [-1]) * (len(self.names) * self.width)
+        for room in range(len(self.names)):
+            links[room * self.width:room * self.width + old] = self.links[room * old:room * old + old]
+        self.links = links
+        # Exit slots moved, so the incoming index is rebuilt from the links
+        self.extra_incoming = {}
+        self._index_incoming()
+        return old
+
+    def _load(self, world, with_changes: bool) -> None:
+        self.names = list(world.room_names())
+        self.ids = {name: room for room, name in enumerate(self.names)}
+        exits = list(world.exits(with_changes))
+        self.directions = list(dict.fromkeys(direction for _, direction, _ in exits))
+        self.width = width = len(self.directions)
+        self.links = array("i", [-1]) * (len(self.names) * width)
+        codes = {direction: code for code, direction in enumerate(self.directions)}
+        ids = self.ids
+        for name, direction, neighbour in exits:
+            target = ids.get(neighbour)
+            if target is None:
+                target = self._id(neighbour)  # An exit to a room the world lacks
+            self.links[ids[name] * width + codes[direction]] = target
+        self._index_incoming()
+
+    def _index_incoming(self) -> None:
+        """Bucket every exit by the room it leads to"""
+        counts = array("i", [0]) * (len(self.names) + 1)
+        for neighbour in self.links:
+            if neighbour >= 0:
+                counts[neighbour + 1] += 1
+        for room in range(len(self.names)):
+            counts[room + 1] += counts[room]
+        self.incoming_start = array("i", counts)
+        self.incoming = array("i", [0]) * counts[-1]
+        fill = counts
+        for slot, neighbour in enumerate(self.links):
+            if neighbour >= 0:
+                self.incoming[fill[neighbour]] = slot
+                fill[neighbour] += 1
+
+    def update_room(self, name: str, connections: Dict[str, str]) -> None:
+        """Bring one room's exits up to date, dropping the tables that change affects"""
+        room = self._id(name)
+        for direction in connections:
+            self._code(direction)
+        base = room * self.width
+        for code, direction in enumerate(self.directions):
+            target = connections.get(direction)
+            new = self._id(target) if target is not None else -1
+            old = self.links[base + code]
+            if new == old:
+                continue
+            self.links[base + code] = new
+            if new >= 0:
+                self.extra_incoming.setdefault(new, []).append(base + code)
+            self._invalidate(room, code, old, new)
+
+    def _invalidate(self, room: int, code: int, old: int, new: int) -> None:
+        for target, (hops, dist) in list(self.tables.items()):
+            removed_used = old >= 0 and hops[room] == code + 1
+            added_shorter = new >= 0 and dist[new] >= 0 and (dist[room] < 0 or dist[new] + 1 < dist[room])
+            if removed_used or added_shorter:
+                del self.tables[target]
+
+    # =========================================================================
+    # Next-hop tables
+    # =========================================================================
+
+    def _table(self, target: int) -> Tuple[bytearray, array]:
+        table = self.tables.get(target)
+        if table is not None:
+            self.tables.move_to_end(target)
+            return table
+        table = self.tables[target] = self._build(target)
+        if len(self.tables) > self.max_targets:
+            self.tables.popitem(last=False)
+        return table
+
+    def _build(self, target: int) -> Tuple[bytearray, array]:
+        """Breadth-first search backwards along exits from `target`"""
+        self.builds += 1
+        count, width = len(self.names), self.width
+        hops = bytearray(count)  # Exit code + 1 to take next; 0 = at the target or no way there
+        dist = array("i", [-1]) * count
+        dist[target] = 0
+        links, start, incoming, extra = self.links, self.incoming_start, self.incoming, self.extra_incoming
+        queue = deque([target])
+        while queue:
+            room = queue.popleft()
+            d = dist[room] + 1
+            slots = incoming[start[room]:start[room + 1]]
+            if room in extra:
+                slots = [*slots, *extra[room]]
+            for slot in slots:
+                if links[slot] != room:
+                    continue  # That exit has since been changed
+                source = slot // width
+                if dist[source] < 0:
+                    dist[source] = d
+                    hops[source] = slot - source * width + 1
+                    queue.append(source)
+        return hops, dist
+
+    def next_step(self, origin: str, target: str) -> Optional[str]:
+        """Direction to take from `origin` towards `target`; None if there or unreachable"""
+        hops, _ = self._table(self.ids[target])
+        code = hops[self.ids[origin]]
+        return self.directions[code - 1] if code else None
+
+    def distance(self, origin: str, target: str) -> int:
+        """Hops from `origin` to `target`, -1 if it cannot be reached"""
+        _, dist = self._table(self.ids[target])
+        return dist[self.ids[origin]]
+
+    def close(self) -> None:
+        if self.world is not None:
+            self.world.remove_listener(self.update_room)
+
+
+_shared: Dict[str, Tuple[float, RouteTable]] = {}  # World path -> (its mtime, table)
+
+
+def shared_table(world, path: str) -> RouteTable:
+    """The table for the world stored at `path` ("builtin" for the built-in castle)
+
+    Built on first use and shared by every game on that world; a world
+    file replaced since gets a new one.  It knows only the stored exits,
+    so callers check each step against their own rooms.
+    """
+    stamp = os.path.getmtime(path) if os.path.exists(path) else 0.0
+    entry = _shared.get(path)
+    if entry is None or entry[0] != stamp:
+        entry = _shared[path] = stamp, RouteTable(world, follow_changes=False)
+    return entry[1]
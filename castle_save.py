@@ -0,0 +1,149 @@
+"""
+Journaled saves for "The Mysterious Castle".
+
+A save file is an append-only journal of JSON lines.  The first line is
+a header; every later line is one save holding only what changed since
+the save before it: the player fields that differ and the rooms whose
+state moved away from the base world.  Appending a few hundred bytes is
+cheap however long the game has run, and loading folds the records in
+order.  Every `compact_every` records the journal is rewritten as a
+single snapshot (write to a temp file, then rename), so loading stays
+fast after thousands of turns.
+
+Appends, fsyncs and compaction run on a background thread, so
+autosaves never stall the command loop; sync() waits for them and
+close() stops the thread.
+"""
+
+import json
+import os
+import queue
+import threading
+from typing import Dict, Optional
+
+FORMAT_VERSION = 1
+
+
+def fold(state: Dict, record: Dict) -> Dict:
+    """Apply one journal record to a {"turn", "player", "rooms"} state"""
+    state["turn"] = record.get("turn", state["turn"])
+    state["player"].update(record.get("player", {}))
+    state["rooms"].update(record.get("rooms", {}))
+    return state
+
+
+def empty_state() -> Dict:
+    return {"turn": 0, "player": {}, "rooms": {}}
+
+
+class SaveJournal:
+    """Append-only save journal with background writes and compaction"""
+
+    def __init__(self, path: str, world: str = "builtin", compact_every: int = 64):
+        self.path = path
+        self.world = world  # Which base world the deltas apply to
+        self.compact_every = compact_every
+        self.state = empty_state()  # Everything saved so far, folded
+        self.records = 0  # Records since the last snapshot
+        self.continuing = False  # False until load(): a new game starts a new journal
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+
+    # =========================================================================
+    # Reading
+    # =========================================================================
+
+    def load(self) -> Optional[Dict]:
+        """Fold the journal into {"turn", "player", "rooms"}; None if there is no save"""
+        self.sync()
+        try:
+            f = open(self.path)
+        except FileNotFoundError:
+            return None
+        state = empty_state()
+        records = 0
+        with f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"{self.path} is not a version {FORMAT_VERSION} save journal")
+            if header.get("world") != self.world:
+                raise ValueError(f"{self.path} was saved in world {header.get('world')!r}, "
+                                 f"not {self.world!r}")
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash mid-append; earlier saves stand
+                fold(state, record)
+                records += 1
+        self.state = json.loads(json.dumps(state))  # Our own copy to keep folding into
+        self.records = records
+        self.continuing = True
+        return state
+
+    # =========================================================================
+    # Writing (on the background thread)
+    # =========================================================================
+
+    def append(self, record: Dict) -> None:
+        """Queue one delta record; returns at once"""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="save-journal", daemon=True)
+            self._thread.start()
+        self._queue.put(json.dumps(record))
+
+    def sync(self) -> None:
+        """Wait until every queued record is on disk"""
+        if self._thread is not None:
+            self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self) -> None:
+        """Write everything queued, then stop the writer thread (append() starts another)"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.sync()
+
+    def _writer(self) -> None:
+        while True:
+            line = self._queue.get()
+            if line is None:
+                self._queue.task_done()
+                return
+            try:
+                self._write(line)
+            except OSError as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, line: str) -> None:
+        fold(self.state, json.loads(line))
+        self.records += 1
+        if not self.continuing or self.records >= self.compact_every:
+            self._snapshot()
+            self.continuing = True
+            return
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _snapshot(self) -> None:
+        """Rewrite the journal as a header plus one record of the folded state"""
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            f.write(json.dumps({"version": FORMAT_VERSION, "world": self.world}) + "\n")
+            f.write(json.dumps(self.state) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        self.records = 1
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Multi-session server for "The Mysterious Castle".
+
+One asyncio process hosts any number of players over plain TCP (telnet
+and nc both work).  Every connection gets its own Game and Player.
+A command runs synchronously between two awaits with its print() output
+captured for that session, and puzzles take their answer from the next
+line, so no session ever blocks the event loop waiting for input.
+
+    python castle_server.py serve --port 4000
+    telnet localhost 4000
+
+    python castle_server.py load --sessions 2000 --commands 50
+
+`load` starts a server in a child process (or uses --host/--port), holds
+that many sessions open at once, drives each one with random commands
+and reports command latency, throughput and server memory per session.
+
+`serve --events FILE` logs structured per-command events, and the
+per-verb latency histograms go to stderr on SIGUSR1 and to --stats-out
+on shutdown.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from terminal_player_game import METRICS, Game, finish_metrics, print_statistics
+
+# Every prompt ends in "> " so clients know when a response is complete
+NAME_PROMPT = "Enter your name, brave adventurer\nname> "
+COMMAND_PROMPT = "\n> "
+ANSWER_PROMPT = "answer> "
+PROMPT_END = b"> "
+
+
+def raise_file_limit() -> None:
+    """Allow as many open sockets as the hard limit permits"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def run_command(game: Game, line: str) -> Tuple[str, bool]:
+    """Run one command line; returns (captured output, game over?)"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        keep_going = game.process_command(line)
+        finished = not keep_going or not game.player.is_alive or game.has_won()
+        if finished:
+            print_statistics(game)
+    return output.getvalue(), finished
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class CastleServer:
+    """Accepts connections and runs one Game per connection"""
+
+    def __init__(self, idle_timeout: float = 600.0, verbose: bool = True):
+        self.idle_timeout = idle_timeout
+        self.verbose = verbose
+        self.sessions = 0
+        self.peak_sessions = 0
+        self.commands = 0
+        self.players = set()  # Names in play, lowercased: one session per save file
+        self.writers = set()  # Open connections, closed on shutdown
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.add(writer)
+        self.sessions += 1
+        self.peak_sessions = max(self.peak_sessions, self.sessions)
+        try:
+            await self._play(reader, writer)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError):
+            pass  # Client went away, idled out or sent an over-long line
+        finally:
+            self.sessions -= 1
+            self.writers.discard(writer)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _send(self, writer: asyncio.StreamWriter, text: str) -> None:
+        writer.write(text.replace("\n", "\r\n").encode())
+        await writer.drain()
+
+    async def _read_line(self, reader: asyncio.StreamReader) -> Optional[str]:
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line:
+            return None  # Connection closed
+        return line.decode(errors="replace").strip()
+
+    async def _play(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        prompt = NAME_PROMPT
+        while True:
+            await self._send(writer, prompt)
+            name = await self._read_line(reader)
+            if name is None:
+                return
+            if not name:
+                prompt = NAME_PROMPT
+            elif name.lower() in self.players:
+                prompt = f"{name} is already in the castle.\n{NAME_PROMPT}"
+            else:
+                break
+        self.players.add(name.lower())
+
+        # No dramatic sleeps: they would stall every session in the process
+        game = Game(item_delay=0, own_saves_only=True)
+        try:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                game.start_game(name)
+            text, finished = output.getvalue(), False
+
+            while not finished:
+                # Output and the next prompt go out in one write
+                await self._send(writer, text + (ANSWER_PROMPT if game.pending_puzzle else COMMAND_PROMPT))
+                line = await self._read_line(reader)
+                if line is None:
+                    return
+                text, finished = run_command(game, line)
+                self.commands += 1
+            await self._send(writer, text)
+        finally:
+            game.close()
+            self.players.discard(name.lower())
+
+    def dump_stats(self) -> None:
+        """Print the per-verb latency histograms to stderr"""
+        print(f"{self.sessions} sessions, {self.commands} commands", file=sys.stderr)
+        print("\n".join(METRICS.report_lines()), file=sys.stderr, flush=True)
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Separately, so a platform without SIGUSR1 still shuts down cleanly on SIGTERM
+        with contextlib.suppress(AttributeError, NotImplementedError):
+            loop.add_signal_handler(signal.SIGUSR1, self.dump_stats)
+        with contextlib.suppress(AttributeError, NotImplementedError):
+            loop.add_signal_handler(signal.SIGTERM, stop.set)
+        if self.verbose:
+            print(f"Castle server listening on {host}:{port}", flush=True)
+        async with server:
+            await stop.wait()
+            # Hang up on everyone so each session ends (and closes its game) normally
+            for writer in list(self.writers):
+                writer.close()
+            for _ in range(100):
+                if not self.sessions:
+                    break
+                await asyncio.sleep(0.05)
+
+
+# =============================================================================
+# LOAD GENERATOR
+# =============================================================================
+
+# Commands a load-test player picks from (no save: it writes files, no quit)
+LOAD_COMMANDS = ["look", "inv", "score", "health", "n", "s", "e", "w",
+                 "take key", "take sword", "explore", "help"]
+
+
+async def load_session(host: str, port: int, index: int, commands: int,
+                       all_connected: asyncio.Event, connected: List[int],
+                       sessions: int) -> List[float]:
+    """One simulated player; returns its command latencies in seconds"""
+    rng = random.Random(index)
+    latencies = []
+    waiting = True
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        await reader.readuntil(PROMPT_END)
+        writer.write(f"bot{index}\n".encode())
+        await reader.readuntil(PROMPT_END)
+
+        # Hold every session open before anyone starts playing
+        waiting = False
+        connected[0] += 1
+        if connected[0] == sessions:
+            all_connected.set()
+        await all_connected.wait()
+
+        for _ in range(commands):
+            start = time.perf_counter()
+            writer.write((rng.choice(LOAD_COMMANDS) + "\n").encode())
+            await reader.readuntil(PROMPT_END)
+            latencies.append(time.perf_counter() - start)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # The game ended (e.g. the bot died) or the server dropped us
+    finally:
+        if waiting:  # Never connected; don't hold up the others
+            connected[0] += 1
+            if connected[0] == sessions:
+                all_connected.set()
+        if writer is not None:
+            writer.close()
+    return latencies
+
+
+def server_rss_kb(pid: int) -> int:
+    """Resident memory of a process, from /proc"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+async def run_load(args, server_pid: Optional[int]) -> None:
+    all_connected = asyncio.Event()
+    connected = [0]
+    idle_rss = server_rss_kb(server_pid) if server_pid else 0
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(load_session(args.host, args.port, i, args.commands,
+                                              all_connected, connected, args.sessions))
+             for i in range(args.sessions)]
+    await all_connected.wait()
+    connect_time = time.perf_counter() - start
+    loaded_rss = server_rss_kb(server_pid) if server_pid else 0
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for session in results for latency in session)
+    print(f"{args.sessions} concurrent sessions connected in {connect_time:.2f} s")
+    if server_pid:
+        per_session = (loaded_rss - idle_rss) / args.sessions
+        print(f"server RSS {idle_rss / 1024:.1f} MB idle, {loaded_rss / 1024:.1f} MB loaded "
+              f"({per_session:.1f} KB per session)")
+    if latencies:
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+        print(f"{len(latencies)} commands in {elapsed:.2f} s: {len(latencies) / elapsed:,.0f} commands/s")
+        print(f"latency ms: p50 {percentile(50):.2f}  p95 {percentile(95):.2f}  "
+              f"p99 {percentile(99):.2f}  max {latencies[-1] * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Castle adventure server")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="host castle games over TCP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=4000)
+    serve.add_argument("--idle-timeout", type=float, default=600.0,
+                       help="seconds before a silent session is closed")
+    serve.add_argument("--quiet", action="store_true")
+    serve.add_argument("--events", metavar="FILE", help="append structured events (JSON lines) to FILE")
+    serve.add_argument("--sample", type=int, default=1, metavar="N",
+                       help="keep one event in N in the --events log")
+    serve.add_argument("--stats-out", metavar="FILE",
+                       help="write per-command latency histograms to FILE (JSON) on shutdown")
+
+    load = commands.add_parser("load", help="load-test a server with simulated players")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=0,
+                      help="existing server to test (default: start one in a child process)")
+    load.add_argument("--sessions", type=int, default=1000)
+    load.add_argument("--commands", type=int, default=50, help="commands per session")
+    args = parser.parse_args()
+
+    raise_file_limit()
+
+    if args.command == "serve":
+        if args.events:
+            METRICS.open_sink(args.events, args.sample)
+        server = CastleServer(args.idle_timeout, verbose=not args.quiet)
+        try:
+            with contextlib.suppress(KeyboardInterrupt):
+                asyncio.run(server.serve(args.host, args.port))
+        finally:
+            finish_metrics(args)
+        return
+
+    child = None
+    if not args.port:
+        with socket.socket() as probe:
+            probe.bind((args.host, 0))
+            args.port = probe.getsockname()[1]
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--quiet",
+                                  "--host", args.host, "--port", str(args.port)])
+    try:
+        wait_for_port(args.host, args.port)
+        asyncio.run(run_load(args, child.pid if child else None))
+    finally:
+        if child:
+            child.terminate()
+            child.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+World storage for "The Mysterious Castle".
+
+Rooms live in a world file -- a SQLite database with one row per room,
+keyed by name -- so opening a castle costs the same whether it has six
+rooms or a million.  CastleWorld stands in for the old dict of rooms:
+world[name] builds the Room the first time the player gets there and
+the most recently used rooms stay resident in an LRU.  The base world
+is never modified: rooms that changed are written to a per-game temp
+table when they are evicted, and collect_changes() hands the ones
+changed since the last save to the save journal (see castle_save.py).
+
+    python castle_world.py generate 100000 -o big_castle.db --seed 1
+    python terminal_player_game.py --world big_castle.db
+"""
+
+import argparse
+import json
+import math
+import random
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (name TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+"""
+
+# Rooms this game changed, shadowing the base rooms; gone when the game ends
+CHANGES_SCHEMA = """
+CREATE TEMP TABLE IF NOT EXISTS changes (name TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID;
+"""
+
+# Room attributes stored in the world file (the name is the key)
+ROOM_FIELDS = ("description", "items", "connections", "puzzle", "visited")
+ROOM_DEFAULTS = {"items": [], "connections": {}, "puzzle": None, "visited": False}
+
+# The original castle, used when no world file is given
+BUILTIN_ROOMS = {
+    "entrance": {
+        "description": "You stand before a massive castle gate. Cold wind howls through the ancient stones.",
+        "items": ["key"],
+        "connections": {"north": "great_hall", "east": "garden"}
+    },
+    "great_hall": {
+        "description": "A vast hall with towering ceilings. Tattered banners hang from the walls.",
+        "items": ["sword", "potion"],
+        "connections": {"south": "entrance", "west": "library", "east": "dungeon"},
+        "puzzle": "riddle"
+    },
+    "library": {
+        "description": "Dusty books line the walls from floor to ceiling. A single candle flickers on a desk.",
+        "items": ["ancient book", "candle"],
+        "connections": {"east": "great_hall"},
+        "puzzle": "books"
+    },
+    "dungeon": {
+        "description": "Dark, damp cells line the corridor. The air smells of decay and rust.",
+        "items": ["bone key"],
+        "connections": {"west": "great_hall", "north": "treasure_room"}
+    },
+    "garden": {
+        "description": "An overgrown courtyard with a mysterious fountain in the center.",
+        "items": ["herbs", "gold coin"],
+        "connections": {"west": "entrance"}
+    },
+    "treasure_room": {
+        "description": "A glittering room filled with gold, jewels, and ancient artifacts!",
+        "items": ["crown", "treasure chest"],
+        "connections": {"south": "dungeon"}
+    }
+}
+
+
+class CastleWorld:
+    """Rooms of a world file, materialized on first use and kept in an LRU"""
+
+    def __init__(self, connection: sqlite3.Connection, room_type, max_rooms: int = 256):
+        self.db = connection
+        self.room_type = room_type
+        # The game holds at most two rooms at once (where you are and where you go)
+        self.max_rooms = max(2, max_rooms)
+        self.resident = OrderedDict()  # name -> (Room, JSON as of its last write)
+        self.unsaved = set()  # Rooms written to the changes table since collect_changes()
+        self.touched = set()  # Rooms handed out since take_touched(); only they can have changed
+        self.loads = 0
+        self.writes = 0
+        self._listeners = []
+        # A file-backed temp store costs each game ~80 KB of SQLite buffers
+        self.db.execute("PRAGMA temp_store = MEMORY")
+        self.db.executescript(CHANGES_SCHEMA)
+
+    @classmethod
+    def open(cls, path: str, room_type, max_rooms: int = 256) -> "CastleWorld":
+        """Open an existing world file"""
+        connection = sqlite3.connect(path)
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+        if "rooms" not in tables:
+            connection.close()
+            raise ValueError(f"{path} is not a castle world file")
+        return cls(connection, room_type, max_rooms)
+
+    @classmethod
+    def from_rooms(cls, rooms: Dict[str, dict], room_type, max_rooms: int = 256,
+                   path: str = ":memory:") -> "CastleWorld":
+        """Build a world from {name: room data}, in memory unless a path is given"""
+        connection = sqlite3.connect(path)
+        write_world(connection, rooms.items())
+        return cls(connection, room_type, max_rooms)
+
+    # =========================================================================
+    # Dict-like access
+    # =========================================================================
+
+    def __getitem__(self, name: str):
+        entry = self.resident.get(name)
+        if entry is not None:
+            self.resident.move_to_end(name)
+            self.touched.add(name)
+            return entry[0]
+
+        row = self.db.execute("SELECT data FROM temp.changes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            row = self.db.execute("SELECT data FROM rooms WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        data = json.loads(row[0])
+        visited = data.pop("visited", False)
+        room = self.room_type(name, **data)
+        room.visited = visited
+        self.resident[name] = (room, row[0])
+        self.touched.add(name)
+        self.loads += 1
+
+        while len(self.resident) > self.max_rooms:
+            self._evict(next(iter(self.resident)))
+        return room
+
+    def __contains__(self, name: str) -> bool:
+        if name in self.resident:
+            return True
+        return self.db.execute("SELECT 1 FROM rooms WHERE name = ?", (name,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
+
+    def room_names(self) -> Iterator[str]:
+        """Every room name in the world"""
+        for (name,) in self.db.execute("SELECT name FROM rooms"):
+            yield name
+
+    def exits(self, with_changes: bool = True) -> Iterator[Tuple[str, str, str]]:
+        """(room, direction, neighbour) for every exit, with this game's changes applied unless not"""
+        if not with_changes:
+            yield from self.db.execute(
+                "SELECT rooms.name, exit.key, exit.value "
+                "FROM rooms, json_each(rooms.data, '$.connections') AS exit")
+            return
+        self.flush()
+        yield from self.db.execute(
+            "SELECT changes.name, exit.key, exit.value "
+            "FROM temp.changes AS changes, json_each(changes.data, '$.connections') AS exit "
+            "UNION ALL "
+            "SELECT rooms.name, exit.key, exit.value "
+            "FROM rooms, json_each(rooms.data, '$.connections') AS exit "
+            "WHERE rooms.name NOT IN (SELECT name FROM temp.changes)")
+
+    def meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """A value from the world file's meta table (e.g. "start")"""
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    # =========================================================================
+    # Changes
+    # =========================================================================
+
+    def add_listener(self, callback) -> None:
+        """Call callback(name, connections) whenever a changed room is stored"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback) -> None:
+        """Stop notifying a callback registered with add_listener()"""
+        self._listeners.remove(callback)
+
+    def _write_if_changed(self, name: str) -> None:
+        room, loaded = self.resident[name]
+        data = room_data(room)
+        if data != loaded:
+            self.db.execute("INSERT OR REPLACE INTO temp.changes VALUES (?, ?)", (name, data))
+            self.resident[name] = (room, data)
+            self.unsaved.add(name)
+            self.writes += 1
+            for callback in self._listeners:
+                callback(name, room.connections)
+
+    def _evict(self, name: str) -> None:
+        self._write_if_changed(name)
+        del self.resident[name]
+
+    def flush(self) -> None:
+        """Write every changed resident room to the changes table"""
+        for name in list(self.resident):
+            self._write_if_changed(name)
+
+    def collect_changes(self) -> Dict[str, dict]:
+        """{name: room data} for every room changed since the last call"""
+        self.flush()
+        changes = {}
+        for name in self.unsaved:
+            row = self.db.execute("SELECT data FROM temp.changes WHERE name = ?", (name,)).fetchone()
+            changes[name] = json.loads(row[0])
+        self.unsaved.clear()
+        return changes
+
+    def take_touched(self) -> set:
+        """Names of the rooms handed out since the last call"""
+        touched, self.touched = self.touched, set()
+        return touched
+
+    def room_json(self, name: str) -> str:
+        """A room's data as it stands now, as stored JSON"""
+        entry = self.resident.get(name)
+        if entry is not None:
+            return room_data(entry[0])
+        return self.base_json(name, changes=True)
+
+    def base_json(self, name: str, changes: bool = False) -> Optional[str]:
+        """A room's JSON in the base world (or with this game's changes)"""
+        row = None
+        if changes:
+            row = self.db.execute("SELECT data FROM temp.changes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            row = self.db.execute("SELECT data FROM rooms WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def restore_room(self, name: str, data: Optional[str]) -> None:
+        """Put a room back to stored JSON from room_json(); None means as in the base world"""
+        if data is None:
+            data = self.base_json(name)
+        self.resident.pop(name, None)  # Rebuilt from the changes table when next used
+        self.touched.discard(name)
+        self.db.execute("INSERT OR REPLACE INTO temp.changes VALUES (?, ?)", (name, data))
+        self.unsaved.add(name)
+        for callback in self._listeners:
+            callback(name, json.loads(data).get("connections", {}))
+
+    def apply_changes(self, changes: Dict[str, dict]) -> None:
+        """Put saved room states (from collect_changes) back over the base world"""
+        # Rooms changed before this call go back to their base state unless saved
+        touched = {row[0] for row in self.db.execute("SELECT name FROM temp.changes")}
+        touched.update(changes)
+        self.db.execute("DELETE FROM temp.changes")
+        self.db.executemany("INSERT INTO temp.changes VALUES (?, ?)",
+                            ((name, json.dumps(data)) for name, data in changes.items()))
+        self.resident.clear()
+        self.unsaved.clear()
+        if self._listeners:
+            for name in touched:
+                row = self.db.execute(
+                    "SELECT data FROM temp.changes WHERE name = ? UNION ALL "
+                    "SELECT data FROM rooms WHERE name = ? LIMIT 1", (name, name)).fetchone()
+                connections = json.loads(row[0]).get("connections", {}) if row else {}
+                for callback in self._listeners:
+                    callback(name, connections)
+
+    def close(self) -> None:
+        """Close the world file; the base world is left as it was"""
+        self.resident.clear()
+        self.db.close()
+
+
+def room_data(room) -> str:
+    """JSON stored for a room; item collections other than lists are stored as lists"""
+    return json.dumps({field: getattr(room, field) for field in ROOM_FIELDS}, default=list)
+
+
+def write_world(connection: sqlite3.Connection, rooms, start: str = "entrance") -> None:
+    """Create the tables and insert (name, data dict) pairs"""
+    connection.executescript(SCHEMA)
+    rows = ((name, json.dumps({field: data.get(field, ROOM_DEFAULTS.get(field))
+                               for field in ROOM_FIELDS}))
+            for name, data in rooms)
+    connection.executemany("INSERT OR REPLACE INTO rooms VALUES (?, ?)", rows)
+    connection.execute("INSERT OR REPLACE INTO meta VALUES ('start', ?)", (start,))
+    connection.commit()
+
+
+# =============================================================================
+# Castle generator
+# =============================================================================
+
+KINDS = ["hall", "corridor", "chamber", "tower", "cellar", "chapel", "armory",
+         "kitchen", "gallery", "study", "crypt", "stair"]
+MOODS = ["A draughty", "A silent", "A crumbling", "A torch-lit", "A cobwebbed",
+         "A cold", "A narrow", "A grand", "A flooded", "A forgotten"]
+DETAILS = ["Water drips somewhere in the dark.", "Old portraits watch you pass.",
+           "Your footsteps echo off the stones.", "Something scratches behind the walls.",
+           "Faded tapestries sway in a draught.", "The air smells of smoke and dust."]
+ITEM_POOL = ["potion", "herbs", "gold coin", "candle", "rope", "old map",
+             "silver ring", "rusty dagger", "bread", "lantern"]
+
+
+def generate_rooms(count: int, seed: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+    """Yield (name, data) for a connected castle of `count` rooms
+
+    Rooms sit on a square grid and are joined like a sidewinder maze: runs
+    of rooms along a row open east, and each run opens north from one
+    random room.  Only the current and previous row are kept in memory.
+    The first room is "entrance" and the last is "treasure_room".
+    """
+    rng = random.Random(seed)
+    side = max(1, math.ceil(math.sqrt(count)))
+
+    def name_of(index):
+        if index == 0:
+            return "entrance"
+        if index == count - 1:
+            return "treasure_room"
+        return f"{KINDS[index % len(KINDS)]}_{index}"
+
+    def new_room(index):
+        if index == count - 1:
+            return {"description": BUILTIN_ROOMS["treasure_room"]["description"],
+                    "items": ["crown", "treasure chest"], "connections": {}}
+        kind = KINDS[index % len(KINDS)]
+        roll = rng.random()
+        return {
+            "description": f"{rng.choice(MOODS)} {kind}. {rng.choice(DETAILS)}",
+            "items": rng.sample(ITEM_POOL, rng.randint(0, 2)),
+            "connections": {},
+            "puzzle": "riddle" if roll < 0.02 else "books" if roll < 0.03 else None,
+        }
+
+    previous = []  # (name, data) of the row above, not yet yielded
+    for top in range(0, count, side):
+        row = [(name_of(i), new_room(i)) for i in range(top, min(top + side, count))]
+        run = []
+        for column, (name, data) in enumerate(row):
+            run.append(column)
+            at_end = column == len(row) - 1
+            if previous and (at_end or rng.random() < 0.5):
+                # Close the run by opening north from one of its rooms
+                pick = rng.choice(run)
+                above_name, above = previous[pick]
+                row[pick][1]["connections"]["north"] = above_name
+                above["connections"]["south"] = row[pick][0]
+                run = []
+            elif not at_end:
+                data["connections"]["east"] = row[column + 1][0]
+                row[column + 1][1]["connections"]["west"] = name
+        yield from previous
+        previous = row
+    yield from previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Castle world files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="write a generated castle")
+    generate.add_argument("rooms", type=int)
+    generate.add_argument("-o", "--output", required=True)
+    generate.add_argument("--seed", type=int)
+    builtin = commands.add_parser("builtin", help="write the original six-room castle")
+    builtin.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.output)
+    if args.command == "generate":
+        write_world(connection, generate_rooms(args.rooms, args.seed))
+    else:
+        write_world(connection, BUILTIN_ROOMS.items())
+    count = connection.execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
+    connection.close()
+    print(f"Wrote {count} rooms to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,36 +4,145 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 import numpy as np
 import math
+import os
+import random
+import time
+
+from maze_agents import (MOVE_FORWARD, MOVE_BACK, MOVE_LEFT, MOVE_RIGHT, MOVE_UP, MOVE_DOWN,
+                         MOVEMENT_SPEED, ROTATION_SPEED, PITCH_LIMIT, MIN_HEIGHT, MAX_HEIGHT)
+from maze_flowfield import FlowFieldCache
+from maze_generator import ALGORITHMS, generate_grid
+from maze_grid import MazeGrid, CHUNK_SHIFT, CHUNK_SIZE
+from maze_lighting import BakedLighting, default_cache_dir
+from maze_mesh import WallMesh
+from maze_profiler import FrameProfiler
+from maze_replay import InputRecorder, load_recording
+from maze_raycaster import RaycastRenderer
+from maze_visibility import visible_cells, view_half_angle, cells_to_chunks
+
+RENDERERS = ("opengl", "raycast")
+MAX_CATCH_UP = 5  # Most ticks simulated in one frame after a stall
+
+START_CELL = (1, 1)  # Where the player spawns; the default goal is the cell furthest from it
+AUTO_TURN_SPEED = 0.1  # Radians per tick the view turns while auto-walking
+MINIMAP_RADIUS = 10  # Cells shown on each side of the player
+MINIMAP_SCALE = 6  # Pixels per cell
+
+# Pressed once to switch auto-walk on or off; recorded with the MOVE_* flags
+TOGGLE_AUTO_WALK = 64
+WALK_KEYS = MOVE_FORWARD | MOVE_BACK | MOVE_LEFT | MOVE_RIGHT
+
+KEY_BINDINGS = [
+    (pygame.K_w, MOVE_FORWARD),
+    (pygame.K_s, MOVE_BACK),
+    (pygame.K_a, MOVE_LEFT),
+    (pygame.K_d, MOVE_RIGHT),
+    (pygame.K_SPACE, MOVE_UP),
+    (pygame.K_LSHIFT, MOVE_DOWN),
+]
 
 class MazeGame3D:
-    def __init__(self):
-        # Initialize Pygame
+    def __init__(self, renderer="opengl", headless=False):
+        if renderer not in RENDERERS:
+            raise ValueError(f"unknown renderer {renderer!r}, pick one of {RENDERERS}")
+        if headless and renderer != "raycast":
+            raise ValueError("headless mode needs the raycast renderer")
+        
+        # Initialize Pygame (the dummy video driver needs no display)
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
         pygame.init()
         self.display_size = (800, 600)
-        self.screen = pygame.display.set_mode(self.display_size, pygame.DOUBLEBUF | pygame.OPENGL)
-        pygame.display.set_caption("3D Maze Explorer - Use WASD to move, Mouse to look around")
+        self.renderer = renderer
+        self.headless = headless
+        
+        # Camera
+        self.fov = 45
+        self.view_distance = 50.0
+        
+        # Colors
+        self.floor_color = (0.3, 0.3, 0.3)
+        self.wall_color = (0.2, 0.5, 0.8)
+        self.ceiling_color = (0.1, 0.1, 0.2)
+        
+        if renderer == "opengl":
+            self.screen = pygame.display.set_mode(self.display_size, pygame.DOUBLEBUF | pygame.OPENGL)
+            # Set up OpenGL
+            self.setup_opengl()
+        else:
+            self.raycaster = RaycastRenderer(*self.display_size, fov=self.fov,
+                                             view_distance=self.view_distance,
+                                             wall_color=self.wall_color,
+                                             floor_color=self.floor_color,
+                                             ceiling_color=self.ceiling_color)
+            self.screen = None if headless else pygame.display.set_mode(self.display_size)
+            
+        if self.screen is not None:
+            pygame.display.set_caption("3D Maze Explorer - Use WASD to move, Mouse to look around")
+            # Mouse control
+            pygame.mouse.set_visible(False)
+            pygame.event.set_grab(True)
         
-        # Set up OpenGL
-        self.setup_opengl()
+        # Raycast frames can be written to disk, e.g. for image-diff tests
+        self.last_frame = None
+        self.frame_dump_dir = None
+        self.frames_rendered = 0
+        self.max_frames = None  # Stop after this many frames (None = run until quit)
+        self.frame_rate = 0 if headless else 60  # 0 = as fast as possible
         
         # Game state
         self.running = True
         self.clock = pygame.time.Clock()
         
+        # Fixed-timestep simulation: movement advances in ticks of equal
+        # length however fast frames are drawn, and rendering blends the
+        # last two ticks.  In lockstep mode every frame is exactly one tick.
+        self.tick_rate = 60
+        self.ticks = 0
+        self.lockstep = headless
+        self.alpha = 1.0  # How far rendering is between the previous tick and this one
+        self.pressed_keys = 0  # MOVE_* flags held down, sampled once per frame
+        self.mouse_delta = (0, 0)  # Mouse motion of this frame
+        
+        # Input recording / replay (see maze_replay.py)
+        self.recorder = None
+        self.replay_frames = None
+        self._replay_index = 0
+        self._replay_ticks = 0
+        
+        # Frame timing, shown with F3 and written to profile_path on exit
+        self.profiler = FrameProfiler()
+        self.profile_path = None
+        self.show_profile = False
+        self._overlay = None
+        self._overlay_updated = 0.0
+        
+        # Navigation: flow fields give the next step towards the goal in O(1),
+        # for auto-walk (G) and the minimap arrow (M)
+        self.flow_fields = None
+        self.goal = None  # Goal cell (x, z); None = furthest from START_CELL, found on first use
+        self.auto_walk = False
+        self.show_minimap = False
+        
         # Player position and orientation
         self.player_pos = [1.5, 1.5]  # x, z coordinates (y is up)
         self.player_height = 0.5
         self.player_angle = 0  # Horizontal rotation
         self.player_vertical_angle = 0  # Vertical rotation
-        self.movement_speed = 0.1
-        self.rotation_speed = 0.002
+        self.movement_speed = MOVEMENT_SPEED
+        self.rotation_speed = ROTATION_SPEED
+        self.previous_pos = list(self.player_pos)  # Position at the previous tick
+        self.previous_height = self.player_height
         
-        # Mouse control
-        pygame.mouse.set_visible(False)
-        pygame.event.set_grab(True)
+        # Wall geometry is built once and reused until the maze changes
+        self.wall_mesh = WallMesh(lighting=BakedLighting(self.wall_color, cache_dir=default_cache_dir()))
+        self.cull_walls = True
+        self._maze = None
+        self._resident_chunk = None
+        self.maze_source = None  # How the maze was made, for recordings (None = built in)
         
         # Define the maze (1 = wall, 0 = path)
-        self.maze = [
+        self.maze = MazeGrid.from_array([
             [1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
             [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
             [1, 0, 1, 1, 0, 1, 1, 1, 0, 1],
@@ -44,63 +153,236 @@ class MazeGame3D:
             [1, 0, 0, 0, 0, 0, 0, 0, 0, 1],
             [1, 0, 1, 0, 1, 0, 1, 1, 0, 1],
             [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
-        ]
+        ])
         
-        # Colors
-        self.floor_color = (0.3, 0.3, 0.3)
-        self.wall_color = (0.2, 0.5, 0.8)
-        self.ceiling_color = (0.1, 0.1, 0.2)
+    @property
+    def maze(self):
+        """Maze grid (a MazeGrid; 1 = wall, 0 = path)"""
+        return self._maze
+        
+    @maze.setter
+    def maze(self, value):
+        if not isinstance(value, MazeGrid):
+            value = MazeGrid.from_array(value)
+        if self._maze is not None:
+            self._maze.remove_listener(self.wall_mesh.invalidate_cell)
+            self.flow_fields.close()
+        self._maze = value
+        self._maze.add_listener(self.wall_mesh.invalidate_cell)
+        self.flow_fields = FlowFieldCache(value, max_fields=4)
+        self.goal = None
+        self.invalidate_walls()
+        
+    def invalidate_walls(self):
+        """Throw away the whole wall mesh so it is rebuilt from self.maze"""
+        self.wall_mesh.attach(self.maze)
+        
+    def load_level(self, path):
+        """Memory-map a level file written by MazeGrid.save()"""
+        self.maze = MazeGrid.load(path)
+        self.maze_source = {"level": os.path.abspath(path)}
+        
+    def generate_maze(self, width, height, seed=None, algorithm="backtracker", braid=0.0):
+        """Replace the maze with a generated one (see maze_generator.py)"""
+        if seed is None:
+            seed = random.randrange(2**32)  # Recorded, so a replay builds the same maze
+        self.maze = generate_grid(width, height, seed, algorithm, braid)
+        self.maze_source = {"generate": [width, height], "seed": seed,
+                            "algorithm": algorithm, "braid": braid}
+        
+    def keep_nearby_resident(self):
+        """Let the OS drop level pages that are out of view distance"""
+        chunk = (int(self.player_pos[0]) >> CHUNK_SHIFT, int(self.player_pos[1]) >> CHUNK_SHIFT)
+        if chunk != self._resident_chunk:
+            self._resident_chunk = chunk
+            radius = int(self.view_distance) // CHUNK_SIZE + 1
+            self.maze.trim(self.player_pos[0], self.player_pos[1], radius)
+        
+    def goal_cell(self):
+        """The cell auto-walk heads for and the minimap arrow points at"""
+        if self.goal is None:
+            self.goal = self.flow_fields.get(START_CELL).farthest_cell()
+        return self.goal
+        
+    def next_step(self):
+        """(dx, dz) from the player's cell towards the goal, None at the goal or if cut off"""
+        field = self.flow_fields.get(self.goal_cell())
+        return field.next_step(int(self.player_pos[0]), int(self.player_pos[1]))
         
     def setup_opengl(self):
         """Initialize OpenGL settings"""
         glEnable(GL_DEPTH_TEST)
-        glEnable(GL_LIGHTING)
-        glEnable(GL_LIGHT0)
-        
-        # Set up lighting
-        glLightfv(GL_LIGHT0, GL_POSITION, [2, 5, 2, 1])
-        glLightfv(GL_LIGHT0, GL_AMBIENT, [0.2, 0.2, 0.2, 1])
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, [0.8, 0.8, 0.8, 1])
+        # No GL lights: wall lighting is baked into vertex colors (maze_lighting.py)
         
         glMatrixMode(GL_PROJECTION)
-        gluPerspective(45, (self.display_size[0] / self.display_size[1]), 0.1, 50.0)
+        gluPerspective(self.fov, (self.display_size[0] / self.display_size[1]), 0.1, self.view_distance)
         glMatrixMode(GL_MODELVIEW)
         
     def handle_events(self):
         """Handle keyboard and mouse events"""
+        if self.replay_frames is not None:
+            self.replay_events()
+            return
+            
+        mouse_dx, mouse_dy = 0, 0
+        toggle_auto_walk = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False
+                elif event.key == pygame.K_F3:
+                    self.show_profile = not self.show_profile
+                elif event.key == pygame.K_m:
+                    self.show_minimap = not self.show_minimap
+                elif event.key == pygame.K_g:
+                    toggle_auto_walk = True
             elif event.type == pygame.MOUSEMOTION:
-                # Mouse look
+                # Mouse look, summed over the frame
                 dx, dy = event.rel
-                self.player_angle -= dx * self.rotation_speed
-                self.player_vertical_angle -= dy * self.rotation_speed
-                # Limit vertical look
-                self.player_vertical_angle = max(-math.pi/3, min(math.pi/3, self.player_vertical_angle))
+                mouse_dx += dx
+                mouse_dy += dy
+        
+        # Looking around is applied right away; movement waits for update()
+        self.mouse_delta = (mouse_dx, mouse_dy)
+        self.apply_look(mouse_dx, mouse_dy)
         
         # Keyboard movement
         keys = pygame.key.get_pressed()
+        self.pressed_keys = 0
+        for key, flag in KEY_BINDINGS:
+            if keys[key]:
+                self.pressed_keys |= flag
+        if toggle_auto_walk:
+            self.pressed_keys |= TOGGLE_AUTO_WALK
+                
+    def replay_events(self):
+        """Take this frame's input from the loaded recording"""
+        # Still honour closing the window, but ignore live keys and mouse
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                self.running = False
+                
+        if self._replay_index >= len(self.replay_frames):
+            self.running = False
+            self._replay_ticks = 0
+            return
+            
+        ticks, keys, mouse_dx, mouse_dy = self.replay_frames[self._replay_index]
+        self._replay_index += 1
+        self._replay_ticks = ticks
+        self.pressed_keys = keys
+        self.mouse_delta = (mouse_dx, mouse_dy)
+        self.apply_look(mouse_dx, mouse_dy)
+        
+    def start_recording(self, path):
+        """Record every frame's input from now on"""
+        header = {
+            "maze": self.maze_source or {"cells": self.maze.to_array().tolist()},
+            "tick_rate": self.tick_rate,
+            "player": self.player_state(),
+            "auto_walk": self.auto_walk,
+        }
+        self.recorder = InputRecorder(path, header)
+        
+    def load_replay(self, path):
+        """Set up maze and player from a recording and replay it as fast as possible"""
+        header, frames = load_recording(path)
+        maze = header["maze"]
+        if "level" in maze:
+            self.load_level(maze["level"])
+        elif "generate" in maze:
+            self.generate_maze(*maze["generate"], maze["seed"], maze["algorithm"], maze["braid"])
+        else:
+            self.maze = maze["cells"]
+            
+        self.tick_rate = header["tick_rate"]
+        player = header["player"]
+        self.player_pos = list(player["pos"])
+        self.previous_pos = list(self.player_pos)
+        self.player_height = self.previous_height = player["height"]
+        self.player_angle = player["angle"]
+        self.player_vertical_angle = player["vertical_angle"]
+        self.auto_walk = header.get("auto_walk", False)
+        
+        self.replay_frames = frames.tolist()
+        self._replay_index = 0
+        self.frame_rate = 0
+        
+    def player_state(self):
+        """Position, height and view angles as a JSON-friendly dict"""
+        return {"pos": list(self.player_pos), "height": self.player_height,
+                "angle": self.player_angle, "vertical_angle": self.player_vertical_angle}
+        
+    def update(self):
+        """Advance the simulation by one fixed tick"""
+        self.previous_pos = list(self.player_pos)
+        self.previous_height = self.player_height
+        if self.auto_walk and self.pressed_keys & WALK_KEYS:
+            self.auto_walk = False  # Moving by hand takes the controls back
+        if self.auto_walk:
+            self.apply_input(self.pressed_keys & (MOVE_UP | MOVE_DOWN))
+            self.walk_towards_goal()
+        else:
+            self.apply_input(self.pressed_keys)
+        self.ticks += 1
+        
+    def walk_towards_goal(self):
+        """Move one tick along the flow field, turning the view to follow"""
+        step = self.next_step()
+        if step is None:
+            self.auto_walk = False  # Arrived, or the way has been walled off
+            return
+            
+        # Head for the centre of the next cell; the straight line there stays
+        # inside the current and next cell, so it never cuts a corner
+        x, z = self.player_pos
+        dx = int(x) + step[0] + 0.5 - x
+        dz = int(z) + step[1] + 0.5 - z
+        length = math.hypot(dx, dz)
+        move = min(self.movement_speed, length) / length
+        new_x, new_z = x + dx * move, z + dz * move
+        if not self.is_wall(int(new_x), int(new_z)):
+            self.player_pos[0] = new_x
+            self.player_pos[1] = new_z
+            
+        turn = (math.atan2(dx, dz) - self.player_angle + math.pi) % (2 * math.pi) - math.pi
+        self.player_angle += max(-AUTO_TURN_SPEED, min(AUTO_TURN_SPEED, turn))
+        
+    def apply_look(self, mouse_dx, mouse_dy):
+        """Turn the view by a mouse movement in pixels"""
+        self.player_angle -= mouse_dx * self.rotation_speed
+        self.player_vertical_angle -= mouse_dy * self.rotation_speed
+        # Limit vertical look
+        self.player_vertical_angle = max(-PITCH_LIMIT, min(PITCH_LIMIT, self.player_vertical_angle))
+        
+    def apply_input(self, keys, mouse_dx=0, mouse_dy=0):
+        """Advance the player by one tick of input
+
+        `keys` is a bitmask of the MOVE_* flags from maze_agents; AgentBatch
+        applies the same rules to many agents at once.
+        """
+        if mouse_dx or mouse_dy:
+            self.apply_look(mouse_dx, mouse_dy)
+        
         move_x, move_z = 0, 0
         
-        if keys[pygame.K_w]:  # Forward
+        if keys & MOVE_FORWARD:
             move_z -= self.movement_speed
-        if keys[pygame.K_s]:  # Backward
+        if keys & MOVE_BACK:
             move_z += self.movement_speed
-        if keys[pygame.K_a]:  # Left
+        if keys & MOVE_LEFT:
             move_x -= self.movement_speed
-        if keys[pygame.K_d]:  # Right
+        if keys & MOVE_RIGHT:
             move_x += self.movement_speed
-        if keys[pygame.K_SPACE]:  # Up
+        if keys & MOVE_UP:
             self.player_height += self.movement_speed
-        if keys[pygame.K_LSHIFT]:  # Down
+        if keys & MOVE_DOWN:
             self.player_height -= self.movement_speed
             
         # Limit player height
-        self.player_height = max(0.2, min(2.0, self.player_height))
+        self.player_height = max(MIN_HEIGHT, min(MAX_HEIGHT, self.player_height))
         
         # Apply movement with rotation
         new_x = self.player_pos[0] + move_x * math.cos(self.player_angle) + move_z * math.sin(self.player_angle)
@@ -113,9 +395,7 @@ class MazeGame3D:
             
     def is_wall(self, x, z):
         """Check if a position is a wall"""
-        if 0 <= x < len(self.maze[0]) and 0 <= z < len(self.maze):
-            return self.maze[z][x] == 1
-        return True  # Out of bounds counts as wall
+        return self.maze.is_wall(x, z)  # Out of bounds counts as wall
         
     def draw_floor_and_ceiling(self):
         """Draw the floor and ceiling"""
@@ -123,27 +403,42 @@ class MazeGame3D:
         glColor3f(*self.floor_color)
         glBegin(GL_QUADS)
         glVertex3f(-1, 0, -1)
-        glVertex3f(len(self.maze[0]) + 1, 0, -1)
-        glVertex3f(len(self.maze[0]) + 1, 0, len(self.maze) + 1)
-        glVertex3f(-1, 0, len(self.maze) + 1)
+        glVertex3f(self.maze.width + 1, 0, -1)
+        glVertex3f(self.maze.width + 1, 0, self.maze.height + 1)
+        glVertex3f(-1, 0, self.maze.height + 1)
         glEnd()
         
         # Ceiling
         glColor3f(*self.ceiling_color)
         glBegin(GL_QUADS)
         glVertex3f(-1, 2, -1)
-        glVertex3f(len(self.maze[0]) + 1, 2, -1)
-        glVertex3f(len(self.maze[0]) + 1, 2, len(self.maze) + 1)
-        glVertex3f(-1, 2, len(self.maze) + 1)
+        glVertex3f(self.maze.width + 1, 2, -1)
+        glVertex3f(self.maze.width + 1, 2, self.maze.height + 1)
+        glVertex3f(-1, 2, self.maze.height + 1)
         glEnd()
         
     def draw_walls(self):
-        """Draw the maze walls"""
+        """Draw the maze walls from the cached wall mesh"""
+        glColor3f(*self.wall_color)
+        self.wall_mesh.draw(self.visible_chunks() if self.cull_walls else None)
+        
+    def visible_chunks(self):
+        """Wall mesh chunks that can be seen from the current camera"""
+        aspect = self.display_size[0] / self.display_size[1]
+        half_angle = view_half_angle(self.fov, aspect, self.player_vertical_angle)
+        cam_x, cam_y, cam_z = self.eye_position()
+        xs, zs = visible_cells(self.maze, cam_x, cam_z, self.player_angle, half_angle,
+                               cam_y, self.view_distance)
+        return cells_to_chunks(xs, zs, self.maze.width, self.maze.height,
+                               self.wall_mesh.chunk_size)
+        
+    def draw_walls_immediate(self):
+        """Draw the maze walls one cube at a time (reference path for benchmarks)"""
         glColor3f(*self.wall_color)
         
-        for z in range(len(self.maze)):
-            for x in range(len(self.maze[0])):
-                if self.maze[z][x] == 1:
+        for z in range(self.maze.height):
+            for x in range(self.maze.width):
+                if self.maze.is_wall(x, z):
                     # Draw a cube for each wall segment
                     glPushMatrix()
                     glTranslatef(x + 0.5, 1, z + 0.5)
@@ -194,13 +489,114 @@ class MazeGame3D:
         
     def render(self):
         """Render the 3D scene"""
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        if self.renderer == "raycast":
+            self.render_raycast()
+            return
+            
+        with self.profiler.phase("draw_floor_and_ceiling"):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            self.setup_camera()
+            self.draw_floor_and_ceiling()
+            
+        with self.profiler.phase("draw_walls"):
+            self.draw_walls()
+            
+        with self.profiler.phase("flip"):
+            if self.show_profile:
+                self.draw_surface_gl(self.overlay_surface(), 8, 8)
+            if self.show_minimap:
+                minimap = self.minimap_surface()
+                self.draw_surface_gl(minimap, self.display_size[0] - minimap.get_width() - 8, 8)
+            pygame.display.flip()
+        self.frames_rendered += 1
+        
+    def render_raycast(self):
+        """Render the scene on the CPU into self.last_frame"""
+        cam_x, cam_y, cam_z = self.eye_position()
+        with self.profiler.phase("draw_walls"):
+            self.last_frame = self.raycaster.render(self.maze, cam_x, cam_z, self.player_angle,
+                                                    self.player_vertical_angle, cam_y)
+        self.frames_rendered += 1
+        
+        with self.profiler.phase("flip"):
+            if self.screen is not None:
+                pygame.surfarray.blit_array(self.screen, self.last_frame.swapaxes(0, 1))
+                if self.show_profile:
+                    self.screen.blit(self.overlay_surface(), (8, 8))
+                if self.show_minimap:
+                    minimap = self.minimap_surface()
+                    self.screen.blit(minimap, (self.display_size[0] - minimap.get_width() - 8, 8))
+                pygame.display.flip()
+                
+            if self.frame_dump_dir:
+                self.save_frame(os.path.join(self.frame_dump_dir, f"frame_{self.frames_rendered:06d}.png"))
+            
+    def overlay_surface(self):
+        """Frame timing percentiles as a text surface, refreshed 4 times a second"""
+        now = time.perf_counter()
+        if self._overlay is None or now - self._overlay_updated > 0.25:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(None, 20)
+            lines = [font.render(line, True, (255, 255, 255)) for line in self.profiler.overlay_lines()]
+            width = max(line.get_width() for line in lines) + 8
+            height = sum(line.get_height() for line in lines) + 8
+            self._overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+            self._overlay.fill((0, 0, 0, 160))
+            y = 4
+            for line in lines:
+                self._overlay.blit(line, (4, y))
+                y += line.get_height()
+            self._overlay_updated = now
+        return self._overlay
+        
+    def minimap_surface(self):
+        """Top-down view of the cells around the player, with an arrow towards the goal"""
+        radius, scale = MINIMAP_RADIUS, MINIMAP_SCALE
+        px, pz = int(self.player_pos[0]), int(self.player_pos[1])
+        cells = self.maze.region(px - radius, pz - radius, px + radius + 1, pz + radius + 1)
+        
+        palette = np.array([self.floor_color, self.wall_color]) * 255
+        image = palette[cells].astype(np.uint8)
+        goal_x, goal_z = self.goal_cell()
+        if abs(goal_x - px) <= radius and abs(goal_z - pz) <= radius:
+            image[goal_z - pz + radius, goal_x - px + radius] = (60, 220, 60)
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+        surface = pygame.surfarray.make_surface(image.swapaxes(0, 1))
+        
+        # Player dot, and an arrow one cell long along the next step
+        centre = ((radius + 0.5) * scale, (radius + 0.5) * scale)
+        pygame.draw.circle(surface, (255, 255, 255), centre, scale // 2)
+        step = self.next_step()
+        if step is not None:
+            tip = (centre[0] + step[0] * scale * 1.5, centre[1] + step[1] * scale * 1.5)
+            side = (-step[1] * scale * 0.5, step[0] * scale * 0.5)
+            base = (centre[0] + step[0] * scale * 0.5, centre[1] + step[1] * scale * 0.5)
+            pygame.draw.polygon(surface, (255, 220, 0), [
+                tip, (base[0] + side[0], base[1] + side[1]), (base[0] - side[0], base[1] - side[1])])
+        return surface
+        
+    def draw_surface_gl(self, surface, left, top):
+        """Draw a 2D surface over the GL scene, `left`/`top` pixels from the top left"""
+        pixels = pygame.image.tostring(surface, "RGBA", True)
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glWindowPos2d(left, self.display_size[1] - surface.get_height() - top)
+        glDrawPixels(surface.get_width(), surface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        glPopAttrib()
+        
+    def save_frame(self, path):
+        """Write the last raycast frame as an image"""
+        pygame.image.save(pygame.surfarray.make_surface(self.last_frame.swapaxes(0, 1)), path)
+        
+    def setup_camera(self):
+        """Load the view matrix for the player's eye"""
         glLoadIdentity()
         
         # Set camera position and orientation
-        cam_x = self.player_pos[0]
-        cam_y = self.player_height
-        cam_z = self.player_pos[1]
+        cam_x, cam_y, cam_z = self.eye_position()
         
         look_x = cam_x + math.sin(self.player_angle) * math.cos(self.player_vertical_angle)
         look_y = cam_y + math.sin(self.player_vertical_angle)
@@ -210,21 +606,114 @@ class MazeGame3D:
                   look_x, look_y, look_z,  # Look at point
                   0, 1, 0)  # Up vector
         
-        # Draw the scene
-        self.draw_floor_and_ceiling()
-        self.draw_walls()
-        
-        pygame.display.flip()
+    def eye_position(self):
+        """Camera position (x, y, z) blended between the last two ticks"""
+        a = self.alpha
+        return (self.previous_pos[0] + (self.player_pos[0] - self.previous_pos[0]) * a,
+                self.previous_height + (self.player_height - self.previous_height) * a,
+                self.previous_pos[1] + (self.player_pos[1] - self.previous_pos[1]) * a)
         
     def run(self):
         """Main game loop"""
+        tick_length = 1 / self.tick_rate
+        lag = 0.0
+        previous = time.perf_counter()
+        
         while self.running:
-            self.handle_events()
+            now = time.perf_counter()
+            # Cap the catch-up after a stall so we never spiral into ticks
+            lag += min(now - previous, MAX_CATCH_UP * tick_length)
+            previous = now
+            
+            with self.profiler.phase("events"):
+                self.handle_events()
+                
+            with self.profiler.phase("update"):
+                if self.replay_frames is not None:
+                    ticks = self._replay_ticks
+                    self.alpha = 1.0
+                elif self.lockstep:
+                    ticks = 1
+                    self.alpha = 1.0
+                else:
+                    ticks = int(lag // tick_length)
+                    lag -= ticks * tick_length
+                    self.alpha = lag / tick_length
+                    
+                if self.pressed_keys & TOGGLE_AUTO_WALK:
+                    self.auto_walk = not self.auto_walk
+                for _ in range(ticks):
+                    self.update()
+                self.keep_nearby_resident()
+                
+            if self.recorder is not None:
+                self.recorder.record(ticks, self.pressed_keys, *self.mouse_delta)
+                
+            if not self.running:
+                break
+                
             self.render()
-            self.clock.tick(60)
+            self.profiler.end_frame()
+            self.clock.tick(self.frame_rate)
             
+            if self.max_frames is not None and self.frames_rendered >= self.max_frames:
+                self.running = False
+                
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.profile_path:
+            self.profiler.dump(self.profile_path, renderer=self.renderer, ticks=self.ticks,
+                               maze=[self.maze.width, self.maze.height],
+                               final_player=self.player_state())
+        self.wall_mesh.release()
         pygame.quit()
 
 if __name__ == "__main__":
-    game = MazeGame3D()
-    game.run()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="3D Maze Explorer")
+    parser.add_argument("--level", help="maze level file to load (see maze_grid.py)")
+    parser.add_argument("--generate", metavar="WxH", help="play a generated maze, e.g. 201x201")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="backtracker")
+    parser.add_argument("--braid", type=float, default=0.0,
+                        help="fraction of dead ends to remove from the generated maze")
+    parser.add_argument("--renderer", choices=RENDERERS, default="opengl")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window (raycast renderer only)")
+    parser.add_argument("--frames", type=int, help="quit after this many frames")
+    parser.add_argument("--dump-frames", metavar="DIR", help="save every raycast frame as PNG")
+    parser.add_argument("--profile-out", metavar="FILE",
+                        help="write frame timing percentiles as JSON on exit")
+    parser.add_argument("--auto-walk", action="store_true",
+                        help="start walking to the goal (the cell furthest from the start)")
+    parser.add_argument("--record", metavar="FILE", help="record input to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recording as fast as possible (maze comes from the file)")
+    args = parser.parse_args()
+    
+    game = MazeGame3D(renderer=args.renderer, headless=args.headless)
+    game.max_frames = args.frames
+    game.profile_path = args.profile_out
+    if args.dump_frames:
+        os.makedirs(args.dump_frames, exist_ok=True)
+        game.frame_dump_dir = args.dump_frames
+    if args.replay:
+        game.load_replay(args.replay)
+    elif args.level:
+        game.load_level(args.level)
+    elif args.generate:
+        width, height = (int(n) for n in args.generate.lower().split("x"))
+        game.generate_maze(width, height, args.seed, args.algorithm, args.braid)
+    if args.auto_walk:
+        game.auto_walk = True
+    if args.record:
+        game.start_recording(args.record)
+        
+    start = time.perf_counter()
+    game.run()
+    if args.replay:
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {game.frames_rendered} frames ({game.ticks} ticks) in {elapsed:.2f} s, "
+              f"{game.frames_rendered / elapsed:.0f} FPS")
+        print(f"Final player state: {game.player_state()}")
@@ -0,0 +1,95 @@
+"""
+Headless batch simulation of maze agents.
+
+AgentBatch steps any number of agents through the same movement and
+collision rules as MazeGame3D.apply_input(), one vectorized NumPy call
+per tick, without a window.  Input per agent is a bitmask of the
+MOVE_* flags below plus a mouse delta, exactly what one frame of
+keyboard and mouse gives the player.
+
+    agents = AgentBatch(grid, 10000)
+    agents.step(rng.integers(0, 64, 10000), mouse_dx=rng.normal(0, 20, 10000))
+"""
+
+import math
+
+import numpy as np
+
+# Input flags, one bit per key (see KEY_BINDINGS in main.py)
+MOVE_FORWARD = 1
+MOVE_BACK = 2
+MOVE_LEFT = 4
+MOVE_RIGHT = 8
+MOVE_UP = 16
+MOVE_DOWN = 32
+
+# Movement rules shared with MazeGame3D
+MOVEMENT_SPEED = 0.1
+ROTATION_SPEED = 0.002
+PITCH_LIMIT = math.pi / 3
+MIN_HEIGHT = 0.2
+MAX_HEIGHT = 2.0
+
+
+class AgentBatch:
+    """Positions, angles and heights of N agents as NumPy arrays"""
+
+    def __init__(self, grid, count, start=(1.5, 1.5), height=0.5,
+                 movement_speed=MOVEMENT_SPEED, rotation_speed=ROTATION_SPEED):
+        self.grid = grid
+        self.count = count
+        self.movement_speed = movement_speed
+        self.rotation_speed = rotation_speed
+        self.positions = np.empty((count, 2))  # x, z per agent
+        self.angles = np.empty(count)
+        self.vertical_angles = np.empty(count)
+        self.heights = np.empty(count)
+        self.reset(start, height)
+
+    def reset(self, start=(1.5, 1.5), height=0.5):
+        """Put every agent back at the start, looking along +z"""
+        self.positions[:] = start
+        self.angles[:] = 0
+        self.vertical_angles[:] = 0
+        self.heights[:] = height
+
+    def step(self, keys, mouse_dx=0, mouse_dy=0):
+        """Advance all agents by one tick
+
+        `keys` is a MOVE_* bitmask per agent (or one for all); mouse deltas
+        are pixels, per agent or shared.  Returns a bool array that is
+        True where the agent's move was blocked by a wall.
+        """
+        keys = np.broadcast_to(np.asarray(keys, dtype=np.uint8), (self.count,))
+        speed = self.movement_speed
+
+        # Mouse look
+        self.angles -= np.asarray(mouse_dx) * self.rotation_speed
+        self.vertical_angles -= np.asarray(mouse_dy) * self.rotation_speed
+        np.clip(self.vertical_angles, -PITCH_LIMIT, PITCH_LIMIT, out=self.vertical_angles)
+
+        # Keyboard movement: each key adds or subtracts one speed step
+        def axis(negative, positive):
+            return speed * (((keys & positive) != 0).astype(np.float64)
+                            - ((keys & negative) != 0))
+
+        move_z = axis(MOVE_FORWARD, MOVE_BACK)
+        move_x = axis(MOVE_LEFT, MOVE_RIGHT)
+        self.heights += axis(MOVE_DOWN, MOVE_UP)
+        np.clip(self.heights, MIN_HEIGHT, MAX_HEIGHT, out=self.heights)
+
+        # Apply movement with rotation
+        sin, cos = np.sin(self.angles), np.cos(self.angles)
+        new_x = self.positions[:, 0] + move_x * cos + move_z * sin
+        new_z = self.positions[:, 1] + move_z * cos - move_x * sin
+
+        # Collision detection; astype truncates towards zero like int()
+        blocked = self.grid.walls_at(new_x.astype(np.int64), new_z.astype(np.int64))
+        free = ~blocked
+        self.positions[free, 0] = new_x[free]
+        self.positions[free, 1] = new_z[free]
+        return blocked
+
+    def cells(self):
+        """Grid cell of every agent as (xs, zs)"""
+        return self.positions[:, 0].astype(np.int64), self.positions[:, 1].astype(np.int64)
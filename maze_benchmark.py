@@ -0,0 +1,364 @@
+"""
+Benchmarks for the 3D maze.
+
+    python maze_benchmark.py walls --size 201 --frames 200
+
+`walls` renders the same view with the old per-cube immediate mode path
+and with the cached wall mesh and prints the frame times of both.  It
+needs a display with OpenGL.
+
+    python maze_benchmark.py visibility --size 1001
+
+`visibility` times the culling pass on its own (no window) and reports
+how many chunks survive it.
+
+    python maze_benchmark.py storage --size 10000
+
+`storage` writes a level file (once), then reports how long it takes to
+open it and how much resident memory the game touches while moving
+around in one corner of it.
+
+    python maze_benchmark.py generate --size 2001 --braid 0.3
+
+`generate` reports cells generated per second for each algorithm.
+
+    python maze_benchmark.py raycast --size 201 --resolution 800x600
+
+`raycast` times the CPU raycasting renderer while spinning through a
+generated maze.
+
+    python maze_benchmark.py agents --count 10000 --ticks 500
+
+`agents` steps a batch of randomly driven agents and reports agent
+ticks per second.
+
+    python maze_benchmark.py flowfield --size 1001 --edits 200
+
+`flowfield` times building a flow field, next-step lookups, and
+repairing the field after random cells are toggled, compared with
+rebuilding it from scratch.
+
+    python maze_benchmark.py lighting --size 1001
+
+`lighting` meshes and lights every wall chunk with an empty cache, then
+again with the cache filled, and reports both (no window).
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+
+def random_maze(size, wall_ratio=0.3, seed=0):
+    """Square maze with a solid border and randomly scattered walls"""
+    rng = np.random.default_rng(seed)
+    maze = (rng.random((size, size)) < wall_ratio).astype(np.uint8)
+    maze[0, :] = maze[-1, :] = 1
+    maze[:, 0] = maze[:, -1] = 1
+    maze[1, 1] = 0
+    return maze
+
+
+def summarize(name, samples):
+    """Print mean / p50 / p95 of a list of durations in seconds"""
+    ms = np.array(samples) * 1000
+    print(f"{name:>12}: mean {ms.mean():8.2f} ms  p50 {np.percentile(ms, 50):8.2f} ms"
+          f"  p95 {np.percentile(ms, 95):8.2f} ms")
+
+
+def bench_walls(args):
+    """Compare immediate mode walls against the cached wall mesh"""
+    from OpenGL.GL import glClear, glFinish, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT
+
+    from main import MazeGame3D
+
+    game = MazeGame3D()
+    game.maze = random_maze(args.size)
+    # Look diagonally across the whole maze so nothing is clipped away
+    game.player_pos = [1.5, 1.5]
+    game.player_height = 2.0
+    game.player_angle = math.pi / 4
+
+    def frame(draw):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        game.setup_camera()
+        game.draw_floor_and_ceiling()
+        draw()
+        glFinish()
+
+    start = time.perf_counter()
+    frame(game.draw_walls)  # First frame builds and uploads the mesh
+    print(f"mesh build: {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"for {len(game.wall_mesh.chunks)} chunks")
+
+    for name, draw in [("immediate", game.draw_walls_immediate), ("mesh", game.draw_walls)]:
+        samples = []
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            frame(draw)
+            samples.append(time.perf_counter() - start)
+        summarize(name, samples)
+
+    game.wall_mesh.release()
+
+
+def bench_visibility(args):
+    """Time visible_cells() and count the chunks it keeps"""
+    from maze_grid import MazeGrid
+    from maze_mesh import CHUNK_SIZE
+    from maze_visibility import cells_to_chunks, view_half_angle, visible_cells
+
+    maze = random_maze(args.size)
+    grid = MazeGrid.from_array(maze)
+    rng = np.random.default_rng(1)
+    open_z, open_x = np.nonzero(maze == 0)
+    total = ((args.size + CHUNK_SIZE - 1) // CHUNK_SIZE) ** 2
+
+    for eye_height in (0.5, 1.0):
+        samples, kept = [], []
+        for _ in range(args.frames):
+            i = rng.integers(len(open_x))
+            angle = rng.uniform(-math.pi, math.pi)
+            start = time.perf_counter()
+            half_angle = view_half_angle(45, 4 / 3, 0.0)
+            xs, zs = visible_cells(grid, open_x[i] + 0.5, open_z[i] + 0.5, angle,
+                                   half_angle, eye_height, 50.0)
+            chunks = cells_to_chunks(xs, zs, args.size, args.size, CHUNK_SIZE)
+            samples.append(time.perf_counter() - start)
+            kept.append(len(chunks))
+        summarize(f"eye {eye_height}", samples)
+        print(f"{'':>12}  chunks drawn: mean {np.mean(kept):.1f} of {total}")
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux only)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def bench_storage(args):
+    """Open a big level file and measure startup time and resident memory"""
+    from maze_grid import CHUNK_SIZE, MazeGrid
+
+    path = args.level or f"maze_{args.size}.level"
+    if not os.path.exists(path):
+        print(f"writing {path} ...")
+        grid = MazeGrid(args.size, args.size)
+        rng = np.random.default_rng(0)
+        for cz in range(grid.chunks_z):
+            grid.chunks[cz] = rng.random(grid.chunks[cz].shape) < 0.3
+        grid.save(path)
+        del grid
+
+    # Query positions are generated up front so they don't count towards RSS
+    rng = np.random.default_rng(1)
+    xs = rng.integers(0, 200, args.queries).tolist()
+    zs = rng.integers(0, 200, args.queries).tolist()
+
+    before = rss_mb()
+    start = time.perf_counter()
+    grid = MazeGrid.load(path)
+    print(f"load: {(time.perf_counter() - start) * 1000:.2f} ms for "
+          f"{grid.width}x{grid.height}, RSS +{rss_mb() - before:.1f} MB")
+
+    # Wander around one spot like a player would, querying is_wall
+    start = time.perf_counter()
+    for x, z in zip(xs, zs):
+        grid.is_wall(x, z)
+    elapsed = time.perf_counter() - start
+    print(f"is_wall: {elapsed / args.queries * 1e9:.0f} ns/query, "
+          f"RSS +{rss_mb() - before:.1f} MB after touching a 200x200 area")
+
+    # Sweep across the level, trimming behind the player
+    for step in range(0, grid.width, CHUNK_SIZE):
+        grid.is_wall(step, step)
+        grid.trim(step, step, 2)
+    print(f"diagonal walk with trim: RSS +{rss_mb() - before:.1f} MB")
+
+    if args.baseline:
+        before = rss_mb()
+        start = time.perf_counter()
+        rows = [[int(cell) for cell in row] for row in grid.region(0, 0, args.baseline, args.baseline)]
+        print(f"list of lists {args.baseline}x{args.baseline}: "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms, RSS +{rss_mb() - before:.1f} MB")
+        del rows
+
+    grid.close()
+
+
+def bench_generate(args):
+    """Cells per second of every maze generator algorithm"""
+    from maze_generator import ALGORITHMS, generate
+
+    for algorithm in ALGORITHMS:
+        samples = []
+        for seed in range(args.repeat):
+            start = time.perf_counter()
+            generate(args.size, args.size, seed, algorithm, args.braid)
+            samples.append(time.perf_counter() - start)
+        best = min(samples)
+        print(f"{algorithm:>12}: {args.size}x{args.size} in {best * 1000:8.1f} ms, "
+              f"{args.size * args.size / best / 1e6:6.2f} M cells/s")
+
+
+def bench_raycast(args):
+    """Frame time of the CPU raycaster on a generated maze"""
+    from maze_generator import generate_grid
+    from maze_raycaster import RaycastRenderer
+
+    width, height = (int(n) for n in args.resolution.lower().split("x"))
+    grid = generate_grid(args.size, args.size, seed=0, braid=0.3)
+    renderer = RaycastRenderer(width, height)
+    rng = np.random.default_rng(1)
+    open_z, open_x = np.nonzero(grid.to_array() == 0)
+
+    samples = []
+    for _ in range(args.frames):
+        i = rng.integers(len(open_x))
+        start = time.perf_counter()
+        renderer.render(grid, open_x[i] + 0.5, open_z[i] + 0.5,
+                        rng.uniform(-math.pi, math.pi), rng.uniform(-0.5, 0.5), 1.0)
+        samples.append(time.perf_counter() - start)
+    summarize("raycast", samples)
+    print(f"{'':>12}  {1 / np.mean(samples):.0f} FPS at {width}x{height}")
+
+
+def bench_agents(args):
+    """Agent ticks per second of the batch simulation"""
+    from maze_agents import AgentBatch
+    from maze_generator import generate_grid
+
+    grid = generate_grid(args.size, args.size, seed=0, braid=0.3)
+    agents = AgentBatch(grid, args.count)
+    rng = np.random.default_rng(1)
+    # Random inputs are drawn up front so only the simulation is timed
+    keys = rng.integers(0, 64, (args.ticks, args.count), dtype=np.uint8)
+    mouse = rng.normal(0, 20, (args.ticks, args.count))
+
+    start = time.perf_counter()
+    for tick in range(args.ticks):
+        agents.step(keys[tick], mouse[tick])
+    elapsed = time.perf_counter() - start
+    print(f"{args.count} agents x {args.ticks} ticks in {elapsed:.2f} s: "
+          f"{args.count * args.ticks / elapsed / 1e6:.2f} M agent-ticks/s, "
+          f"{args.ticks / elapsed:.0f} ticks/s")
+
+
+def bench_flowfield(args):
+    """Flow field build, lookup and incremental repair times"""
+    from maze_flowfield import FlowField, FlowFieldCache
+    from maze_generator import generate_grid
+
+    grid = generate_grid(args.size, args.size, seed=0, braid=args.braid)
+    start = time.perf_counter()
+    field = FlowField(grid, (1, 1))
+    build = time.perf_counter() - start
+    print(f"build: {build * 1000:.1f} ms for {grid.width * grid.height} cells, "
+          f"longest route {field.distances().max()} steps")
+
+    rng = np.random.default_rng(1)
+    xs = rng.integers(0, grid.width, 100000)
+    zs = rng.integers(0, grid.height, 100000)
+    start = time.perf_counter()
+    for x, z in zip(xs.tolist(), zs.tolist()):
+        field.next_step(x, z)
+    print(f"lookup: {(time.perf_counter() - start) / len(xs) * 1e9:.0f} ns per next_step")
+
+    # Toggle interior cells and put them back, timing each repair
+    cache = FlowFieldCache(grid)
+    cache.fields[(1, 1)] = field
+    cells = rng.integers(2, args.size - 1, (args.edits, 2))
+    samples = []
+    for x, z in cells.tolist():
+        value = int(grid.is_wall(x, z))
+        for new in (1 - value, value):
+            start = time.perf_counter()
+            grid.set_cell(x, z, new)
+            samples.append(time.perf_counter() - start)
+    summarize("repair", samples)
+    print(f"(full rebuild: {build * 1000:.1f} ms)")
+
+
+def bench_lighting(args):
+    """Baking wall chunks from scratch vs loading them from the disk cache"""
+    import tempfile
+    from maze_generator import generate_grid
+    from maze_lighting import BakedLighting
+    from maze_mesh import wall_block, build_chunk_mesh, chunk_bounds
+
+    grid = generate_grid(args.size, args.size, seed=0, braid=0.3)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("no cache", "cold cache", "warm cache"):
+            lighting = BakedLighting(cache_dir=None if label == "no cache" else cache_dir)
+            start = time.perf_counter()
+            for _, _, x0, z0, width, height in chunk_bounds(grid.width, grid.height):
+                block = wall_block(grid, x0, z0, width, height)
+                baked = lighting.load(block, x0, z0)
+                if baked is None:
+                    vertices, normals, occlusion, _ = build_chunk_mesh(block, x0, z0)
+                    baked = np.hstack([vertices, lighting.colors(normals, occlusion)])
+                    lighting.store(block, x0, z0, baked)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>10}: {elapsed * 1000:8.1f} ms  "
+                  f"({lighting.hits} cache hits, {lighting.misses} misses)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="3D maze benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    walls = commands.add_parser("walls", help="immediate mode vs wall mesh frame time")
+    walls.add_argument("--size", type=int, default=201, help="maze side length in cells")
+    walls.add_argument("--frames", type=int, default=200)
+    walls.set_defaults(func=bench_walls)
+
+    visibility = commands.add_parser("visibility", help="culling cost and chunks kept")
+    visibility.add_argument("--size", type=int, default=1001, help="maze side length in cells")
+    visibility.add_argument("--frames", type=int, default=200)
+    visibility.set_defaults(func=bench_visibility)
+
+    storage = commands.add_parser("storage", help="level file load time and memory")
+    storage.add_argument("--size", type=int, default=10000, help="maze side length in cells")
+    storage.add_argument("--level", help="existing level file to use instead")
+    storage.add_argument("--queries", type=int, default=1000000)
+    storage.add_argument("--baseline", type=int, default=0, metavar="N",
+                         help="also build an N x N list of lists for comparison")
+    storage.set_defaults(func=bench_storage)
+
+    gen = commands.add_parser("generate", help="maze generator throughput")
+    gen.add_argument("--size", type=int, default=2001, help="maze side length in cells")
+    gen.add_argument("--braid", type=float, default=0.0)
+    gen.add_argument("--repeat", type=int, default=3)
+    gen.set_defaults(func=bench_generate)
+
+    raycast = commands.add_parser("raycast", help="CPU raycaster frame time")
+    raycast.add_argument("--size", type=int, default=201, help="maze side length in cells")
+    raycast.add_argument("--resolution", default="800x600")
+    raycast.add_argument("--frames", type=int, default=200)
+    raycast.set_defaults(func=bench_raycast)
+
+    agents = commands.add_parser("agents", help="batch agent simulation throughput")
+    agents.add_argument("--size", type=int, default=201, help="maze side length in cells")
+    agents.add_argument("--count", type=int, default=10000)
+    agents.add_argument("--ticks", type=int, default=500)
+    agents.set_defaults(func=bench_agents)
+
+    flowfield = commands.add_parser("flowfield", help="flow field build and repair cost")
+    flowfield.add_argument("--size", type=int, default=1001, help="maze side length in cells")
+    flowfield.add_argument("--braid", type=float, default=0.3)
+    flowfield.add_argument("--edits", type=int, default=200)
+    flowfield.set_defaults(func=bench_flowfield)
+
+    lighting = commands.add_parser("lighting", help="baked lighting and its disk cache")
+    lighting.add_argument("--size", type=int, default=1001, help="maze side length in cells")
+    lighting.set_defaults(func=bench_lighting)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Flow-field navigation for the 3D maze.
+
+A FlowField is a breadth-first search run once from a target cell: every
+cell stores its walking distance to the target and which neighbour to
+step to next, so "which way to the goal?" is a single lookup however
+big the maze is.  When cells change the field is repaired locally:
+
+- a cell that opens spreads shorter distances outwards from itself;
+- a cell that closes only invalidates the cells whose route ran through
+  it (its subtree in the next-step forest), which are re-solved from
+  their still-valid neighbours.
+
+FlowFieldCache keeps fields for the most recently used targets and
+forwards MazeGrid cell changes to them.
+"""
+
+import heapq
+from array import array
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Next-step codes; 0 means "at the target" or "cannot reach it"
+STEPS = [None, (1, 0), (-1, 0), (0, 1), (0, -1)]
+OPPOSITE = [0, 2, 1, 4, 3]
+
+
+class FlowField:
+    """Distance to a target and next step towards it for every cell"""
+
+    def __init__(self, grid, target):
+        self.grid = grid
+        self.target = target
+        # Work on the maze with a one-cell wall border, flattened, so that
+        # neighbours are fixed offsets and never need bounds checks
+        self.stride = grid.width + 2
+        self.offsets = [0, 1, -1, self.stride, -self.stride]
+        walls = np.pad(grid.to_array() != 0, 1, constant_values=True)
+        self.blocked = bytearray(walls.astype(np.uint8).tobytes())
+        self.rebuild()
+
+    def _index(self, x, z):
+        return (z + 1) * self.stride + x + 1
+
+    def rebuild(self):
+        """Run the full breadth-first search from the target"""
+        size = len(self.blocked)
+        self.dist = array("i", [-1]) * size
+        self.next = bytearray(size)
+        start = self._index(*self.target)
+        if self.blocked[start]:
+            return
+        self.dist[start] = 0
+        self._spread(deque([start]))
+
+    def _spread(self, queue):
+        """Breadth-first relaxation from the cells in `queue`"""
+        dist, nxt, blocked = self.dist, self.next, self.blocked
+        steps = list(zip(self.offsets[1:], OPPOSITE[1:]))
+        while queue:
+            cell = queue.popleft()
+            d = dist[cell] + 1
+            for offset, back in steps:
+                neighbour = cell + offset
+                if not blocked[neighbour] and (dist[neighbour] < 0 or dist[neighbour] > d):
+                    dist[neighbour] = d
+                    nxt[neighbour] = back  # Step back towards `cell`
+                    queue.append(neighbour)
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def next_step(self, x, z):
+        """(dx, dz) to walk from cell (x, z) towards the target, or None"""
+        if not (0 <= x < self.grid.width and 0 <= z < self.grid.height):
+            return None
+        return STEPS[self.next[self._index(x, z)]]
+
+    def distance(self, x, z):
+        """Steps from (x, z) to the target, -1 if unreachable"""
+        if not (0 <= x < self.grid.width and 0 <= z < self.grid.height):
+            return -1
+        return self.dist[self._index(x, z)]
+
+    def distances(self):
+        """All distances as a (height, width) int32 array (-1 = unreachable)"""
+        padded = np.frombuffer(self.dist, dtype=np.int32).reshape(-1, self.stride)
+        return padded[1:-1, 1:-1]
+
+    def farthest_cell(self):
+        """The reachable cell furthest from the target, as (x, z)"""
+        distances = self.distances()
+        z, x = np.unravel_index(np.argmax(distances), distances.shape)
+        return int(x), int(z)
+
+    # -------------------------------------------------------------------------
+    # Incremental updates
+    # -------------------------------------------------------------------------
+
+    def cell_changed(self, x, z):
+        """Bring the field up to date after cell (x, z) of the grid changed"""
+        cell = self._index(x, z)
+        wall = self.grid.is_wall(x, z)
+        if wall == bool(self.blocked[cell]):
+            return
+        self.blocked[cell] = wall
+
+        if (x, z) == tuple(self.target):
+            self.rebuild()
+        elif wall:
+            self._close(cell)
+        else:
+            self._open(cell)
+
+    def _open(self, cell):
+        """A wall became path: it may offer shorter routes to its neighbours"""
+        best, step = -1, 0
+        for code in range(1, 5):
+            d = self.dist[cell + self.offsets[code]]
+            if d >= 0 and (best < 0 or d < best):
+                best, step = d, code
+        if best < 0:
+            return  # Not connected to the target (yet)
+        self.dist[cell] = best + 1
+        self.next[cell] = step
+        self._spread(deque([cell]))
+
+    def _close(self, cell):
+        """A path became wall: re-solve every cell whose route used it"""
+        dist, nxt, offsets = self.dist, self.next, self.offsets
+
+        # Collect the subtree of cells whose next steps lead into `cell`,
+        # clearing them as we go so every cell is visited once
+        subtree = []
+        dist[cell], nxt[cell] = -1, 0
+        queue = deque([cell])
+        while queue:
+            current = queue.popleft()
+            for code in range(1, 5):
+                neighbour = current + offsets[code]
+                if dist[neighbour] >= 0 and nxt[neighbour] == OPPOSITE[code]:
+                    dist[neighbour], nxt[neighbour] = -1, 0
+                    subtree.append(neighbour)
+                    queue.append(neighbour)
+
+        # Re-seed the subtree from neighbours that kept a valid distance
+        heap = []
+        for member in subtree:
+            for code in range(1, 5):
+                d = dist[member + offsets[code]]
+                if d >= 0:
+                    heapq.heappush(heap, (d + 1, member, code))
+
+        while heap:
+            d, member, code = heapq.heappop(heap)
+            if self.blocked[member] or (0 <= dist[member] <= d):
+                continue
+            dist[member] = d
+            nxt[member] = code
+            for back in range(1, 5):
+                neighbour = member + offsets[back]
+                if not self.blocked[neighbour] and (dist[neighbour] < 0 or dist[neighbour] > d + 1):
+                    heapq.heappush(heap, (d + 1, neighbour, OPPOSITE[back]))
+
+
+class FlowFieldCache:
+    """Flow fields for recently used targets, kept in sync with the grid"""
+
+    def __init__(self, grid, max_fields=8):
+        self.grid = grid
+        self.max_fields = max_fields
+        self.fields = OrderedDict()  # target -> FlowField
+        grid.add_listener(self._cell_changed)
+
+    def get(self, target):
+        """Flow field towards `target` (x, z), computed on first use"""
+        target = tuple(target)
+        if target in self.fields:
+            self.fields.move_to_end(target)
+        else:
+            self.fields[target] = FlowField(self.grid, target)
+            while len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        return self.fields[target]
+
+    def _cell_changed(self, x, z):
+        for field in self.fields.values():
+            field.cell_changed(x, z)
+
+    def close(self):
+        """Stop following grid changes"""
+        self.grid.remove_listener(self._cell_changed)
+        self.fields.clear()
@@ -0,0 +1,168 @@
+"""
+Procedural mazes for the 3D maze game.
+
+Mazes use the same cell layout as MazeGame3D (1 = wall, 0 = path): rooms
+sit at odd coordinates and the cells between them are walls or passages,
+so (1, 1) -- the player's start -- is always open.  Two algorithms:
+
+- "backtracker": iterative depth-first search (no recursion limit), long
+  winding corridors, about two million cells per second.
+- "sidewinder": fully vectorized with NumPy, more regular but around
+  thirty million cells per second, for stress-test levels.
+
+braid > 0 then knocks out walls at that fraction of dead ends, turning a
+perfect maze (exactly one route between any two cells) into one with
+loops.
+
+    python maze_generator.py 2001 2001 --seed 7 --braid 0.3 -o big.level
+"""
+
+import argparse
+import random
+
+import numpy as np
+
+from maze_grid import MazeGrid
+
+ALGORITHMS = ("backtracker", "sidewinder")
+
+
+def generate(width, height, seed=None, algorithm="backtracker", braid=0.0):
+    """Generate a maze as a (height, width) uint8 array
+
+    Sizes should be odd; with even sizes the last row/column stays wall.
+    The same seed and arguments always give the same maze.
+    """
+    if width < 3 or height < 3:
+        raise ValueError("a maze needs at least 3x3 cells")
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm {algorithm!r}, pick one of {ALGORITHMS}")
+
+    rooms_x, rooms_z = (width - 1) // 2, (height - 1) // 2
+    maze = np.ones((height, width), dtype=np.uint8)
+    maze[1:2 * rooms_z:2, 1:2 * rooms_x:2] = 0
+
+    if algorithm == "backtracker":
+        _backtracker(maze, rooms_x, rooms_z, random.Random(seed))
+    else:
+        _sidewinder(maze, rooms_x, rooms_z, np.random.default_rng(seed))
+
+    if braid > 0:
+        _braid(maze, braid, np.random.default_rng(None if seed is None else seed + 1))
+    return maze
+
+
+def generate_grid(width, height, seed=None, algorithm="backtracker", braid=0.0):
+    """Same as generate(), ready to assign to MazeGame3D.maze"""
+    return MazeGrid.from_array(generate(width, height, seed, algorithm, braid))
+
+
+def _backtracker(maze, rooms_x, rooms_z, rng):
+    """Carve a perfect maze with an explicit-stack depth-first search"""
+    visited = bytearray(rooms_x * rooms_z)
+    visited[0] = 1
+    stack = [0]
+    carved = []  # Flat indices into maze of opened walls, applied at the end
+    width = maze.shape[1]
+    randrange = rng.randrange
+
+    while stack:
+        room = stack[-1]
+        x, z = room % rooms_x, room // rooms_x
+
+        options = []
+        if x > 0 and not visited[room - 1]:
+            options.append(room - 1)
+        if x < rooms_x - 1 and not visited[room + 1]:
+            options.append(room + 1)
+        if z > 0 and not visited[room - rooms_x]:
+            options.append(room - rooms_x)
+        if z < rooms_z - 1 and not visited[room + rooms_x]:
+            options.append(room + rooms_x)
+
+        if not options:
+            stack.pop()
+            continue
+
+        nxt = options[randrange(len(options))] if len(options) > 1 else options[0]
+        visited[nxt] = 1
+        stack.append(nxt)
+        # The wall between two rooms is the midpoint of their cells
+        nx, nz = nxt % rooms_x, nxt // rooms_x
+        carved.append((x + nx + 1) + (z + nz + 1) * width)
+
+    maze.ravel()[np.array(carved, dtype=np.int64)] = 0
+
+
+def _sidewinder(maze, rooms_x, rooms_z, rng):
+    """Carve a perfect maze row by row, all rows at once"""
+    # First row is one long corridor
+    maze[1, 2:2 * rooms_x:2] = 0
+    if rooms_z == 1:
+        return
+
+    # Every other row is split into runs; a run is carved east along its
+    # length and joined to the row above through one random room
+    close = rng.random((rooms_z - 1, rooms_x)) < 0.5
+    close[:, -1] = True
+    east = ~close[:, :-1]
+    maze[3:2 * rooms_z:2, 2:2 * rooms_x - 1:2][east] = 0
+
+    close = close.ravel()
+    ends = np.flatnonzero(close)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    chosen = starts + (rng.random(len(starts)) * lengths).astype(np.int64)
+    x, z = chosen % rooms_x, chosen // rooms_x + 1
+    maze[2 * z, 2 * x + 1] = 0
+
+
+def _braid(maze, fraction, rng):
+    """Open one wall at `fraction` of the dead ends to create loops"""
+    height, width = maze.shape
+    rooms = np.zeros_like(maze, dtype=bool)
+    rooms[1:height - 1:2, 1:width - 1:2] = True
+    rooms &= maze == 0
+
+    # For each direction: the wall next to a room, and whether a room lies
+    # past it (so opening the wall joins two rooms instead of hitting the border)
+    walls, joins = [], []
+    padded = np.pad(maze, 2, constant_values=1)
+    inner = np.pad(rooms, 2, constant_values=False)
+    for dx, dz in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        wall = padded[2 + dz:2 + dz + height, 2 + dx:2 + dx + width] == 1
+        beyond = inner[2 + 2 * dz:2 + 2 * dz + height, 2 + 2 * dx:2 + 2 * dx + width]
+        walls.append(wall)
+        joins.append(wall & beyond)
+    walls, joins = np.array(walls), np.array(joins)
+
+    dead_ends = rooms & (walls.sum(axis=0) == 3) & joins.any(axis=0)
+    dead_ends &= rng.random(maze.shape) < fraction
+    zs, xs = np.nonzero(dead_ends)
+
+    # Pick a random joinable direction per dead end
+    keys = rng.random((4, len(xs))) * joins[:, zs, xs]
+    direction = keys.argmax(axis=0)
+    dx = np.array([1, -1, 0, 0])[direction]
+    dz = np.array([0, 0, 1, -1])[direction]
+    maze[zs + dz, xs + dx] = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a maze level file")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="backtracker")
+    parser.add_argument("--braid", type=float, default=0.0,
+                        help="fraction of dead ends to remove (0 = perfect maze)")
+    parser.add_argument("-o", "--output", required=True, help="level file to write")
+    args = parser.parse_args()
+
+    grid = generate_grid(args.width, args.height, args.seed, args.algorithm, args.braid)
+    grid.save(args.output)
+    print(f"Wrote {args.width}x{args.height} maze to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Compact maze storage.
+
+Cells are one byte each (1 = wall, 0 = path) and laid out chunk by chunk:
+every 64x64 chunk is 4096 contiguous bytes, i.e. exactly one page.  A
+level file is a one-page header followed by the chunks, so it can be
+memory-mapped and only the chunks around the player are ever paged in.
+
+Level file header (little endian, padded to HEADER_SIZE bytes):
+    magic b"MAZE", version u16, chunk size u16, width u32, height u32
+"""
+
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b"MAZE"
+VERSION = 1
+CHUNK_SHIFT = 6
+CHUNK_SIZE = 1 << CHUNK_SHIFT  # 64 cells per chunk side
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_BYTES = CHUNK_SIZE * CHUNK_SIZE
+HEADER = struct.Struct("<4sHHII")
+HEADER_SIZE = 4096  # Keeps the chunk data page aligned
+
+
+class MazeGrid:
+    """Maze cells stored as uint8 in 64x64 chunks, optionally memory-mapped"""
+
+    def __init__(self, width, height, buffer=None, mapping=None):
+        self.width = width
+        self.height = height
+        self.chunks_x = (width + CHUNK_MASK) >> CHUNK_SHIFT
+        self.chunks_z = (height + CHUNK_MASK) >> CHUNK_SHIFT
+
+        if buffer is None:
+            # Cells past the right/bottom edge are padding; keep them walls
+            buffer = bytearray(b"\x01" * (self.chunks_x * self.chunks_z * CHUNK_BYTES))
+        self._cells = buffer  # Anything indexable by byte offset
+        self.chunks = np.frombuffer(buffer, dtype=np.uint8).reshape(
+            self.chunks_z, self.chunks_x, CHUNK_SIZE, CHUNK_SIZE)
+
+        # Byte offset of the start of each row within its chunk row
+        self._row_offsets = [(z >> CHUNK_SHIFT) * self.chunks_x * CHUNK_BYTES
+                             + ((z & CHUNK_MASK) << CHUNK_SHIFT) for z in range(height)]
+
+        self._mmap = mapping
+        self._touched = set()  # Chunks modified in memory, never trimmed
+        self._listeners = []
+
+    # -------------------------------------------------------------------------
+    # Construction and level files
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def from_array(cls, cells):
+        """Build an in-memory grid from rows of cells (list of lists or 2D array)"""
+        cells = np.asarray(cells, dtype=np.uint8)
+        height, width = cells.shape
+        grid = cls(width, height)
+        grid.write_region(0, 0, cells, notify=False)
+        return grid
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a level file
+
+        The mapping is copy-on-write: set_cell() works but never changes the
+        file.  Opening is O(1); pages are read when cells are first touched.
+        """
+        with open(path, "rb") as f:
+            magic, version, chunk_size, width, height = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or chunk_size != CHUNK_SIZE:
+                raise ValueError(f"{path} is not a version {VERSION} maze level")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        return cls(width, height, buffer=memoryview(mapping)[HEADER_SIZE:], mapping=mapping)
+
+    def save(self, path):
+        """Write the grid as a level file"""
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, CHUNK_SIZE, self.width, self.height)
+                    .ljust(HEADER_SIZE, b"\0"))
+            f.write(self.chunks.tobytes())
+
+    def close(self):
+        """Release the file mapping of a loaded level"""
+        if self._mmap is not None:
+            self.chunks = None
+            self._cells.release()
+            self._mmap.close()
+            self._mmap = None
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def is_wall(self, x, z):
+        """Check if a cell is a wall; out of bounds counts as wall"""
+        if 0 <= x < self.width and 0 <= z < self.height:
+            # Collision hot path: constants inlined (CHUNK_SHIFT = 6)
+            return self._cells[self._row_offsets[z] + (x >> 6 << 12) + (x & 63)] == 1
+        return True
+
+    def walls_at(self, xs, zs):
+        """Vectorized is_wall() for arrays of cell coordinates"""
+        xs = np.asarray(xs, dtype=np.int64)
+        zs = np.asarray(zs, dtype=np.int64)
+        inside = (xs >= 0) & (xs < self.width) & (zs >= 0) & (zs < self.height)
+        xs = np.where(inside, xs, 0)
+        zs = np.where(inside, zs, 0)
+        cells = self.chunks[zs >> CHUNK_SHIFT, xs >> CHUNK_SHIFT,
+                            zs & CHUNK_MASK, xs & CHUNK_MASK]
+        return ~inside | (cells == 1)
+
+    def region(self, x0, z0, x1, z1, fill=1):
+        """Copy of the cells in [x0, x1) x [z0, z1); cells outside are `fill`"""
+        out = np.full((z1 - z0, x1 - x0), fill, dtype=np.uint8)
+        cx0, cx1 = max(x0, 0) >> CHUNK_SHIFT, (min(x1, self.width) - 1) >> CHUNK_SHIFT
+        cz0, cz1 = max(z0, 0) >> CHUNK_SHIFT, (min(z1, self.height) - 1) >> CHUNK_SHIFT
+
+        for cz in range(cz0, cz1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                # Overlap of this chunk with the request, in maze coordinates
+                ax = max(x0, cx << CHUNK_SHIFT, 0)
+                bx = min(x1, (cx + 1) << CHUNK_SHIFT, self.width)
+                az = max(z0, cz << CHUNK_SHIFT, 0)
+                bz = min(z1, (cz + 1) << CHUNK_SHIFT, self.height)
+                out[az - z0:bz - z0, ax - x0:bx - x0] = self.chunks[
+                    cz, cx, az & CHUNK_MASK:((bz - 1) & CHUNK_MASK) + 1,
+                    ax & CHUNK_MASK:((bx - 1) & CHUNK_MASK) + 1]
+        return out
+
+    def to_array(self):
+        """The whole maze as a 2D uint8 array (only sensible for small mazes)"""
+        return self.region(0, 0, self.width, self.height)
+
+    # -------------------------------------------------------------------------
+    # Updates
+    # -------------------------------------------------------------------------
+
+    def add_listener(self, callback):
+        """Call callback(x, z) whenever a cell changes"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Stop notifying a callback registered with add_listener()"""
+        self._listeners.remove(callback)
+
+    def set_cell(self, x, z, value):
+        """Change one cell and notify listeners"""
+        if not (0 <= x < self.width and 0 <= z < self.height):
+            raise IndexError(f"cell ({x}, {z}) is outside the maze")
+        cx, cz = x >> CHUNK_SHIFT, z >> CHUNK_SHIFT
+        self.chunks[cz, cx, z & CHUNK_MASK, x & CHUNK_MASK] = value
+        self._touched.add((cx, cz))
+        for callback in self._listeners:
+            callback(x, z)
+
+    def write_region(self, x0, z0, cells, notify=True):
+        """Overwrite a rectangle of cells starting at (x0, z0)"""
+        cells = np.asarray(cells, dtype=np.uint8)
+        height, width = cells.shape
+        for cz in range(z0 >> CHUNK_SHIFT, ((z0 + height - 1) >> CHUNK_SHIFT) + 1):
+            for cx in range(x0 >> CHUNK_SHIFT, ((x0 + width - 1) >> CHUNK_SHIFT) + 1):
+                ax, bx = max(x0, cx << CHUNK_SHIFT), min(x0 + width, (cx + 1) << CHUNK_SHIFT)
+                az, bz = max(z0, cz << CHUNK_SHIFT), min(z0 + height, (cz + 1) << CHUNK_SHIFT)
+                self.chunks[cz, cx, az & CHUNK_MASK:((bz - 1) & CHUNK_MASK) + 1,
+                            ax & CHUNK_MASK:((bx - 1) & CHUNK_MASK) + 1] = \
+                    cells[az - z0:bz - z0, ax - x0:bx - x0]
+                self._touched.add((cx, cz))
+        if notify:
+            for z in range(z0, z0 + height):
+                for x in range(x0, x0 + width):
+                    for callback in self._listeners:
+                        callback(x, z)
+
+    # -------------------------------------------------------------------------
+    # Residency
+    # -------------------------------------------------------------------------
+
+    def trim(self, x, z, radius):
+        """Drop mapped pages of chunks more than `radius` chunks from (x, z)
+
+        Only applies to loaded levels; the kernel re-reads dropped chunks
+        from the file if they are needed again.  Chunks changed with
+        set_cell() are private copies and are always kept.
+        """
+        if self._mmap is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        cx, cz = int(x) >> CHUNK_SHIFT, int(z) >> CHUNK_SHIFT
+        row_bytes = self.chunks_x * CHUNK_BYTES
+        first_row, last_row = max(cz - radius, 0), min(cz + radius, self.chunks_z - 1)
+        first_col, last_col = max(cx - radius, 0), min(cx + radius, self.chunks_x - 1)
+
+        ranges = []
+        if first_row > last_row or first_col > last_col:
+            ranges.append((0, self.chunks_z * row_bytes))
+        else:
+            ranges.append((0, first_row * row_bytes))
+            ranges.append(((last_row + 1) * row_bytes, (self.chunks_z - last_row - 1) * row_bytes))
+            for row in range(first_row, last_row + 1):
+                start = row * row_bytes
+                ranges.append((start, first_col * CHUNK_BYTES))
+                ranges.append((start + (last_col + 1) * CHUNK_BYTES,
+                               (self.chunks_x - last_col - 1) * CHUNK_BYTES))
+
+        for start, length in ranges:
+            if length > 0:
+                self._drop(start, length)
+
+    def _drop(self, start, length):
+        """madvise(DONTNEED) a byte range of chunk data, skipping modified chunks"""
+        first, last = start // CHUNK_BYTES, (start + length) // CHUNK_BYTES
+        touched = sorted(cz * self.chunks_x + cx for cx, cz in self._touched
+                         if first <= cz * self.chunks_x + cx < last)
+        for chunk in touched + [last]:
+            if chunk > first:
+                self._mmap.madvise(mmap.MADV_DONTNEED, HEADER_SIZE + first * CHUNK_BYTES,
+                                   (chunk - first) * CHUNK_BYTES)
+            first = chunk + 1
@@ -0,0 +1,121 @@
+"""
+Baked wall lighting for the 3D maze.
+
+The maze and its light never move, so instead of fixed-function GL
+lighting every frame, each wall vertex gets its final color once when
+its chunk is meshed: ambient plus Lambert diffuse from one directional
+light, darkened at inside corners (ambient occlusion).  Baked chunks are
+cached on disk as .npy files keyed by a hash of the chunk's cells, the
+light setup and CACHE_VERSION, so the next launch loads them instead of
+recomputing, and editing the maze only misses the cache for the chunks
+it touches.  The least recently used files are deleted once the cache
+grows past max_cache_bytes.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+
+import numpy as np
+
+LIGHT_DIRECTION = (2.0, 5.0, 2.0)  # Towards the light; where GL_LIGHT0 used to sit
+AMBIENT = 0.55
+DIFFUSE = 0.45
+OCCLUSION = 0.35  # Brightness lost per occluding wall cell
+CACHE_VERSION = 2  # Bump whenever meshing or baking changes what a cached chunk holds
+MAX_CACHE_BYTES = 256 << 20
+PRUNE_EVERY = 64  # Stores between checks of the cache size
+
+
+def default_cache_dir():
+    """Per-user cache directory for baked chunks"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "maze3d", "lighting")
+
+
+class BakedLighting:
+    """Turns normals and occlusion into vertex colors, with an on-disk cache"""
+
+    def __init__(self, wall_color=(0.2, 0.5, 0.8), direction=LIGHT_DIRECTION,
+                 ambient=AMBIENT, diffuse=DIFFUSE, occlusion=OCCLUSION, cache_dir=None,
+                 max_cache_bytes=MAX_CACHE_BYTES):
+        self.wall_color = np.array(wall_color, dtype=np.float32)
+        direction = np.array(direction, dtype=np.float32)
+        self.direction = direction / np.linalg.norm(direction)
+        self.ambient = ambient
+        self.diffuse = diffuse
+        self.occlusion = occlusion
+        self.cache_dir = cache_dir  # None = no disk cache
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        # Everything that changes the result goes into the cache key
+        setup = {"version": CACHE_VERSION, "color": self.wall_color.tolist(),
+                 "direction": self.direction.tolist(), "ambient": ambient, "diffuse": diffuse,
+                 "occlusion": occlusion}
+        self.setup_hash = hashlib.blake2b(json.dumps(setup, sort_keys=True).encode(),
+                                          digest_size=8).hexdigest()
+
+    def colors(self, normals, occlusion):
+        """(N, 3) float32 vertex colors"""
+        lambert = np.clip(normals @ self.direction, 0, None)
+        light = (self.ambient + self.diffuse * lambert) * (1 - self.occlusion * occlusion)
+        return (light[:, None] * self.wall_color).astype(np.float32)
+
+    def _path(self, block, x0, z0):
+        digest = hashlib.blake2b(np.ascontiguousarray(block).tobytes(), digest_size=16)
+        digest.update(f"{x0},{z0},{block.shape}".encode())
+        return os.path.join(self.cache_dir, self.setup_hash, digest.hexdigest() + ".npy")
+
+    def load(self, block, x0, z0):
+        """Cached interleaved position + color array for a chunk, or None"""
+        if self.cache_dir is None:
+            return None
+        path = self._path(block, x0, z0)
+        try:
+            baked = np.load(path)
+            os.utime(path)  # Recently used, so pruned last
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return baked
+
+    def store(self, block, x0, z0, baked):
+        """Save a chunk's interleaved position + color array"""
+        if self.cache_dir is None:
+            return
+        path = self._path(block, x0, z0)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves half a file behind
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            np.save(f, baked)
+        os.replace(temp, path)
+        self.stores += 1
+        if (self.stores - 1) % PRUNE_EVERY == 0:  # The first store, then every PRUNE_EVERY
+            self.prune()
+
+    def prune(self):
+        """Delete the least recently used files until the cache fits in max_cache_bytes
+
+        Files baked for other setups or versions are never loaded again,
+        so they age out first.
+        """
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                with contextlib.suppress(OSError):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_cache_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            total -= size
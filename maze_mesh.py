@@ -0,0 +1,234 @@
+"""
+Static wall geometry for the 3D maze.
+
+The maze is cut into square chunks and every chunk is meshed once into a
+vertex buffer and an index buffer.  Faces shared by two neighbouring wall
+cells are dropped because they can never be seen, so drawing the walls
+costs one glDrawElements call per chunk instead of 24 glVertex3f calls
+per wall cell.  Chunks are meshed the first time they are drawn and the
+least recently drawn ones are freed, so huge mazes only keep the area
+around the player on the GPU.  Lighting is baked into vertex colors when
+a chunk is meshed (see maze_lighting.py), so drawing needs no GL lights.
+"""
+
+import ctypes
+from collections import OrderedDict
+
+import numpy as np
+from OpenGL.GL import *
+
+from maze_lighting import BakedLighting
+
+CHUNK_SIZE = 32  # Cells per chunk side
+WALL_BOTTOM = 0.5  # Same extent as the old draw_cube(0.5) centred at y=1
+WALL_TOP = 1.5
+
+# (neighbour dx, dz or None, outward normal, corners as (x, y, z) offsets)
+# Corners are counter-clockwise seen from outside the cube, y is 0/1 for
+# bottom/top of the wall.
+FACES = [
+    ((0, -1), (0, 0, -1), [(0, 0, 0), (0, 1, 0), (1, 1, 0), (1, 0, 0)]),
+    ((0, 1), (0, 0, 1), [(0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]),
+    ((-1, 0), (-1, 0, 0), [(0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0)]),
+    ((1, 0), (1, 0, 0), [(1, 0, 0), (1, 1, 0), (1, 1, 1), (1, 0, 1)]),
+    (None, (0, 1, 0), [(0, 1, 0), (0, 1, 1), (1, 1, 1), (1, 1, 0)]),
+    (None, (0, -1, 0), [(0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)]),
+]
+
+
+def wall_block(grid, x0, z0, width, height):
+    """Boolean walls of a chunk plus a one-cell border around it
+
+    Out of bounds counts as wall (see MazeGame3D.is_wall), so faces on the
+    outer border of the maze point at a wall and are culled like any other.
+    """
+    return grid.region(x0 - 1, z0 - 1, x0 + width + 1, z0 + height + 1) == 1
+
+
+def build_chunk_mesh(block, x0, z0):
+    """Mesh the wall cells of a wall_block() whose first cell is (x0, z0)
+
+    Returns (vertices, normals, occlusion, indices): float32 positions and
+    normals, the number of wall cells crowding each vertex (0 or 1, for
+    ambient occlusion) and uint32 indices, two triangles per visible face.
+    """
+    height, width = block.shape[0] - 2, block.shape[1] - 2
+    core = block[1:-1, 1:-1]
+
+    positions = []
+    normals = []
+    occlusion = []
+    for offset, normal, corners in FACES:
+        if offset is None:
+            mask = core
+        else:
+            dx, dz = offset
+            neighbour = block[1 + dz:1 + dz + height, 1 + dx:1 + dx + width]
+            mask = core & ~neighbour
+
+        zs, xs = np.nonzero(mask)
+        if len(xs) == 0:
+            continue
+
+        corners = np.array(corners, dtype=np.float32)
+        corners[:, 1] = WALL_BOTTOM + corners[:, 1] * (WALL_TOP - WALL_BOTTOM)
+        origin = np.zeros((len(xs), 3), dtype=np.float32)
+        origin[:, 0] = xs + x0
+        origin[:, 2] = zs + z0
+
+        positions.append((origin[:, None, :] + corners[None, :, :]).reshape(-1, 3))
+        normals.append(np.broadcast_to(np.array(normal, dtype=np.float32),
+                                       (len(xs) * 4, 3)))
+        occlusion.append(corner_occlusion(block, xs, zs, offset, corners).ravel())
+
+    if not positions:
+        empty = np.zeros((0, 3), dtype=np.float32)
+        return empty, empty, np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.uint32)
+
+    vertices = np.concatenate(positions)
+    return (vertices, np.concatenate(normals), np.concatenate(occlusion),
+            quad_indices(len(vertices) // 4))
+
+
+def corner_occlusion(block, xs, zs, offset, corners):
+    """Wall cells crowding each corner of the faces of cells (xs, zs)
+
+    A side face's vertical edge is darkened when the cell diagonally in
+    front of it, next to the open cell the face looks into, is a wall:
+    that is an inside corner of the maze.  Top and bottom faces have no
+    neighbours above or below them, so nothing occludes them.
+    """
+    result = np.zeros((len(xs), len(corners)), dtype=np.float32)
+    if offset is None:
+        return result
+    dx, dz = offset
+    for i, (cx, _, cz) in enumerate(corners):
+        # Step along the face towards this corner: -1 for offset 0, +1 for 1
+        tx = int(2 * cx - 1) if dx == 0 else 0
+        tz = int(2 * cz - 1) if dz == 0 else 0
+        result[:, i] = block[1 + zs + dz + tz, 1 + xs + dx + tx]
+    return result
+
+
+def quad_indices(quads):
+    """Two triangles per quad of four consecutive vertices"""
+    starts = np.arange(quads, dtype=np.uint32)[:, None] * 4
+    return (starts + np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)).ravel()
+
+
+def chunk_bounds(maze_width, maze_height, chunk_size=CHUNK_SIZE):
+    """Yield (cx, cz, x0, z0, width, height) for every chunk of the maze"""
+    for cz, z0 in enumerate(range(0, maze_height, chunk_size)):
+        for cx, x0 in enumerate(range(0, maze_width, chunk_size)):
+            yield (cx, cz, x0, z0,
+                   min(chunk_size, maze_width - x0),
+                   min(chunk_size, maze_height - z0))
+
+
+class WallMesh:
+    """GPU-resident wall geometry, one vertex/index buffer pair per chunk"""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_chunks=512, lighting=None):
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks  # Resident chunk buffers before eviction
+        self.lighting = lighting if lighting is not None else BakedLighting()
+        self.grid = None
+        # (cx, cz) -> (vbo, ibo, index_count), or None for a chunk without walls
+        self.chunks = OrderedDict()
+
+    def attach(self, grid):
+        """Use a new maze grid; all existing chunks are dropped"""
+        self.release()
+        self.grid = grid
+
+    def all_chunks(self):
+        """Keys of every chunk in the maze"""
+        return [(cx, cz) for cx, cz, *_ in
+                chunk_bounds(self.grid.width, self.grid.height, self.chunk_size)]
+
+    def invalidate_cell(self, x, z):
+        """Drop the chunks whose geometry depends on cell (x, z)"""
+        size = self.chunk_size
+        # A cell on a chunk edge also decides the faces of the next chunk, and
+        # ambient occlusion reads diagonal cells, so a cell in a chunk corner
+        # also darkens the chunk diagonally beyond it
+        keys = {((x + dx) // size, (z + dz) // size)
+                for dx in (-1, 0, 1) for dz in (-1, 0, 1)}
+        for key in keys:
+            self._free(key)
+
+    def _build(self, key):
+        """Mesh and light one chunk (or load it from the cache) and upload it"""
+        cx, cz = key
+        x0, z0 = cx * self.chunk_size, cz * self.chunk_size
+        width = min(self.chunk_size, self.grid.width - x0)
+        height = min(self.chunk_size, self.grid.height - z0)
+        block = wall_block(self.grid, x0, z0, width, height)
+
+        baked = self.lighting.load(block, x0, z0)
+        if baked is None:
+            vertices, normals, occlusion, _ = build_chunk_mesh(block, x0, z0)
+            baked = np.hstack([vertices, self.lighting.colors(normals, occlusion)])
+            self.lighting.store(block, x0, z0, baked)
+        if len(baked) == 0:
+            return None
+        return self._upload(baked, quad_indices(len(baked) // 4))
+
+    @staticmethod
+    def _upload(baked, indices):
+        """Copy one chunk into a static vertex buffer and index buffer"""
+        interleaved = np.ascontiguousarray(baked, dtype=np.float32)
+        vbo, ibo = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, interleaved.nbytes, interleaved, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        return vbo, ibo, len(indices)
+
+    def draw(self, keys=None):
+        """Draw the given chunks (default: all), one glDrawElements call each"""
+        if keys is None:
+            keys = self.all_chunks()
+
+        buffers = []
+        for key in keys:
+            if key not in self.chunks:
+                self.chunks[key] = self._build(key)
+            else:
+                self.chunks.move_to_end(key)
+            if self.chunks[key] is not None:
+                buffers.append(self.chunks[key])
+
+        stride = 6 * 4  # xyz + rgb, float32
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+
+        for vbo, ibo, count in buffers:
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+            glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(12))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+            glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        # Keep the chunks drawn this frame, free the least recently drawn
+        while len(self.chunks) > max(self.max_chunks, len(keys)):
+            self._free(next(iter(self.chunks)))
+
+    def _free(self, key):
+        """Free the GPU buffers of one chunk, if it is resident"""
+        buffers = self.chunks.pop(key, None)
+        if buffers is not None:
+            vbo, ibo, _ = buffers
+            glDeleteBuffers(2, [vbo, ibo])
+
+    def release(self):
+        """Free all GPU buffers"""
+        for key in list(self.chunks):
+            self._free(key)
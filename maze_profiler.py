@@ -0,0 +1,76 @@
+"""
+Per-phase frame timing for the 3D maze.
+
+FrameProfiler keeps the last `capacity` frames in a NumPy ring buffer,
+one column per phase plus the whole frame, so percentiles are always
+over a recent window and recording never allocates.
+
+    with profiler.phase("draw_walls"):
+        game.draw_walls()
+    profiler.end_frame()
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+PHASES = ("events", "update", "draw_floor_and_ceiling", "draw_walls", "flip")
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    """Ring buffer of per-phase frame times in seconds"""
+
+    def __init__(self, phases=PHASES, capacity=1024):
+        self.phases = list(phases)
+        self.columns = {name: i for i, name in enumerate(self.phases)}
+        self.samples = np.zeros((capacity, len(self.phases) + 1))  # Last column: frame
+        self.capacity = capacity
+        self.count = 0  # Frames recorded in total
+        self._current = np.zeros(len(self.phases) + 1)
+        self._frame_start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block and add it to phase `name` of this frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[self.columns[name]] += time.perf_counter() - start
+
+    def end_frame(self):
+        """Store the current frame and start the next one"""
+        now = time.perf_counter()
+        self._current[-1] = now - self._frame_start
+        self._frame_start = now
+        self.samples[self.count % self.capacity] = self._current
+        self._current[:] = 0
+        self.count += 1
+
+    def summary(self):
+        """{phase: {"p50": ms, "p95": ms, "p99": ms}} over the buffered frames"""
+        recorded = self.samples[:min(self.count, self.capacity)] * 1000
+        if not len(recorded):
+            return {}
+        values = np.percentile(recorded, PERCENTILES, axis=0)
+        return {name: {f"p{p}": round(float(values[row, column]), 3)
+                       for row, p in enumerate(PERCENTILES)}
+                for column, name in enumerate(self.phases + ["frame"])}
+
+    def overlay_lines(self):
+        """Text lines for the on-screen overlay"""
+        lines = [f"{'phase':<24}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<24}" + "".join(f"{value:8.2f}" for value in stats.values()))
+        return lines
+
+    def dump(self, path, **extra):
+        """Write the percentile summary (plus any extra fields) as JSON"""
+        report = {"frames": self.count, "window": min(self.count, self.capacity),
+                  "phases_ms": self.summary()}
+        report.update(extra)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,120 @@
+"""
+CPU raycasting renderer for the 3D maze.
+
+Renders the same scene as the OpenGL path -- maze, player position,
+angles and eye height -- into a NumPy framebuffer, so the game can run
+without a GPU or a display.  One ray is cast per screen column and all
+columns are stepped through the grid together (DDA).  Looking up or down
+shifts the horizon instead of tilting the view (y-shearing), and each
+column shows the nearest wall only; walls further back that would peek
+under or over it are not drawn.
+"""
+
+import math
+
+import numpy as np
+
+from maze_mesh import WALL_BOTTOM, WALL_TOP
+
+
+def cast_columns(grid, x, z, dir_x, dir_z, far):
+    """Nearest wall along each ray from (x, z)
+
+    Directions need not be unit length; distances are in multiples of the
+    direction vector, which for camera rays is the depth along the view.
+    Returns (distance, x_side): distance is inf where nothing is hit within
+    `far`, x_side is True where the ray hit a face facing along x.
+    """
+    count = len(dir_x)
+    with np.errstate(divide="ignore"):
+        delta_x = np.abs(1 / dir_x)
+        delta_z = np.abs(1 / dir_z)
+
+    map_x = np.full(count, math.floor(x), dtype=np.int64)
+    map_z = np.full(count, math.floor(z), dtype=np.int64)
+    step_x = np.where(dir_x < 0, -1, 1)
+    step_z = np.where(dir_z < 0, -1, 1)
+    side_x = np.where(dir_x < 0, x - map_x, map_x + 1 - x) * delta_x
+    side_z = np.where(dir_z < 0, z - map_z, map_z + 1 - z) * delta_z
+
+    distance = np.full(count, np.inf)
+    x_side = np.zeros(count, dtype=bool)
+    active = np.arange(count)
+
+    while len(active):
+        use_x = side_x < side_z
+        dist = np.where(use_x, side_x, side_z)
+        map_x = map_x + np.where(use_x, step_x, 0)
+        map_z = map_z + np.where(use_x, 0, step_z)
+        side_x = side_x + np.where(use_x, delta_x, 0)
+        side_z = side_z + np.where(use_x, 0, delta_z)
+
+        # Out of bounds counts as wall, so every ray ends at the border
+        hit = grid.walls_at(map_x, map_z) & (dist <= far)
+        done = hit | (dist > far)
+        if done.any():
+            distance[active[hit]] = dist[hit]
+            x_side[active[hit]] = use_x[hit]
+            keep = ~done
+            active = active[keep]
+            map_x, map_z = map_x[keep], map_z[keep]
+            side_x, side_z = side_x[keep], side_z[keep]
+            delta_x, delta_z = delta_x[keep], delta_z[keep]
+            step_x, step_z = step_x[keep], step_z[keep]
+
+    return distance, x_side
+
+
+class RaycastRenderer:
+    """Software renderer producing (height, width, 3) uint8 frames"""
+
+    def __init__(self, width, height, fov=45, view_distance=50.0,
+                 wall_color=(0.2, 0.5, 0.8), floor_color=(0.3, 0.3, 0.3),
+                 ceiling_color=(0.1, 0.1, 0.2)):
+        self.width = width
+        self.height = height
+        self.view_distance = view_distance
+
+        # Same projection as gluPerspective(fov, width / height, ...)
+        tan_y = math.tan(math.radians(fov) / 2)
+        self.focal = (height / 2) / tan_y  # Pixels per unit at depth 1
+        self.column_offsets = tan_y * (width / height) * (
+            (np.arange(width) + 0.5) * 2 / width - 1)
+        self.rows = np.arange(height, dtype=np.int32)[:, None]
+
+        self.wall_colors = np.array([pack_color(wall_color, 0.7), pack_color(wall_color)])
+        self.floor_color = pack_color(floor_color)
+        self.ceiling_color = pack_color(ceiling_color)
+
+    def render(self, grid, x, z, angle, pitch, eye_height):
+        """Draw one frame from the given camera"""
+        # Forward and screen-right vectors, matching gluLookAt in render()
+        forward_x, forward_z = math.sin(angle), math.cos(angle)
+        right_x, right_z = -math.cos(angle), math.sin(angle)
+        dir_x = forward_x + self.column_offsets * right_x
+        dir_z = forward_z + self.column_offsets * right_z
+
+        distance, x_side = cast_columns(grid, x, z, dir_x, dir_z, self.view_distance)
+
+        # Looking up moves the horizon down the screen
+        horizon = self.height / 2 + math.tan(pitch) * self.focal
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = self.focal / distance
+            top = horizon - (WALL_TOP - eye_height) * scale
+            bottom = horizon - (WALL_BOTTOM - eye_height) * scale
+        # Rays that hit nothing get an empty span
+        top = np.ceil(np.nan_to_num(top)).clip(0, self.height).astype(np.int32)
+        bottom = np.ceil(np.nan_to_num(bottom)).clip(0, self.height).astype(np.int32)
+        on_wall = (self.rows >= top) & (self.rows < bottom)
+
+        # Faces along x get full light, faces along z are darker.  Pixels
+        # are packed RGBX uint32 while compositing, one select per pixel
+        background = np.where(self.rows < horizon, self.ceiling_color, self.floor_color)
+        packed = np.where(on_wall, self.wall_colors[x_side.astype(np.intp)], background)
+        return packed.view(np.uint8).reshape(self.height, self.width, 4)[:, :, :3]
+
+
+def pack_color(color, shade=1.0):
+    """(r, g, b) floats in 0..1 as a little-endian RGBX uint32"""
+    r, g, b = (int(round(channel * shade * 255)) for channel in color)
+    return np.uint32(r | g << 8 | b << 16)
@@ -0,0 +1,44 @@
+"""
+Input recordings for the 3D maze.
+
+A recording is a JSON-lines file.  The first line is a header with the
+maze (how to rebuild it), the player's starting state and the tick rate.
+Every further line is one frame: [ticks, keys, mouse_dx, mouse_dy], i.e.
+how many fixed ticks ran that frame, the MOVE_* flags held down and the
+summed mouse motion.  Feeding those back through apply_look() and
+update() reproduces the run exactly, whatever the frame rate was.
+"""
+
+import json
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class InputRecorder:
+    """Writes one line per frame to a recording file"""
+
+    def __init__(self, path, header):
+        self.file = open(path, "w")
+        self.file.write(json.dumps(dict(header, version=FORMAT_VERSION)) + "\n")
+        self.frames = 0
+
+    def record(self, ticks, keys, mouse_dx, mouse_dy):
+        """Append one frame of input"""
+        self.file.write(f"[{ticks},{keys},{mouse_dx},{mouse_dy}]\n")
+        self.frames += 1
+
+    def close(self):
+        """Flush and close the recording"""
+        self.file.close()
+
+
+def load_recording(path):
+    """Read a recording; returns (header dict, (N, 4) int array of frames)"""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} maze recording")
+        frames = [json.loads(line) for line in f if line.strip()]
+    return header, np.array(frames, dtype=np.int64).reshape(-1, 4)
@@ -0,0 +1,127 @@
+"""
+Visibility culling for the 3D maze.
+
+Rays are marched through the maze grid from the player's cell across the
+horizontal footprint of the view frustum (DDA, all rays stepped together
+with NumPy).  A ray stops at the far plane, or shortly after the first
+wall it meets: the walls only fill the band WALL_BOTTOM..WALL_TOP, so the
+eye can look under or over them, but only as far as the floor or ceiling
+allows.  Every cell a ray passes is potentially visible; chunks with no
+such cell are not drawn.
+"""
+
+import math
+
+import numpy as np
+
+from maze_mesh import WALL_BOTTOM, WALL_TOP
+
+FLOOR_Y = 0.0
+CEILING_Y = 2.0
+
+
+def view_half_angle(fov_y, aspect, pitch):
+    """Half-width (radians) of the frustum's footprint on the floor plane
+
+    Looking up or down widens the footprint because the screen corners
+    swing out sideways.  Returns None if the frustum reaches straight up
+    or down, in which case every horizontal direction can be visible.
+    """
+    tan_y = math.tan(math.radians(fov_y) / 2)
+    tan_x = tan_y * aspect
+    # Smallest forward component of the four corner rays after pitching
+    forward = math.cos(pitch) - abs(math.sin(pitch)) * tan_y
+    if forward <= 1e-6:
+        return None
+    return math.atan(tan_x / forward)
+
+
+def see_through_factor(eye_height):
+    """How much further than the first wall a line of sight can reach
+
+    A sight line that passes under a wall first seen at distance d must
+    drop below WALL_BOTTOM by then, so it hits the floor before
+    d * eye_height / (eye_height - WALL_BOTTOM); likewise over the top of
+    the wall and the ceiling.  Returns None when the eye is level with or
+    outside the wall band, where walls occlude nothing.
+    """
+    below = eye_height - WALL_BOTTOM
+    above = WALL_TOP - eye_height
+    if below <= 1e-3 or above <= 1e-3:
+        return None
+    return max((eye_height - FLOOR_Y) / below, (CEILING_Y - eye_height) / above)
+
+
+def visible_cells(grid, x, z, angle, half_angle, eye_height, far, num_rays=256):
+    """Cells that can be seen from (x, z) looking along `angle`
+
+    `grid` is a MazeGrid.  `half_angle` comes from view_half_angle(); None
+    casts rays all around.  Returns the (xs, zs) cell coordinates touched
+    by any ray, possibly with repeats.
+    """
+    if half_angle is None:
+        angles = angle + np.linspace(-math.pi, math.pi, num_rays * 4, endpoint=False)
+    else:
+        angles = angle + np.linspace(-half_angle, half_angle, num_rays)
+
+    # Same convention as the camera: looking along (sin, cos) in x/z
+    dir_x = np.sin(angles)
+    dir_z = np.cos(angles)
+    with np.errstate(divide="ignore"):
+        delta_x = np.abs(1 / dir_x)
+        delta_z = np.abs(1 / dir_z)
+
+    map_x = np.full(len(angles), math.floor(x), dtype=np.int64)
+    map_z = np.full(len(angles), math.floor(z), dtype=np.int64)
+    step_x = np.where(dir_x < 0, -1, 1)
+    step_z = np.where(dir_z < 0, -1, 1)
+    side_x = np.where(dir_x < 0, x - map_x, map_x + 1 - x) * delta_x
+    side_z = np.where(dir_z < 0, z - map_z, map_z + 1 - z) * delta_z
+
+    factor = see_through_factor(eye_height)
+    limit = np.full(len(angles), float(far))
+    hit = np.zeros(len(angles), dtype=bool)
+
+    # Rays may step one cell outside the maze, which counts as wall
+    max_x = grid.width
+    max_z = grid.height
+
+    seen_x = [map_x[:1]]
+    seen_z = [map_z[:1]]
+
+    while len(map_x):
+        use_x = side_x < side_z
+        dist = np.where(use_x, side_x, side_z)
+        map_x = map_x + np.where(use_x, step_x, 0)
+        map_z = map_z + np.where(use_x, 0, step_z)
+        side_x = side_x + np.where(use_x, delta_x, 0)
+        side_z = side_z + np.where(use_x, 0, delta_z)
+
+        alive = ((dist < limit) & (map_x >= -1) & (map_x <= max_x) &
+                 (map_z >= -1) & (map_z <= max_z))
+        if not alive.all():
+            map_x, map_z = map_x[alive], map_z[alive]
+            side_x, side_z = side_x[alive], side_z[alive]
+            delta_x, delta_z = delta_x[alive], delta_z[alive]
+            step_x, step_z = step_x[alive], step_z[alive]
+            limit, hit, dist = limit[alive], hit[alive], dist[alive]
+
+        seen_x.append(map_x)
+        seen_z.append(map_z)
+
+        if factor is not None:
+            first_hit = grid.walls_at(map_x, map_z) & ~hit
+            if first_hit.any():
+                limit = np.where(first_hit, np.minimum(limit, dist * factor), limit)
+                hit = hit | first_hit
+
+    return np.concatenate(seen_x), np.concatenate(seen_z)
+
+
+def cells_to_chunks(xs, zs, width, height, chunk_size):
+    """Unique (cx, cz) chunk keys for a list of cells, clipped to the maze"""
+    inside = (xs >= 0) & (xs < width) & (zs >= 0) & (zs < height)
+    xs, zs = xs[inside] // chunk_size, zs[inside] // chunk_size
+    chunks_x = (width + chunk_size - 1) // chunk_size
+    keys = np.unique(zs * chunks_x + xs)
+    return [(int(k % chunks_x), int(k // chunks_x)) for k in keys]
@@ -0,0 +1,75 @@
+"""
+Pre-serialized JSON responses for backend_flask.py.
+
+A Payload is a response body encoded once, exactly as jsonify would
+encode it, together with a strong ETag (a hash of those bytes).  Serving
+one is a dictionary lookup and a copy of bytes: no dict to build, no
+JSON encoder to run.  A client that sends the ETag back in If-None-Match
+gets an empty 304 instead of the body.
+
+PayloadCache keeps the payloads of the most recently served quotes.  It
+is tied to the store's generation, so when the corpus file is replaced
+every entry is dropped on the next lookup and rebuilt from the new file.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, NamedTuple, Optional
+
+
+class Payload(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def encode(obj) -> bytes:
+    """Encode like Flask's jsonify outside debug mode: compact, sorted keys, trailing newline
+
+    The newline also makes each body one line of newline-delimited JSON.
+    """
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True, ensure_ascii=True).encode() + b"\n"
+
+
+def make_payload(obj) -> Payload:
+    body = encode(obj)
+    return Payload(body, hashlib.blake2b(body, digest_size=12).hexdigest())
+
+
+class PayloadCache:
+    """Least recently used payloads by key, cleared when the generation changes"""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Payload]" = OrderedDict()
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable, build: Callable[[], object], generation=None) -> Optional[Payload]:
+        """Payload for `key`, encoding build() on a miss; None (not cached) if build() is None"""
+        with self._lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+        obj = build()
+        if obj is None:
+            return None
+        payload = make_payload(obj)
+        with self._lock:
+            self.misses += 1
+            if generation == self.generation:  # Not if the corpus changed meanwhile
+                self.entries[key] = payload
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return payload
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Local load test for backend_flask.py.
+
+    python quote_loadtest.py --seconds 5 --connections 8
+
+Starts the app on a local port twice, first with QUOTES_CACHE=0 (every
+response built with jsonify) and then with the payload cache, and
+hammers it from client processes, each holding one keep-alive
+connection.  It reports requests per second for each run and for a
+third run whose clients send back the ETag they were given (so unchanged
+quotes come back as 304s).
+
+    python quote_loadtest.py --url http://127.0.0.1:8000 --paths /quotes
+
+measures a server that is already running instead.
+
+    python quote_loadtest.py --workers 1,2,4,8 --db quotes.db
+
+runs quote_server.py with each number of workers in turn and reports
+requests per second and the memory each worker adds: its private pages
+and its proportional share of the pages it shares with the others.
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = ["/", "/quotes", "/quotes/1"]
+
+
+def serve(port: int) -> None:
+    """Run the app in one process with the threaded keep-alive server"""
+    from werkzeug.serving import make_server
+
+    from backend_flask import app, open_store
+    from quote_server import Handler
+
+    open_store()
+    make_server("127.0.0.1", port, app, threaded=True, request_handler=Handler).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def client(host: str, port: int, paths: List[str], seconds: float, conditional: bool) -> Tuple[int, int]:
+    """Send requests round-robin over one connection; returns (responses, 304s)"""
+    connection = http.client.HTTPConnection(host, port)
+    etags = {}
+    count = not_modified = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        path = paths[count % len(paths)]
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status == 304:
+            not_modified += 1
+        elif response.getheader("ETag"):
+            etags[path] = response.getheader("ETag")
+        count += 1
+    connection.close()
+    return count, not_modified
+
+
+def measure(url: str, paths: List[str], connections: int, seconds: float,
+            conditional: bool = False) -> Tuple[float, float]:
+    """Requests per second over `connections` client processes, and the share of 304s"""
+    parts = urlsplit(url)
+    with ProcessPoolExecutor(connections) as pool:
+        futures = [pool.submit(client, parts.hostname, parts.port, paths, seconds, conditional)
+                   for _ in range(connections)]
+        results = [future.result() for future in futures]
+    total = sum(count for count, _ in results)
+    return total / seconds, sum(hits for _, hits in results) / max(total, 1)
+
+
+def report(label: str, rate: float, not_modified: float) -> None:
+    print(f"{label:<28}{rate:>12,.0f} req/s{not_modified:>10.0%} 304")
+
+
+def worker_memory(master: int) -> List[Dict[str, int]]:
+    """smaps_rollup totals in KB for each child of `master`"""
+    with open(f"/proc/{master}/task/{master}/children") as f:
+        pids = f.read().split()
+    totals = []
+    for pid in pids:
+        fields = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        totals.append(fields)
+    return totals
+
+
+def scale_workers(args) -> None:
+    """Throughput and memory per worker for each worker count"""
+    env = {**os.environ, **({"QUOTES_DB": args.db} if args.db else {})}
+    print(f"{'workers':>7}{'req/s':>12}{'private MB/worker':>19}{'PSS MB/worker':>15}")
+    for workers in args.workers:
+        port = free_port()
+        server = subprocess.Popen([sys.executable, "quote_server.py", "--port", str(port),
+                                   "--workers", str(workers)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_for("127.0.0.1", port, timeout=120)
+            url = f"http://127.0.0.1:{port}"
+            measure(url, args.paths, args.connections, min(1.0, args.seconds))  # Warm up
+            rate, _ = measure(url, args.paths, args.connections, args.seconds)
+            memory = worker_memory(server.pid)
+            private = sum(m.get("Private_Clean", 0) + m.get("Private_Dirty", 0) for m in memory)
+            pss = sum(m.get("Pss", 0) for m in memory)
+            print(f"{workers:>7}{rate:>12,.0f}{private / len(memory) / 1024:>19.1f}"
+                  f"{pss / len(memory) / 1024:>15.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second against backend_flask.py")
+    parser.add_argument("--url", help="measure this running server instead of starting one")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--connections", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=lambda text: [int(n) for n in text.split(",")],
+                        help="comma-separated worker counts to run quote_server.py with")
+    parser.add_argument("--db", help="quote store for --workers (default: $QUOTES_DB or quotes.db)")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+    print(f"{args.connections} keep-alive connections, {args.seconds:g} s per run, paths: {' '.join(args.paths)}")
+    if args.workers:
+        scale_workers(args)
+        return
+    if args.url:
+        report("plain", *measure(args.url, args.paths, args.connections, args.seconds))
+        report("conditional", *measure(args.url, args.paths, args.connections, args.seconds, True))
+        return
+
+    runs = [("before (jsonify)", "0", False), ("after (payload cache)", "1", False),
+            ("after, conditional", "1", True)]
+    for label, cache, conditional in runs:
+        port = free_port()
+        server = subprocess.Popen([sys.executable, __file__, "--serve", str(port)],
+                                  env={**os.environ, "QUOTES_CACHE": cache})
+        try:
+            wait_for("127.0.0.1", port)
+            url = f"http://127.0.0.1:{port}"
+            measure(url, args.paths, args.connections, min(1.0, args.seconds))  # Warm up
+            report(label, *measure(url, args.paths, args.connections, args.seconds, conditional))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Weighted and non-repeating quote draws for backend_flask.py.
+
+AliasSampler is Vose's alias method: from n weights it builds two arrays
+of n entries in O(n) time, after which every draw costs one random
+number, one array lookup and one comparison, whatever the weights.
+
+A shuffle bag deals every quote once, in random order, before any quote
+comes round again.  Rather than keeping a shuffled list per client, the
+order is a keyed pseudo-random permutation of 0..n-1 (a small Feistel
+network, cycle-walked down to n), so a client's whole bag is three
+integers: the key, how far through it they are, and the corpus size it
+was dealt for.  BagState.token() packs those into a short string that
+the client carries (in a cookie) and sends back, so the server keeps no
+state per client at all.
+"""
+
+import math
+import random
+from array import array
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+ROUNDS = 8  # Fewer leave visible bias on small corpora
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15  # Spaces the round keys apart
+
+
+class AliasSampler:
+    """Draws indexes 0..n-1 with probability proportional to their weights, in O(1)"""
+
+    def __init__(self, weights: Iterable[float]):
+        scaled = array("d", weights)
+        count = len(scaled)
+        total = sum(scaled)
+        # Checked one by one: min() lets a NaN through
+        if (not count or not 0 < total < math.inf
+                or not all(0 <= weight < math.inf for weight in scaled)):
+            raise ValueError("weights must be finite and non-negative with a positive total")
+        for i in range(count):
+            scaled[i] *= count / total
+        alias = array("i", range(count))
+        small = [i for i in range(count) if scaled[i] < 1.0]
+        large = [i for i in range(count) if scaled[i] >= 1.0]
+        # Top up each underfull column with the excess of an overfull one
+        while small and large:
+            short, tall = small.pop(), large[-1]
+            alias[short] = tall
+            scaled[tall] -= 1.0 - scaled[short]
+            if scaled[tall] < 1.0:
+                large.pop()
+                small.append(tall)
+        for i in small + large:
+            scaled[i] = 1.0  # Only rounding error is left over
+        self.prob = scaled
+        self.alias = alias
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def draw(self, rng=random) -> int:
+        u = rng.random() * len(self.prob)
+        column = int(u)
+        return column if u - column < self.prob[column] else self.alias[column]
+
+
+# =============================================================================
+# Shuffle bags
+# =============================================================================
+
+def _round_function(value: int, key: int) -> int:
+    """splitmix64's finalizer over value + key: every input bit reaches every output bit"""
+    z = (value + key) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def permute(index: int, size: int, key: int) -> int:
+    """Position `index` of the permutation of 0..size-1 chosen by `key`"""
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    round_keys = [(key + GOLDEN * (round + 1)) & MASK64 for round in range(ROUNDS)]
+    value = index
+    while True:
+        # A Feistel network permutes 0..4**half-1; values past the end walk on
+        left, right = value >> half, value & mask
+        for round_key in round_keys:
+            left, right = right, left ^ (_round_function(right, round_key) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+class BagState(NamedTuple):
+    """One client's place in its shuffle bag"""
+    key: int
+    position: int
+    size: int
+
+    def token(self) -> str:
+        return f"{self.key:x}.{self.position:x}.{self.size:x}"
+
+    @classmethod
+    def parse(cls, token: Optional[str]) -> Optional["BagState"]:
+        """State from a token; None if it is missing or not one"""
+        try:
+            key, position, size = (int(part, 16) for part in (token or "").split("."))
+        except ValueError:
+            return None
+        if not 0 <= key < 1 << 64 or not 0 <= position <= size:
+            return None
+        return cls(key, position, size)
+
+
+def bag_draw(state: Optional[BagState], size: int, rng=random) -> Tuple[int, BagState]:
+    """Next index from a client's bag and the state after it
+
+    A client with no bag, or one dealt for a different corpus size, gets
+    a new bag; so does one that has seen every index.
+    """
+    if state is None or state.size != size or state.position >= size:
+        state = BagState(rng.getrandbits(64), 0, size)
+    index = permute(state.position, size, state.key)
+    return index, state._replace(position=state.position + 1)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Production server for backend_flask.py.
+
+    python quote_server.py --db quotes.db --port 8000 --workers 4
+
+The master process opens the quote store, builds the weighted sampler's
+alias table and binds the listening socket, then forks the workers; each
+serves the shared socket with werkzeug's threaded server, and the kernel
+hands every new connection to one of them.  Nothing is loaded twice:
+the corpus is a memory-mapped SQLite file, so every worker reads the
+same page cache, and what the master built before forking is shared
+copy-on-write.  The alias table is two flat arrays whose pages nobody
+writes, and gc.freeze() keeps the collector from dirtying the pages of
+the master's objects in every child.
+
+The master checks the corpus file every --check-interval seconds.  When
+it has been replaced (quote_store.py writes a new file and renames it
+into place), or on SIGHUP, the master loads the new corpus, forks a
+fresh set of workers and only then stops the old ones, which finish the
+requests in hand before exiting; a corpus that fails to load is logged
+and the running workers carry on.  SIGTERM or SIGINT stops every worker
+the same way.
+
+    python quote_loadtest.py --workers 1,2,4,8
+
+benchmarks throughput against the number of workers.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Dict
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+class Handler(WSGIRequestHandler):
+    """Keep-alive connections, with the per-request log line optional"""
+    protocol_version = "HTTP/1.1"
+    timeout = 10  # Idle keep-alive connections close, so a stopping worker is not held up
+    access_log = False
+
+    def log_request(self, *args, **kwargs):
+        if self.access_log:
+            super().log_request(*args, **kwargs)
+
+
+def log(message: str) -> None:
+    print(f"[{os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def run_worker(app, listener: socket.socket) -> None:
+    """Serve the shared socket until SIGTERM, then finish open requests; never returns"""
+    server = make_server(*listener.getsockname()[:2], app, threaded=True,
+                         request_handler=Handler, fd=listener.fileno())
+    server.daemon_threads = False  # server_close() waits for requests in progress
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so not on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the master, which stops us
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+        server.server_close()
+    except BaseException:
+        traceback.print_exc()
+        os._exit(1)
+    os._exit(0)
+
+
+class Master:
+    """Forks and supervises workers; reloads them when the corpus changes"""
+
+    def __init__(self, app, store, listener: socket.socket, workers: int, graceful_timeout: float = 30.0):
+        self.app = app
+        self.store = store
+        self.listener = listener
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers: Dict[int, int] = {}  # pid -> generation it was forked for
+        self.generation = 0
+        self.stopping = False
+        self.reload_requested = False
+
+    def preload(self) -> None:
+        """Build everything workers share, then freeze it for copy-on-write"""
+        gc.unfreeze()
+        start = time.perf_counter()
+        try:
+            if self.store.max_id:
+                self.store.weighted_sampler()
+        finally:
+            self.store.close()  # Each worker opens its own connection
+            gc.collect()
+            gc.freeze()
+        log(f"loaded {self.store.max_id:,} quotes from {self.store.path} "
+            f"in {time.perf_counter() - start:.2f} s")
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            self.store.check_interval = None  # Serve this corpus until the master replaces us
+            run_worker(self.app, self.listener)
+        self.workers[pid] = self.generation
+
+    def reload(self) -> None:
+        """New workers for the current corpus first, then the old ones stop
+
+        A corpus that fails to load is logged and skipped: the workers
+        already running carry on serving.
+        """
+        self.reload_requested = False
+        try:
+            self.preload()
+        except Exception as e:
+            log(f"reload failed, still serving the previous corpus: {type(e).__name__}: {e}")
+            return
+        self.generation += 1
+        old = list(self.workers)
+        for _ in range(self.worker_count):
+            self.spawn()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        log(f"reloaded: {self.worker_count} new workers, {len(old)} stopping")
+
+    def _signal(self, pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self) -> None:
+        """Collect exited workers, replacing any current one that died"""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            generation = self.workers.pop(pid, None)
+            if generation == self.generation and not self.stopping:
+                log(f"worker {pid} exited unexpectedly (status {status}), starting another")
+                self.spawn()
+
+    def run(self) -> None:
+        def stop(signum, frame):
+            self.stopping = True
+
+        def reload(signum, frame):
+            self.reload_requested = True
+
+        try:
+            self.preload()
+        except Exception as e:
+            # Nothing is forked yet, so there is nobody to leave behind
+            self.listener.close()
+            raise SystemExit(f"cannot load {self.store.path}: {type(e).__name__}: {e}")
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+        try:
+            for _ in range(self.worker_count):
+                self.spawn()
+            log(f"serving on {':'.join(map(str, self.listener.getsockname()[:2]))} "
+                f"with {self.worker_count} workers")
+            while not self.stopping:
+                time.sleep(0.2)
+                self.reap()
+                if self.reload_requested or self._corpus_replaced():
+                    self.reload()
+        finally:
+            self.shutdown()  # Workers never outlive the master, whatever stopped it
+
+    def _corpus_replaced(self) -> bool:
+        try:
+            return self.store.refresh()
+        except Exception as e:
+            log(f"cannot read the replaced corpus, still serving the previous one: "
+                f"{type(e).__name__}: {e}")
+            return False
+
+    def shutdown(self) -> None:
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+            self.reap()
+        for pid in self.workers:
+            log(f"worker {pid} did not stop in {self.graceful_timeout:g} s, killing it")
+            self._signal(pid, signal.SIGKILL)
+        self.listener.close()
+        log("stopped")
+
+
+def listen(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork production server for the quote API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--db", help="quote store to serve (default: $QUOTES_DB or quotes.db)")
+    parser.add_argument("--check-interval", type=float, default=1.0,
+                        help="seconds between checks for a replaced corpus file")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds stopping workers get to finish their requests")
+    parser.add_argument("--access-log", action="store_true", help="log every request to stderr")
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["QUOTES_DB"] = args.db
+    from backend_flask import QUOTES_DB, app, open_store  # Reads QUOTES_DB, so after it is set
+    try:
+        store = open_store()
+    except Exception as e:
+        raise SystemExit(f"cannot open {QUOTES_DB}: {type(e).__name__}: {e}")
+
+    Handler.access_log = args.access_log
+    store.check_interval = args.check_interval
+    listener = listen(args.host, args.port)
+    Master(app, store, listener, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
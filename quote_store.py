@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+On-disk quote store for backend_flask.py.
+
+Quotes live in a SQLite file: a `quotes` table keyed by a dense integer
+id plus an FTS5 full-text index over text and author.  Opening a store
+reads nothing but the largest id, so a worker starts at once whatever
+the size of the corpus, and SQLite pages the rest in from the
+memory-mapped file as requests touch it.
+
+Listing and search are paginated by keyset: every page ends with the id
+to continue after, and the next page starts at `id > after` on the
+primary key (or on the full-text index's rowids), so page 10,000 costs
+the same as page 1, where OFFSET would step over every earlier row.
+
+Each quote has a weight (1 unless given) for weighted_id(), which draws
+from an alias table built over all the weights on first use.
+
+create_store() builds a new file beside the old and renames it into
+place; a running QuoteStore notices on refresh() and reconnects.
+
+    python quote_store.py generate 2000000 -o quotes.db
+    python quote_store.py import my_quotes.txt -o quotes.db
+    python quote_store.py search quotes.db "never stop"
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote as url_quote
+
+from quote_sampling import AliasSampler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    author TEXT NOT NULL DEFAULT '',
+    weight REAL NOT NULL DEFAULT 1
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+    text, author, content='quotes', content_rowid='id'
+);
+"""
+
+MAX_PAGE = 100  # Most results one page may ask for
+MMAP_SIZE = 1 << 30  # Read through a shared memory map rather than per-connection buffers
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching every word of `query` (a trailing * keeps prefix search)
+
+    Words are quoted, so user input can never be a syntax error.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class QuoteStore:
+    """Read-only access to a quote file, one connection per thread (and process)"""
+
+    def __init__(self, path: str, check_interval: Optional[float] = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.generation = 0  # Bumped whenever the file is replaced
+        self._local = threading.local()
+        self._next_check = 0.0
+        self._sampler = (None, None)  # (generation, AliasSampler) once asked for
+        self._sampler_lock = threading.Lock()
+        self._signature = self._stat()
+        if self._signature is None:
+            raise FileNotFoundError(path)
+        self.max_id = self._read_max_id()
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_max_id(self) -> int:
+        return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM quotes").fetchone()[0]
+
+    def _db(self) -> sqlite3.Connection:
+        # Connections are never shared: not between threads, nor with a forked
+        # child, and each thread reconnects once the file has been replaced
+        local = self._local
+        if getattr(local, "key", None) != (os.getpid(), self.generation):
+            local.db = sqlite3.connect(f"file:{url_quote(os.path.abspath(self.path))}?mode=ro", uri=True)
+            local.db.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            local.key = (os.getpid(), self.generation)
+        return local.db
+
+    def close(self) -> None:
+        """Close this thread's connection; the next query opens a new one"""
+        local = self._local
+        if getattr(local, "key", None) is not None:
+            local.db.close()
+            local.key = None
+
+    def refresh(self) -> bool:
+        """Switch to a new corpus if the file was replaced; checks at most every check_interval
+
+        A check_interval of None never checks, for processes that are
+        replaced rather than refreshed (quote_server.py's workers).
+        """
+        now = time.monotonic()
+        if self.check_interval is None or now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        self.generation += 1
+        self.max_id = self._read_max_id()
+        return True
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+
+    @staticmethod
+    def _rows(rows) -> List[Dict]:
+        return [{"id": id, "text": text, "author": author} for id, text, author in rows]
+
+    def get(self, quote_id: int) -> Optional[Dict]:
+        rows = self._db().execute("SELECT id, text, author FROM quotes WHERE id = ?", (quote_id,))
+        found = self._rows(rows)
+        return found[0] if found else None
+
+    def random_id(self) -> int:
+        """A uniformly random id; ids are dense, as create_store() numbers quotes 1..n"""
+        return random.randint(1, self.max_id) if self.max_id else 0
+
+    def sample(self, count: int, weighted: bool = False, rng=random) -> List[Dict]:
+        """`count` independent random quotes (repeats possible), in one query"""
+        if not self.max_id or count <= 0:
+            return []
+        if weighted:
+            sampler = self.weighted_sampler()
+            return self.get_many([sampler.draw(rng) + 1 for _ in range(count)]) if sampler else []
+        return self.get_many([rng.randint(1, self.max_id) for _ in range(count)])
+
+    def get_many(self, ids: List[int]) -> List[Dict]:
+        """Quotes for `ids` in the same order, repeats included, missing ids skipped"""
+        found = {}
+        for start in range(0, len(ids), 500):  # Stay under SQLite's variable limit
+            chunk = list(set(ids[start:start + 500]))
+            rows = self._db().execute(
+                f"SELECT id, text, author FROM quotes WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            found.update((quote["id"], quote) for quote in self._rows(rows))
+        return [found[id] for id in ids if id in found]
+
+    def weights(self) -> Iterator[float]:
+        """Every quote's weight in id order (all 1 in stores made before weights existed)"""
+        columns = [row[1] for row in self._db().execute("PRAGMA table_info(quotes)")]
+        if "weight" not in columns:
+            yield from (1.0 for _ in range(self.max_id))
+            return
+        for (weight,) in self._db().execute("SELECT weight FROM quotes ORDER BY id"):
+            yield weight
+
+    def weighted_sampler(self) -> Optional[AliasSampler]:
+        """Alias table over the weights, built on first use and again after a refresh
+
+        None when no quote can be drawn by weight: an empty store, or one
+        (from before imports checked) whose weights add up to nothing usable.
+        """
+        with self._sampler_lock:
+            generation, sampler = self._sampler
+            if generation != self.generation:
+                try:
+                    sampler = AliasSampler(self.weights())
+                except ValueError:
+                    sampler = None
+                self._sampler = (self.generation, sampler)
+            return sampler
+
+    def weighted_id(self, rng=random) -> int:
+        """A random id drawn in proportion to the quotes' weights; 0 if there is none"""
+        sampler = self.weighted_sampler()
+        return sampler.draw(rng) + 1 if sampler else 0
+
+    def scan(self, after: int = 0, batch: int = 1000) -> Iterator[Dict]:
+        """Every quote with id > after, in id order, fetched a batch at a time"""
+        while True:
+            rows = self._rows(self._db().execute(
+                "SELECT id, text, author FROM quotes WHERE id > ? ORDER BY id LIMIT ?", (after, batch)))
+            yield from rows
+            if len(rows) < batch:
+                return
+            after = rows[-1]["id"]
+
+    def page(self, after: int = 0, limit: int = 20) -> Tuple[List[Dict], Optional[int]]:
+        """Quotes with id > after, in id order; returns (quotes, cursor for the next page)"""
+        limit = max(1, min(limit, MAX_PAGE))
+        rows = self._rows(self._db().execute(
+            "SELECT id, text, author FROM quotes WHERE id > ? ORDER BY id LIMIT ?", (after, limit)))
+        return rows, rows[-1]["id"] if len(rows) == limit else None
+
+    def search(self, query: str, after: int = 0, limit: int = 20) -> Tuple[List[Dict], Optional[int]]:
+        """Quotes containing every word of `query`, in id order, paged like page()"""
+        limit = max(1, min(limit, MAX_PAGE))
+        expression = match_expression(query)
+        if not expression:
+            return [], None
+        rows = self._rows(self._db().execute(
+            "SELECT rowid, text, author FROM quotes_fts WHERE quotes_fts MATCH ? AND rowid > ? "
+            "ORDER BY rowid LIMIT ?", (expression, after, limit)))
+        return rows, rows[-1]["id"] if len(rows) == limit else None
+
+
+def valid_weight(weight) -> bool:
+    """Whether the alias table can use `weight`: a finite number, not negative"""
+    return isinstance(weight, (int, float)) and math.isfinite(weight) and weight >= 0
+
+
+def create_store(path: str, quotes: Iterable[Tuple], batch: int = 50_000) -> int:
+    """Write (text, author[, weight]) rows to a new store file and index them; returns the count"""
+    temp = f"{path}.tmp"
+    if os.path.exists(temp):
+        os.remove(temp)
+    connection = sqlite3.connect(temp)
+    built = False
+    try:
+        connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        count = 0
+        total = 0.0
+        rows = iter(quotes)
+        while True:
+            chunk = [row if len(row) == 3 else (*row, 1.0) for _, row in zip(range(batch), rows)]
+            if not chunk:
+                break
+            for number, (_, _, weight) in enumerate(chunk, count + 1):
+                if not valid_weight(weight):
+                    raise ValueError(f"row {number}: weight {weight!r} must be finite and not negative")
+                total += weight
+            connection.executemany("INSERT INTO quotes (text, author, weight) VALUES (?, ?, ?)", chunk)
+            count += len(chunk)
+        if count and not 0 < total < math.inf:
+            raise ValueError("the weights must add up to a finite number above zero")
+        connection.execute("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')")
+        connection.commit()
+        connection.execute("VACUUM")
+        built = True
+    finally:
+        connection.close()
+        if not built:
+            os.remove(temp)  # A bad row or a failing source leaves nothing behind
+    os.replace(temp, path)  # Readers never see a half-built store
+    return count
+
+
+# =============================================================================
+# Corpus tools
+# =============================================================================
+
+OPENINGS = ["Discipline", "Patience", "Curiosity", "Courage", "Practice", "Kindness", "Focus",
+            "Every bug", "A good test", "Clean code", "Small steps", "Hard work", "Doubt", "Failure"]
+VERBS = ["is stronger than", "outlasts", "teaches more than", "beats", "becomes", "grows into",
+         "is the root of", "quietly defeats", "is worth more than", "leads to"]
+ENDINGS = ["motivation", "talent", "luck", "fear", "a deadline", "a shortcut", "perfection",
+           "the first idea", "any framework", "yesterday's plan", "wisdom", "mastery"]
+TAILS = ["", " Never stop learning.", " Code, sleep, repeat.", " Start today.",
+         " Keep going.", " Ship it."]
+WEIGHTS = [1, 1, 1, 1, 2, 2, 5, 0.5]
+AUTHORS = ["Ada", "Grace", "Linus", "Guido", "Barbara", "Edsger", "Donald", "Margaret", "Ken", ""]
+
+
+def generate_quotes(count: int, seed: int = 0) -> Iterable[Tuple[str, str, float]]:
+    """`count` synthetic (text, author, weight) rows, for testing big corpora"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        text = f"{rng.choice(OPENINGS)} {rng.choice(VERBS)} {rng.choice(ENDINGS)}.{rng.choice(TAILS)}"
+        yield text, rng.choice(AUTHORS), rng.choice(WEIGHTS)
+
+
+def read_quotes(path: str) -> Iterable[Tuple[str, str, float]]:
+    """One quote per line, optionally followed by a tab and the author, and a tab and a weight"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            text, _, rest = line.rstrip("\n").partition("\t")
+            author, _, weight = rest.partition("\t")
+            if not text.strip():
+                continue
+            try:
+                weight = float(weight) if weight.strip() else 1.0
+            except ValueError:
+                raise ValueError(f"{path}:{number}: weight {weight!r} is not a number") from None
+            if not valid_weight(weight):
+                raise ValueError(f"{path}:{number}: weight {weight!r} must be finite and not negative")
+            yield text.strip(), author.strip(), weight
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quote store files for backend_flask.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="write a synthetic corpus")
+    generate.add_argument("count", type=int)
+    generate.add_argument("-o", "--output", required=True)
+    generate.add_argument("--seed", type=int, default=0)
+    load = commands.add_parser("import", help="index a text file (quote[TAB author[TAB weight]] per line)")
+    load.add_argument("file")
+    load.add_argument("-o", "--output", required=True)
+    search = commands.add_parser("search", help="full-text search a store")
+    search.add_argument("store")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "search":
+        start = time.perf_counter()
+        quotes, _ = QuoteStore(args.store).search(args.query, limit=args.limit)
+        for quote in quotes:
+            print(f"{quote['id']:>9}  {quote['text']}  -- {quote['author'] or 'unknown'}")
+        print(f"{len(quotes)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return
+
+    start = time.perf_counter()
+    quotes = generate_quotes(args.count, args.seed) if args.command == "generate" else read_quotes(args.file)
+    count = create_store(args.output, quotes)
+    print(f"Wrote {count:,} quotes to {args.output} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,21 +14,74 @@ Demonstrates core Python concepts including:
 - Context managers
 """
 
+import argparse
+import contextlib
+import hashlib
+import json
+import os
 import random
+import re
+import sys
 import time
-import json
-from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from castle_commands import CommandTable
+from castle_history import GameHistory, GameState, PersistentMap
+from castle_metrics import GameMetrics
+from castle_routes import shared_table
+from castle_save import SaveJournal
+from castle_world import BUILTIN_ROOMS, CastleWorld
+
+# Per-verb latency histograms and the structured event log (see castle_metrics.py)
+METRICS = GameMetrics()
+
+# Every command handler registers itself here (see castle_commands.py)
+COMMANDS = CommandTable()
+DIRECTIONS = ["north", "south", "east", "west"]
+
+# Player attributes kept in save journals
+PLAYER_FIELDS = ("name", "health", "inventory", "location", "score")
+# Typed in full, these are commands even when a puzzle is waiting for an answer
+HISTORY_COMMANDS = ("undo", "redo", "snapshot", "rewind")
+
+# Save files are named after their players, with anything else replaced
+UNSAFE_FILE_CHARS = re.compile(r"[^a-z0-9_-]")
+
+
+def journal_name(name: str) -> str:
+    """File-safe form of a player's name, different for different names
+
+    A name of letters, digits, - and _ is used as it is (lowercased);
+    any other has its unsafe characters replaced and a short hash of the
+    whole name added, so "a b" and "a/b" still get files of their own.
+    """
+    name = name.lower()
+    slug = UNSAFE_FILE_CHARS.sub("_", name)
+    if slug == name and len(slug) <= 64:
+        return slug
+    return f"{slug[:32]}-{hashlib.sha256(name.encode()).hexdigest()[:12]}"
+
+
+# Chance of a random encounter on entering a room, and what can happen
+# (negative damage heals); castle_balance.py simulates other settings
+ENCOUNTER_CHANCE = 0.3
+ENCOUNTERS = [
+    ("A bat flies into your face!", 5),
+    ("You trip on a loose stone!", 10),
+    ("A ghostly chill runs through you!", 15),
+    ("You find a healing herb!", -20),
+]
 
 # =============================================================================
 # DECORATORS - For adding functionality to methods
 # =============================================================================
 
 def game_logger(func):
-    """Decorator to log game events"""
+    """Decorator to record a structured event after each call"""
+    name = func.__name__
     def wrapper(*args, **kwargs):
         result = func(*args, **kwargs)
-        print(f"[LOG] {func.__name__} executed at {datetime.now().strftime('%H:%M:%S')}")
+        METRICS.event(name)
         return result
     return wrapper
 
@@ -48,9 +101,76 @@ def require_item(item_name: str):
 # CLASSES - Object Oriented Programming
 # =============================================================================
 
+class ItemBag:
+    """Multiset of item names that iterates like the list it replaces
+
+    Most bags hold a few items, and for those the list is all there is:
+    scanning it beats hashing and costs a fraction of a dict.  Past
+    SMALL_BAG items a count dict joins it, so membership and counts
+    stay O(1) however much a bag holds.
+    """
+    
+    __slots__ = ("_items", "_counts")
+    
+    SMALL_BAG = 8
+    
+    def __init__(self, items: Iterable[str] = ()):
+        self._items: List[str] = list(items)  # In the order they were added
+        self._counts: Optional[Dict[str, int]] = None
+        if len(self._items) > self.SMALL_BAG:
+            self._count_items()
+    
+    def _count_items(self) -> None:
+        self._counts = {}
+        for item in self._items:
+            self._counts[item] = self._counts.get(item, 0) + 1
+    
+    def append(self, item: str) -> None:
+        self._items.append(item)
+        if self._counts is not None:
+            self._counts[item] = self._counts.get(item, 0) + 1
+        elif len(self._items) > self.SMALL_BAG:
+            self._count_items()
+    
+    def remove(self, item: str) -> None:
+        """Remove the first `item`; ValueError if there is none (like list.remove)"""
+        if item not in self:
+            raise ValueError(f"{item!r} not in bag")
+        self._items.remove(item)
+        if self._counts is not None:
+            if self._counts[item] == 1:
+                del self._counts[item]
+            else:
+                self._counts[item] -= 1
+    
+    def count(self, item: str) -> int:
+        if self._counts is None:
+            return self._items.count(item)
+        return self._counts.get(item, 0)
+    
+    def __contains__(self, item: str) -> bool:
+        return item in (self._items if self._counts is None else self._counts)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ItemBag):
+            return self._items == other._items
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"ItemBag({self._items!r})"
+
 class Player:
     """Player class to manage player state"""
     
+    # No per-instance __dict__: a server keeps one Player per session
+    __slots__ = ("name", "health", "_inventory", "location", "score", "_secret_code")
+    
     def __init__(self, name: str):
         self.name = name
         self.health = 100
@@ -59,6 +179,15 @@ class Player:
         self.score = 0
         self._secret_code = random.randint(1000, 9999)  # Private attribute
         
+    @property
+    def inventory(self) -> ItemBag:
+        return self._inventory
+    
+    @inventory.setter
+    def inventory(self, items: Iterable[str]) -> None:
+        """Accepts any list of items (e.g. from a save) and keeps it as an ItemBag"""
+        self._inventory = ItemBag(items)
+    
     def __str__(self) -> str:
         return f"Player {self.name} (Health: {self.health}, Score: {self.score})"
     
@@ -84,25 +213,27 @@ class Player:
     
     def add_item(self, item: str) -> None:
         """Add item to inventory"""
-        if item not in self.inventory:
-            self.inventory.append(item)
+        if item not in self._inventory:
+            self._inventory.append(item)
             print(f"Added {item} to inventory!")
     
     def remove_item(self, item: str) -> bool:
         """Remove item from inventory"""
-        if item in self.inventory:
-            self.inventory.remove(item)
+        if item in self._inventory:
+            self._inventory.remove(item)
             return True
         return False
 
 class Room:
     """Room class to represent different locations"""
     
+    __slots__ = ("name", "description", "items", "connections", "puzzle", "visited")
+    
     def __init__(self, name: str, description: str, items: List[str] = None, 
                  connections: Dict[str, str] = None, puzzle: str = None):
         self.name = name
         self.description = description
-        self.items = items if items else []
+        self.items = ItemBag(items or ())
         self.connections = connections if connections else {}
         self.puzzle = puzzle
         self.visited = False
@@ -129,52 +260,32 @@ class Room:
 class Game:
     """Main game class"""
     
-    def __init__(self):
+    def __init__(self, world_path: Optional[str] = None, max_rooms: int = 256,
+                 item_delay: float = 0.5, read_line=input, autosave_every: int = 0,
+                 own_saves_only: bool = False):
         self.player = None
-        self.rooms = self._create_rooms()
+        self.item_delay = item_delay  # Dramatic pause between items found by explore
+        self.read_line = read_line  # Where the player's name comes from
+        self.pending_puzzle = None  # Room whose puzzle the next line answers
+        # Rooms are loaded from the world file as the player reaches them
+        # (see castle_world.py); without one, the original castle is used
+        if world_path:
+            self.rooms = CastleWorld.open(world_path, Room, max_rooms)
+        else:
+            self.rooms = CastleWorld.from_rooms(BUILTIN_ROOMS, Room, max_rooms)
+        self.world_name = os.path.abspath(world_path) if world_path else "builtin"
+        self.routes = None  # The world's shared route table, from the first goto
+        # Every command's result is recorded for undo (see castle_history.py)
+        self.history = GameHistory()
         self.game_active = False
         self.actions_taken = 0
         
-    def _create_rooms(self) -> Dict[str, Room]:
-        """Create game rooms using dictionary comprehension"""
-        room_data = {
-            "entrance": {
-                "description": "You stand before a massive castle gate. Cold wind howls through the ancient stones.",
-                "items": ["key"],
-                "connections": {"north": "great_hall", "east": "garden"}
-            },
-            "great_hall": {
-                "description": "A vast hall with towering ceilings. Tattered banners hang from the walls.",
-                "items": ["sword", "potion"],
-                "connections": {"south": "entrance", "west": "library", "east": "dungeon"},
-                "puzzle": "riddle"
-            },
-            "library": {
-                "description": "Dusty books line the walls from floor to ceiling. A single candle flickers on a desk.",
-                "items": ["ancient book", "candle"],
-                "connections": {"east": "great_hall"},
-                "puzzle": "books"
-            },
-            "dungeon": {
-                "description": "Dark, damp cells line the corridor. The air smells of decay and rust.",
-                "items": ["bone key"],
-                "connections": {"west": "great_hall", "north": "treasure_room"}
-            },
-            "garden": {
-                "description": "An overgrown courtyard with a mysterious fountain in the center.",
-                "items": ["herbs", "gold coin"],
-                "connections": {"west": "entrance"}
-            },
-            "treasure_room": {
-                "description": "A glittering room filled with gold, jewels, and ancient artifacts!",
-                "items": ["crown", "treasure chest"],
-                "connections": {"south": "dungeon"}
-            }
-        }
+        # Saves are deltas appended to a journal (see castle_save.py)
+        self.autosave_every = autosave_every  # Commands between autosaves (0 = off)
+        self.own_saves_only = own_saves_only  # Servers: no loading someone else's save
+        self.journal = None
+        self._saved_player = {}  # Player fields as of the last save
         
-        # Dictionary comprehension to create Room objects
-        return {name: Room(name, **data) for name, data in room_data.items()}
-    
     # =============================================================================
     # GENERATOR - For creating sequences
     # =============================================================================
@@ -184,50 +295,55 @@ class Game:
         room = self.rooms[room_name]
         for item in room.items:
             yield item
-            time.sleep(0.5)  # Small delay for dramatic effect
+            if self.item_delay:
+                time.sleep(self.item_delay)  # Small delay for dramatic effect
     
     # =============================================================================
     # CONTEXT MANAGER - For resource management
     # =============================================================================
     
     class GameSaver:
-        """Context manager for saving game state"""
+        """Context manager that journals a save if the block succeeds"""
         
-        def __init__(self, filename: str, game_data: dict):
-            self.filename = filename
-            self.game_data = game_data
+        def __init__(self, journal: SaveJournal, record: dict):
+            self.journal = journal
+            self.record = record
         
         def __enter__(self):
             return self
         
         def __exit__(self, exc_type, exc_val, exc_tb):
             if exc_type is None:
-                with open(self.filename, 'w') as f:
-                    json.dump(self.game_data, f)
-                print(f"Game saved to {self.filename}")
+                self.journal.append(self.record)
+                self.journal.sync()  # An explicit save waits until it is on disk
+                print(f"Game saved to {self.journal.path}")
             return False
     
     # =============================================================================
     # GAME METHODS
     # =============================================================================
     
-    def start_game(self) -> None:
-        """Initialize and start the game"""
+    def start_game(self, name: Optional[str] = None) -> None:
+        """Initialize and start the game, asking for a name unless given one"""
         print("Welcome to THE MYSTERIOUS CASTLE!")
-        name = input("Enter your name, brave adventurer: ").strip()
+        if name is None:
+            name = self.read_line("Enter your name, brave adventurer: ").strip()
         
         # Input validation
         while not name:
-            name = input("Please enter a valid name: ").strip()
+            name = self.read_line("Please enter a valid name: ").strip()
         
         self.player = Player(name)
+        self.player.location = self.rooms.meta("start", "entrance")
         self.game_active = True
         
         print(f"\nGreetings, {self.player.name}! Your adventure begins...")
         print("Type 'help' for commands\n")
         
         self._show_location()
+        self.history.reset(self._capture(PersistentMap()))
     
+    @COMMANDS.register("look", aliases=["l"], help="Describe current location")
     @game_logger
     def _show_location(self) -> None:
         """Display current location description"""
@@ -238,24 +354,36 @@ class Game:
         """Handle room puzzles"""
         if room.puzzle == "riddle":
             print("\nA ghostly figure appears and asks: 'I speak without a mouth and hear without ears. I have no body, but I come alive with wind. What am I?'")
-            answer = input("Your answer: ").lower().strip()
+            # The player's next line is the answer (see process_command), so
+            # the game never blocks waiting for input in the middle of a command
+            self.pending_puzzle = room.name
+            return True
+                
+        elif room.puzzle == "books":
+            print("\nThe books are arranged in a strange order. Can you find the pattern?")
+            # List comprehension to create book titles
+            books = [f"Book {chr(65 + i)}" for i in range(5)]
+            print("Books:", ", ".join(books))
+            return True
             
+        return True
+    
+    def _answer_puzzle(self, answer: str) -> bool:
+        """Check the answer to the puzzle asked by _handle_puzzle"""
+        room = self.rooms[self.pending_puzzle]
+        self.pending_puzzle = None
+        
+        if room.puzzle == "riddle":
             if answer == "echo":
                 print("Correct! The ghost vanishes, leaving behind a glowing orb.")
                 room.items.append("glowing orb")
+                room.puzzle = None  # Solved for good
                 self.player.score += 50
                 return True
             else:
                 print("Wrong! The ghost wails and disappears.")
                 return False
                 
-        elif room.puzzle == "books":
-            print("\nThe books are arranged in a strange order. Can you find the pattern?")
-            # List comprehension to create book titles
-            books = [f"Book {chr(65 + i)}" for i in range(5)]
-            print("Books:", ", ".join(books))
-            return True
-            
         return True
     
     @require_item("key")
@@ -265,98 +393,235 @@ class Game:
         self.player.score += 20
         return True
     
+    def has_won(self) -> bool:
+        """Is the player in the treasure room holding the treasure chest?"""
+        return (self.player.location == "treasure_room" and
+                "treasure chest" in self.player.inventory)
+    
+    def prompt(self) -> str:
+        """What to ask the player for next"""
+        return "Your answer: " if self.pending_puzzle else "\nWhat would you like to do? "
+    
     def process_command(self, command: str) -> bool:
         """Process player commands"""
+        start = time.perf_counter_ns()
+        score = self.player.score
+        words = command.lower().split()
+        if self.pending_puzzle and not (words and words[0] in HISTORY_COMMANDS):
+            verb = "answer"
+            self._answer_puzzle(command.lower().strip())
+            keep_going = True
+        else:
+            keep_going, verb = self._run_command(command)
+        state = self._capture(self.history.current.rooms)
+        if state is not None:
+            self.history.record(state)
+        METRICS.command(verb, self.player.location, time.perf_counter_ns() - start,
+                        self.player.score - score, self.player.name)
+        return keep_going
+    
+    def _run_command(self, command: str):
+        """Dispatch one command line; returns (keep going?, verb for the metrics)"""
         self.actions_taken += 1
         cmd_parts = command.lower().split()
         
         if not cmd_parts:
-            return True
-        
-        action = cmd_parts[0]
+            return True, "empty"
         
+        resolved = COMMANDS.resolve(cmd_parts[0])
+        verb = resolved[0] if resolved else "unknown"
         try:
-            if action in ["quit", "exit"]:
-                self.game_active = False
-                print("Thanks for playing!")
-                return False
-                
-            elif action == "help":
-                self._show_help()
-                
-            elif action == "look":
-                self._show_location()
-                
-            elif action == "inventory":
-                self._show_inventory()
-                
-            elif action == "health":
-                print(f"Your health: {self.player.health}")
-                
-            elif action == "score":
-                print(f"Your score: {self.player.score}")
-                
-            elif action == "move" and len(cmd_parts) > 1:
-                self._move_player(cmd_parts[1])
-                
-            elif action == "take" and len(cmd_parts) > 1:
-                self._take_item(' '.join(cmd_parts[1:]))
-                
-            elif action == "use" and len(cmd_parts) > 1:
-                self._use_item(' '.join(cmd_parts[1:]))
-                
-            elif action == "save":
-                self._save_game()
-                
-            elif action == "explore":
-                self._explore_room()
-                
-            else:
-                print("Unknown command. Type 'help' for available commands.")
-                
+            # Handlers return False to end the game
+            keep_going = COMMANDS.dispatch(self, cmd_parts) is not False
+            if self.autosave_every and self.actions_taken % self.autosave_every == 0:
+                self._autosave()
+            return keep_going, verb
         except Exception as e:
             print(f"Something went wrong: {e}")
             
-        return True
+        return True, verb
     
+    # =============================================================================
+    # HISTORY - Undo, redo and snapshots
+    # =============================================================================
+    
+    def _capture(self, rooms: PersistentMap) -> Optional[GameState]:
+        """The state now, sharing `rooms`' unchanged entries; None if it equals the current one"""
+        for name in self.rooms.take_touched():
+            data = self.rooms.room_json(name)
+            recorded = rooms.get(name)
+            if recorded is None:
+                recorded = self.rooms.base_json(name)
+            if data != recorded:
+                rooms = rooms.set(name, data)
+        values = {field: getattr(self.player, field) for field in PLAYER_FIELDS}
+        values["inventory"] = tuple(values["inventory"])
+        player = tuple(values.values())
+        current = self.history.current
+        if (current is not None and rooms is current.rooms and player == current.player
+                and self.pending_puzzle == current.pending_puzzle):
+            return None
+        return GameState(self.actions_taken, player, self.pending_puzzle, rooms)
+    
+    def snapshot(self) -> GameState:
+        """The current state, to pass to restore() later; costs nothing to keep"""
+        return self.history.current
+    
+    def restore(self, state: GameState, look: bool = False) -> None:
+        """Move the game to `state` (from snapshot()); undo comes back here"""
+        self._move_to(self.history.current, state, look)
+        self.history.record(state)
+    
+    def _move_to(self, old: GameState, new: GameState, look: bool = False) -> None:
+        """Rewrite only the rooms that differ between the two states
+
+        Landing where a riddle was waiting for its answer asks it again.
+        """
+        for name in new.rooms.diff(old.rooms):
+            self.rooms.restore_room(name, new.rooms.get(name))
+        for field, value in zip(PLAYER_FIELDS, new.player):
+            setattr(self.player, field, value)
+        self.actions_taken = new.turn
+        self.pending_puzzle = new.pending_puzzle
+        if look:
+            self._show_location()
+        if self.pending_puzzle:
+            self._handle_puzzle(self.rooms[self.pending_puzzle])
+    
+    @COMMANDS.register("undo", help="Take back the last thing you did")
+    def _undo(self) -> None:
+        """Step back one recorded state"""
+        current = self.history.current
+        state = self.history.undo()
+        if state is None:
+            print("Nothing to undo.")
+            return
+        print(f"Undone (back to turn {state.turn}).")
+        self._move_to(current, state, look=True)
+    
+    @COMMANDS.register("redo", help="Do again what undo took back")
+    def _redo(self) -> None:
+        """Step forward one undone state"""
+        current = self.history.current
+        state = self.history.redo()
+        if state is None:
+            print("Nothing to redo.")
+            return
+        print(f"Redone (turn {state.turn}).")
+        self._move_to(current, state, look=True)
+    
+    @COMMANDS.register("snapshot", args=(0, None), usage="snapshot [name]",
+                       help="Remember this moment under a name")
+    def _snapshot(self, name: Optional[str] = None) -> None:
+        """Store the current state under a name"""
+        name = name or f"turn {self.actions_taken}"
+        self.history.snapshots[name] = self.snapshot()
+        print(f"Snapshot '{name}' taken.")
+    
+    @COMMANDS.register("rewind", args=(0, None), usage="rewind [snapshot]",
+                       help="Return to a snapshot (lists them without a name)")
+    def _rewind(self, name: Optional[str] = None) -> None:
+        """Restore a named snapshot; the move can itself be undone"""
+        snapshots = self.history.snapshots
+        if name not in snapshots:
+            if name:
+                print(f"No snapshot called '{name}'.")
+            print("Snapshots:", ", ".join(snapshots) if snapshots else "none")
+            return
+        state = snapshots[name]
+        print(f"Rewound to '{name}' (turn {state.turn}).")
+        self.restore(state, look=True)
+    
+    @COMMANDS.register("help", aliases=["?"], help="Show this list")
     def _show_help(self) -> None:
         """Display help information"""
-        help_text = """
-Available Commands:
-- look: Describe current location
-- move [direction]: Move in specified direction (north, south, east, west)
-- take [item]: Pick up an item
-- use [item]: Use an item from inventory
-- inventory: Show your inventory
-- health: Check your health
-- score: Check your score
-- explore: Examine room carefully
-- save: Save game progress
-- quit: Exit game
-"""
-        print(help_text)
+        print("\nAvailable Commands:")
+        print("\n".join(COMMANDS.help_lines()))
+        print("Commands can be shortened while they stay unambiguous (e.g. 'inv'); "
+              "n, s, e and w move in that direction.\n")
+    
+    @COMMANDS.register("stats", help="Show command latency statistics")
+    def _show_stats(self) -> None:
+        """Print the per-command latency histograms"""
+        print("\n".join(METRICS.report_lines()))
+    
+    @COMMANDS.register("quit", aliases=["exit"], help="Exit game")
+    def _quit(self) -> bool:
+        """End the game"""
+        self.game_active = False
+        print("Thanks for playing!")
+        return False
+    
+    @COMMANDS.register("health", help="Check your health")
+    def _show_health(self) -> None:
+        """Display player health"""
+        print(f"Your health: {self.player.health}")
     
+    @COMMANDS.register("score", help="Check your score")
+    def _show_score(self) -> None:
+        """Display player score"""
+        print(f"Your score: {self.player.score}")
+    
+    @COMMANDS.register("move", aliases=["go"], args=(1, 1), usage="move [direction]",
+                       shortcuts={**{d: [d] for d in DIRECTIONS}, **{d[0]: [d] for d in DIRECTIONS}},
+                       help="Move in specified direction (north, south, east, west)")
     def _move_player(self, direction: str) -> None:
         """Move player to different room"""
         current_room = self.rooms[self.player.location]
+        direction = {d[0]: d for d in DIRECTIONS}.get(direction, direction)  # "move n"
         
         if direction in current_room.connections:
             new_location = current_room.connections[direction]
             self.player.location = new_location
             
-            # Random encounter - 30% chance
-            if random.random() < 0.3:
+            # Random encounter (30% chance by default)
+            if random.random() < ENCOUNTER_CHANCE:
                 self._random_encounter()
                 
+            new_room = self.rooms[new_location]
+            first_visit = not new_room.visited  # describe() marks it visited
             self._show_location()
             
             # Handle room puzzle if exists
-            new_room = self.rooms[new_location]
-            if new_room.puzzle and not new_room.visited:
+            if new_room.puzzle and first_visit:
                 self._handle_puzzle(new_room)
         else:
             print(f"You cannot go {direction} from here!")
     
+    @COMMANDS.register("goto", aliases=["travel"], args=(1, None), usage="goto [room]",
+                       help="Walk the shortest way to a room")
+    def _goto(self, destination: str) -> None:
+        """Move hop by hop along the shortest route, stopping for anything that happens"""
+        if self.routes is None:
+            self.routes = shared_table(self.rooms, self.world_name)
+        target = destination.replace(" ", "_")
+        if target not in self.routes:
+            print(f"There is no room called {destination}.")
+            return
+        hops = self.routes.distance(self.player.location, target)
+        if hops == 0:
+            print("You are already there.")
+            return
+        if hops < 0:
+            print(f"You know of no way to {destination} from here.")
+            return
+        
+        print(f"You set off for {destination} ({hops} rooms away)...")
+        for _ in range(len(self.routes)):
+            room = self.rooms[self.player.location]
+            direction = self.routes.next_step(room.name, target)
+            # The shared table knows the castle as built; this game may differ
+            if direction is None or direction not in room.connections:
+                break
+            self._move_player(direction)
+            # Puzzles, encounters and winning interrupt the journey as they would on foot
+            if self.pending_puzzle or not self.player.is_alive or self.has_won():
+                return
+        if self.player.location != target:
+            print(f"The way to {destination} is blocked.")
+    
+    @COMMANDS.register("take", aliases=["get"], args=(1, None), usage="take [item]",
+                       help="Pick up an item")
     def _take_item(self, item: str) -> None:
         """Take item from current room"""
         current_room = self.rooms[self.player.location]
@@ -368,6 +633,8 @@ Available Commands:
         else:
             print(f"{item} is not here!")
     
+    @COMMANDS.register("use", args=(1, None), usage="use [item]",
+                       help="Use an item from inventory")
     def _use_item(self, item: str) -> None:
         """Use item from inventory"""
         if item == "potion" and item in self.player.inventory:
@@ -378,6 +645,7 @@ Available Commands:
         else:
             print(f"You cannot use {item} right now.")
     
+    @COMMANDS.register("inventory", aliases=["i"], help="Show your inventory")
     def _show_inventory(self) -> None:
         """Display player inventory"""
         if self.player.inventory:
@@ -387,14 +655,7 @@ Available Commands:
     
     def _random_encounter(self) -> None:
         """Handle random encounters"""
-        encounters = [
-            ("A bat flies into your face!", 5),
-            ("You trip on a loose stone!", 10),
-            ("A ghostly chill runs through you!", 15),
-            ("You find a healing herb!", -20),  # Negative damage = healing
-        ]
-        
-        encounter, damage = random.choice(encounters)
+        encounter, damage = random.choice(ENCOUNTERS)
         print(f"\n*** RANDOM ENCOUNTER ***")
         print(encounter)
         
@@ -403,6 +664,7 @@ Available Commands:
         else:
             self.player.heal(abs(damage))
     
+    @COMMANDS.register("explore", aliases=["search"], help="Examine room carefully")
     def _explore_room(self) -> None:
         """Thoroughly explore current room using generator"""
         current_room = self.rooms[self.player.location]
@@ -416,45 +678,203 @@ Available Commands:
         if not current_room.items:
             print("Nothing else of interest here.")
     
+    def _journal_path(self, name: str) -> str:
+        return f"castle_adventure_{journal_name(name)}.journal"
+    
+    def _save_record(self) -> dict:
+        """What changed since the last save: player fields and room states"""
+        player = {field: getattr(self.player, field) for field in PLAYER_FIELDS}
+        player["inventory"] = list(player["inventory"])
+        changed = {field: value for field, value in player.items()
+                   if self._saved_player.get(field) != value}
+        self._saved_player = player
+        return {"turn": self.actions_taken, "player": changed, "rooms": self.rooms.collect_changes()}
+    
+    def _open_journal(self) -> SaveJournal:
+        if self.journal is None:
+            self.journal = SaveJournal(self._journal_path(self.player.name), self.world_name)
+        return self.journal
+    
+    @COMMANDS.register("save", help="Save game progress")
     def _save_game(self) -> None:
         """Save game state using context manager"""
-        game_data = {
-            'player_name': self.player.name,
-            'health': self.player.health,
-            'inventory': self.player.inventory,
-            'location': self.player.location,
-            'score': self.player.score,
-            'actions_taken': self.actions_taken
-        }
-        
-        filename = f"castle_adventure_{self.player.name.lower()}.json"
-        
         try:
-            with self.GameSaver(filename, game_data) as saver:
+            with self.GameSaver(self._open_journal(), self._save_record()) as saver:
                 print("Saving game data...")
         except Exception as e:
             print(f"Failed to save game: {e}")
+    
+    def _autosave(self) -> None:
+        """Queue a save on the journal's background thread"""
+        try:
+            self._open_journal().append(self._save_record())
+        except OSError as e:
+            print(f"Autosave failed: {e}")
+    
+    @COMMANDS.register("load", aliases=["restore"], args=(0, None), usage="load [name]",
+                       help="Load a saved game (yours unless a name is given)")
+    def _load_game(self, name: Optional[str] = None) -> None:
+        """Rebuild the player and changed rooms from a save journal"""
+        start = time.perf_counter()
+        if name and self.own_saves_only and name.lower() != self.player.name.lower():
+            print("You can only load your own saved game.")
+            return
+        journal = SaveJournal(self._journal_path(name or self.player.name), self.world_name)
+        if self.journal is not None:
+            self.journal.close()  # Its saves are on disk before we read them
+        try:
+            state = journal.load()
+        except ValueError as e:
+            print(f"Cannot load: {e}")
+            return
+        if state is None:
+            print(f"No saved game at {journal.path}")
+            return
+        
+        for field, value in state["player"].items():
+            setattr(self.player, field, value)
+        self.rooms.apply_changes(state["rooms"])
+        self.actions_taken = state["turn"]
+        self.pending_puzzle = None
+        self.journal = journal
+        self._saved_player = {field: state["player"].get(field) for field in PLAYER_FIELDS}
+        self.rooms.take_touched()
+        rooms = PersistentMap.from_items((name, json.dumps(data)) for name, data in state["rooms"].items())
+        self.history.record(self._capture(rooms))
+        
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Loaded {journal.path}: turn {state['turn']}, {len(state['rooms'])} changed rooms "
+              f"({journal.records} journal records, {elapsed:.1f} ms)")
+        self._show_location()
+    
+    def close(self) -> None:
+        """Wait for pending saves and release the journal and the world"""
+        if self.journal is not None:
+            self.journal.close()
+        self.rooms.close()
 
 # =============================================================================
 # MAIN GAME LOOP
 # =============================================================================
 
+def run_script(game: Game, lines) -> List[float]:
+    """Feed command lines to a started game until they run out or the game ends
+
+    Blank lines and lines starting with '#' are skipped; the line after
+    one that sets off a puzzle is its answer.  Returns each command's
+    latency in seconds.
+    """
+    commands = (line.strip() for line in lines)
+    commands = (line for line in commands if line and not line.startswith("#"))
+    
+    latencies = []
+    for command in commands:
+        start = time.perf_counter()
+        game.process_command(command)
+        latencies.append(time.perf_counter() - start)
+        if not game.game_active or not game.player.is_alive or game.has_won():
+            break
+    return latencies
+
+def report_latencies(latencies: List[float], elapsed: float) -> None:
+    """Print commands/sec and latency percentiles to stderr"""
+    ordered = sorted(latencies)
+    if not ordered:
+        print("No commands run", file=sys.stderr)
+        return
+    
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1e6
+    
+    busy = sum(ordered)
+    print(f"{len(ordered)} commands: {len(ordered) / busy:,.0f} commands/s in the engine, "
+          f"{elapsed:.3f} s wall time including game setup", file=sys.stderr)
+    print(f"latency us: mean {busy / len(ordered) * 1e6:.1f}  p50 {percentile(50):.1f}  "
+          f"p95 {percentile(95):.1f}  p99 {percentile(99):.1f}  max {ordered[-1] * 1e6:.1f}", file=sys.stderr)
+
+def print_statistics(game: Game) -> None:
+    """Announce how the game ended"""
+    if game.has_won():
+        print("\n🎉 CONGRATULATIONS! You found the treasure and won the game! 🎉")
+        print(f"Final Score: {game.player.score}")
+    if not game.player.is_alive:
+        print("\n💀 You have died! Game Over!")
+    
+    print(f"\nGame Statistics:")
+    print(f"Final Score: {game.player.score}")
+    print(f"Actions Taken: {game.actions_taken}")
+    print(f"Items Collected: {len(game.player.inventory)}")
+
+def run_scripted(args) -> None:
+    """Play the command script non-interactively and report throughput"""
+    if args.seed is not None:
+        random.seed(args.seed)
+    
+    script = sys.stdin if args.script == "-" else open(args.script)
+    with script:
+        lines = script.readlines()
+    
+    latencies = []
+    output = open(os.devnull, "w") if args.quiet else sys.stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        for _ in range(args.repeat):
+            game = Game(args.world, args.max_rooms, item_delay=0, autosave_every=args.autosave)
+            game.start_game(args.name)
+            latencies += run_script(game, lines)
+            print_statistics(game)
+            game.close()
+    report_latencies(latencies, time.perf_counter() - start)
+
+def finish_metrics(args) -> None:
+    """Flush the event log and dump the latency histograms if asked to"""
+    METRICS.close()
+    if args.stats_out:
+        METRICS.dump(args.stats_out)
+
 def main():
     """Main function to run the game"""
-    game = Game()
+    parser = argparse.ArgumentParser(description="The Mysterious Castle")
+    parser.add_argument("--world", help="castle world file (see castle_world.py)")
+    parser.add_argument("--max-rooms", type=int, default=256,
+                        help="rooms kept in memory before the least recent are written back")
+    parser.add_argument("--script", metavar="FILE",
+                        help="play commands from FILE ('-' for stdin) without prompts or delays, "
+                             "and report commands/sec on stderr")
+    parser.add_argument("--name", default="Tester", help="player name for --script")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable playthroughs")
+    parser.add_argument("--repeat", type=int, default=1, help="play the script this many times")
+    parser.add_argument("--quiet", action="store_true", help="hide game output in --script mode")
+    parser.add_argument("--autosave", type=int, default=0, metavar="N",
+                        help="save in the background every N commands")
+    parser.add_argument("--events", metavar="FILE",
+                        help="append structured events (JSON lines) to FILE")
+    parser.add_argument("--sample", type=int, default=1, metavar="N",
+                        help="keep one event in N in the --events log")
+    parser.add_argument("--stats-out", metavar="FILE",
+                        help="write per-command latency histograms to FILE (JSON) on exit")
+    args = parser.parse_args()
+    
+    if args.events:
+        METRICS.open_sink(args.events, args.sample)
+    if args.script:
+        run_scripted(args)
+        finish_metrics(args)
+        return
+    if args.seed is not None:
+        random.seed(args.seed)
+    
+    game = Game(args.world, args.max_rooms, autosave_every=args.autosave)
     game.start_game()
     
     # Main game loop
     while game.game_active and game.player.is_alive:
         try:
-            command = input("\nWhat would you like to do? ").strip()
+            command = input(game.prompt()).strip()
             game.process_command(command)
             
             # Check for win condition
-            if (game.player.location == "treasure_room" and 
-                "treasure chest" in game.player.inventory):
-                print("\n🎉 CONGRATULATIONS! You found the treasure and won the game! 🎉")
-                print(f"Final Score: {game.player.score}")
+            if game.has_won():
                 break
                 
         except KeyboardInterrupt:
@@ -464,13 +884,9 @@ def main():
             print("\n\nUnexpected end of input. Game over!")
             break
     
-    if not game.player.is_alive:
-        print("\n💀 You have died! Game Over!")
-    
-    print(f"\nGame Statistics:")
-    print(f"Final Score: {game.player.score}")
-    print(f"Actions Taken: {game.actions_taken}")
-    print(f"Items Collected: {len(game.player.inventory)}")
+    print_statistics(game)
+    game.close()
+    finish_metrics(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
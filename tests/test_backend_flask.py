@@ -0,0 +1,124 @@
+import importlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("flask")
+
+from quote_store import QuoteStore, create_store
+
+QUOTES = [(f"Quote number {i}", "Ada" if i % 2 else "Grace", 1.0) for i in range(1, 46)]
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("store") / "quotes.db")
+    create_store(path, QUOTES)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("QUOTES_DB", path)  # Read when backend_flask is imported
+        patch.setenv("QUOTES_CACHE", "1")
+        import backend_flask
+        backend_flask = importlib.reload(backend_flask)
+        yield backend_flask.app.test_client()
+        backend_flask.store.close()
+
+
+@pytest.mark.parametrize("query", ["after=9223372036854775808", "limit=99999999999999999999",
+                                   "after=-1", "after=x"])
+def test_bad_numbers_are_400s(client, query):
+    response = client.get(f"/quotes/list?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_stream_rejects_an_after_too_large_for_sqlite(client):
+    response = client.get(f"/quotes/stream?order=id&after={2**63}")
+    assert response.status_code == 400
+
+
+def test_keyset_pages_cover_every_quote_once(client):
+    seen, after = [], 0
+    while after is not None:
+        page = client.get(f"/quotes/list?after={after}&limit=10").get_json()
+        seen += [quote["id"] for quote in page["results"]]
+        after = page["next"]
+    assert seen == list(range(1, len(QUOTES) + 1))
+
+
+def test_unchanged_quote_comes_back_as_304(client):
+    first = client.get("/quotes/3")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/quotes/3", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+    assert json.loads(first.data)["quote"] == "Quote number 3"
+
+
+def test_weak_etags_match_too(client):
+    etag = client.get("/quotes/4").headers["ETag"]
+    for header in (f"W/{etag}", f'"nope", W/{etag}', "*"):
+        assert client.get("/quotes/4", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/quotes/4", headers={"If-None-Match": 'W/"nope"'}).status_code == 200
+
+
+
+def test_importing_the_app_writes_no_store(tmp_path):
+    path = tmp_path / "quotes.db"
+    subprocess.run([sys.executable, "-c", "import backend_flask"], check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                   env={**os.environ, "QUOTES_DB": str(path)})
+    assert not path.exists()
+
+
+def test_the_first_request_opens_the_store(client, tmp_path, monkeypatch):
+    import backend_flask
+    path = tmp_path / "quotes.db"
+    monkeypatch.setattr(backend_flask, "QUOTES_DB", str(path))
+    monkeypatch.setattr(backend_flask, "store", None)
+    response = client.get("/quotes/1")
+    assert response.status_code == 200 and path.exists()
+    backend_flask.store.close()
+
+
+def test_every_endpoint_returns_quotes_in_one_shape(client):
+    one = client.get("/quotes/5").get_json()
+    listed = client.get("/quotes/list?after=4&limit=1").get_json()["results"]
+    found = client.get("/quotes/search?q=number").get_json()["results"]
+    assert listed == [one]
+    assert one in found
+    assert all(set(quote) == {"quote", "id", "author"} for quote in found)
+
+
+@pytest.fixture
+def zero_weight_store(client, tmp_path, monkeypatch):
+    """A store from before imports checked weights, every one of them zero"""
+    import backend_flask
+    path = str(tmp_path / "zero.db")
+    create_store(path, QUOTES)
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE quotes SET weight = 0")
+    store = QuoteStore(path)
+    monkeypatch.setattr(backend_flask, "store", store)
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("query", ["/quotes?mode=weighted", "/quotes?mode=weighted&n=5",
+                                   "/quotes/stream?mode=weighted&n=5"])
+def test_weighted_draws_without_weights_are_404s(client, zero_weight_store, query):
+    response = client.get(query)
+    assert response.status_code == 404 and "weight" in response.get_json()["error"]
+    assert client.get(query.replace("weighted", "uniform")).status_code == 200
+
+
+def test_requests_do_not_count_the_corpus(client, monkeypatch):
+    import backend_flask
+
+    def count(store):
+        raise AssertionError("len(store) ran a COUNT(*) over every quote")
+
+    monkeypatch.setattr(type(backend_flask.store), "__len__", count)
+    assert client.get("/quotes/1").status_code == 200
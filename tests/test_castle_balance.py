@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import terminal_player_game
+from castle_balance import Settings, engine_tally
+
+
+def test_engine_tally_puts_the_engine_settings_back(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chance, encounters = terminal_player_game.ENCOUNTER_CHANCE, terminal_player_game.ENCOUNTERS
+    random.seed(5)
+    expected = random.random()
+    random.seed(5)
+
+    tally = engine_tally(Settings(0.9, 3.0, 40, 0.5, 30), games=3, seed=1)
+
+    assert tally["outcomes"].sum() == 3
+    assert terminal_player_game.ENCOUNTER_CHANCE == chance
+    assert terminal_player_game.ENCOUNTERS is encounters
+    assert random.random() == expected
@@ -0,0 +1,193 @@
+import contextlib
+import io
+import os
+import random
+import re
+import threading
+
+import pytest
+
+import terminal_player_game
+from terminal_player_game import Game, ItemBag, journal_name
+
+
+def start(name="alice", **kwargs):
+    game = Game(item_delay=0, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.start_game(name)
+    return game
+
+
+def play(game, *commands):
+    """Run commands; returns what they printed"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for command in commands:
+            game.process_command(command)
+    return output.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Save journals land in the working directory
+
+
+# =============================================================================
+# Save names
+# =============================================================================
+
+@pytest.mark.parametrize("name", ["../alice", "a/b", "..", "x" * 200, "Sir Galahad", "..\\evil", "\x00"])
+def test_journal_names_are_plain_file_names(name):
+    file_name = journal_name(name)
+    assert re.fullmatch(r"[a-z0-9_-]{1,64}", file_name)
+    assert file_name != journal_name(name + "!")
+
+
+def test_names_keep_their_spelling_and_save_under_a_safe_file(tmp_path):
+    game = start("Sir Galahad/../x")
+    assert game.player.name == "Sir Galahad/../x"
+    play(game, "save")
+    game.close()
+    saves = [path.name for path in tmp_path.iterdir()]
+    assert len(saves) == 1 and saves[0].startswith("castle_adventure_sir_galahad___")
+
+    again = start("Sir Galahad/../x")
+    assert "Loaded" in play(again, "load")
+    again.close()
+
+
+def test_load_cannot_reach_outside_the_save_directory(tmp_path):
+    (tmp_path.parent / "castle_adventure_x.journal").write_text("not a save")
+    game = start()
+    assert "No saved game" in play(game, "load ../x")
+    game.close()
+
+
+def test_server_games_load_only_their_own_save(tmp_path):
+    bob = start("bob")
+    play(bob, "take key", "save")
+    bob.close()
+    saved = (tmp_path / "castle_adventure_bob.journal").read_bytes()
+
+    alice = start("alice", own_saves_only=True)
+    assert "only load your own" in play(alice, "load bob")
+    assert alice.player.name == "alice"
+    play(alice, "save")
+    alice.close()
+    assert (tmp_path / "castle_adventure_bob.journal").read_bytes() == saved
+
+
+def test_closed_games_leave_no_journal_threads_behind():
+    before = threading.active_count()
+    for i in range(20):
+        game = start(f"player{i}")
+        play(game, "take key", "save", "load", "save")
+        game.close()
+    assert threading.active_count() == before
+
+
+# =============================================================================
+# Inventory
+# =============================================================================
+
+def test_item_bag_keeps_the_order_items_arrived_in():
+    bag = ItemBag(["coin", "key", "coin"])
+    assert list(bag) == ["coin", "key", "coin"]
+    assert bag.count("coin") == 2 and len(bag) == 3
+    bag.remove("coin")  # The first one, like list.remove
+    bag.append("coin")
+    assert list(bag) == ["key", "coin", "coin"]
+    bag.remove("key")
+    assert "key" not in bag and bag.count("key") == 0
+    with pytest.raises(ValueError):
+        bag.remove("key")
+    assert bag == ItemBag(["coin", "coin"])
+
+
+def test_big_item_bags_count_and_keep_order():
+    items = [f"gem {i % 3}" for i in range(12)]
+    bag = ItemBag(items[:5])
+    for item in items[5:]:
+        bag.append(item)
+    assert list(bag) == items and bag.count("gem 0") == 4
+    for _ in range(4):
+        bag.remove("gem 0")
+    assert "gem 0" not in bag and bag.count("gem 0") == 0
+    assert list(bag) == [item for item in items if item != "gem 0"]
+
+
+def test_using_the_key_is_not_a_score_source():
+    game = start()
+    game.player.inventory = ["key"]
+    score = game.player.score
+    play(game, "use key", "use key", "use key")
+    assert game.player.score == score
+    game.close()
+
+
+def test_inventory_lists_items_in_the_order_taken():
+    game = start()
+    game.player.inventory = ["coin", "key", "coin"]
+    assert "coin, key, coin" in play(game, "inventory")
+    game.close()
+
+
+# =============================================================================
+# Undo through a riddle
+# =============================================================================
+
+RIDDLE = "A ghostly figure appears"
+
+
+def riddle_game():
+    """A seeded game whose second command walks into the riddle"""
+    random.seed(1)
+    game = start()
+    assert RIDDLE in play(game, "take key", "n")
+    return game
+
+
+def test_undo_reasks_a_riddle_and_then_steps_back_before_it():
+    game = riddle_game()
+    assert "Correct" in play(game, "echo")
+    orb_score = game.player.score
+
+    output = play(game, "undo")
+    assert RIDDLE in output and game.pending_puzzle == "great_hall"
+    output = play(game, "undo")  # Not taken as the answer
+    assert "Undone (back to turn 1)" in output and "Wrong" not in output
+    assert game.pending_puzzle is None and game.player.location == "entrance"
+    assert "key" in game.player.inventory
+
+    assert RIDDLE in play(game, "redo")
+    assert game.pending_puzzle == "great_hall"
+    play(game, "redo")
+    assert game.pending_puzzle is None and game.player.score == orb_score
+    game.close()
+
+
+def test_rewind_works_while_a_riddle_waits():
+    random.seed(1)
+    game = start()
+    play(game, "snapshot start", "take key", "n")
+    assert "Rewound to 'start'" in play(game, "rewind start")
+    assert game.pending_puzzle is None and "key" not in game.player.inventory
+    game.close()
+
+
+# =============================================================================
+# Routes
+# =============================================================================
+
+def test_games_on_one_world_share_a_route_table(monkeypatch):
+    monkeypatch.setattr(terminal_player_game, "ENCOUNTER_CHANCE", 0)
+    first, second = start("alice"), start("bob")
+    builds = []
+    for game in (first, second):
+        assert RIDDLE in play(game, "goto dungeon")  # The walk stops in the great hall
+        play(game, "echo", "goto dungeon")
+        assert game.player.location == "dungeon"
+        builds.append(game.routes.builds)
+    assert second.routes is first.routes and builds[0] == builds[1]
+    first.close()
+    second.close()
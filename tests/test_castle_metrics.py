@@ -0,0 +1,55 @@
+import json
+import threading
+
+from castle_metrics import MAX_BITS, SUB_BITS, SUB_COUNT, EventSink, LatencyHistogram
+
+
+class FailingOnce:
+    """A file whose first write fails, as on a full disk"""
+
+    def __init__(self, f):
+        self.f = f
+        self.failed = False
+
+    def write(self, text):
+        if not self.failed:
+            self.failed = True
+            raise OSError("No space left on device")
+        return self.f.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def test_a_failed_write_loses_one_batch_not_the_sink(tmp_path, capsys):
+    path = tmp_path / "events.jsonl"
+    sink = EventSink(str(path), batch=2)
+    sink._file = FailingOnce(sink._file)
+    for i in range(6):
+        sink.emit({"i": i})
+
+    flushed = threading.Thread(target=sink.flush, daemon=True)
+    flushed.start()
+    flushed.join(5)
+    assert not flushed.is_alive(), "flush() hung after a failed write"
+    assert sink.dropped == 2 and isinstance(sink.error, OSError)
+
+    sink.emit({"i": 6})
+    sink.close()
+    assert [json.loads(line)["i"] for line in path.read_text().splitlines()] == [2, 3, 4, 5, 6]
+    assert "2 events lost" in capsys.readouterr().err
+
+
+def test_close_stops_the_writer_thread(tmp_path):
+    before = threading.active_count()
+    EventSink(str(tmp_path / "events.jsonl")).close()
+    assert threading.active_count() == before
+
+
+def test_values_clamp_at_the_top_bucket():
+    histogram = LatencyHistogram()
+    top = histogram._highest(len(histogram.counts) - 1)
+    assert top == 2 ** (MAX_BITS - 1) - 1
+    assert len(histogram.counts) == (MAX_BITS - SUB_BITS) * SUB_COUNT
+    histogram.record(10 ** 15)
+    assert histogram.counts[-1] == 1
@@ -0,0 +1,42 @@
+import asyncio
+
+from castle_server import CastleServer
+
+
+async def read_prompt(reader):
+    return (await reader.readuntil(b"> ")).decode()
+
+
+async def two_sessions_named(first, second):
+    castle = CastleServer(verbose=False)
+    server = await asyncio.start_server(castle.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader1, writer1 = await asyncio.open_connection("127.0.0.1", port)
+        await read_prompt(reader1)
+        writer1.write(f"{first}\n".encode())
+        await read_prompt(reader1)
+
+        reader2, writer2 = await asyncio.open_connection("127.0.0.1", port)
+        await read_prompt(reader2)
+        writer2.write(f"{second}\n".encode())
+        reply = await read_prompt(reader2)
+        for writer in (writer1, writer2):
+            writer.close()
+        return reply
+
+
+def test_second_session_with_the_same_name_is_refused():
+    reply = asyncio.run(two_sessions_named("alice", "ALICE"))
+    assert "already in the castle" in reply
+    assert reply.endswith("name> ")
+
+
+def test_sessions_with_different_names_both_play():
+    reply = asyncio.run(two_sessions_named("alice", "bob"))
+    assert "Greetings, bob" in reply
+
+
+def test_empty_names_are_asked_again():
+    reply = asyncio.run(two_sessions_named("alice", ""))
+    assert reply.endswith("name> ") and "Greetings" not in reply
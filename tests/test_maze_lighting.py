@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pytest
+
+import maze_lighting
+from maze_lighting import BakedLighting
+
+
+def baked_files(cache_dir):
+    return sorted(name for _, _, names in os.walk(cache_dir) for name in names)
+
+
+def test_the_cache_key_changes_with_the_format_version(tmp_path, monkeypatch):
+    block = np.ones((4, 4), dtype=bool)
+    old = BakedLighting(cache_dir=str(tmp_path))
+    old.store(block, 0, 0, np.zeros((4, 6), dtype=np.float32))
+    monkeypatch.setattr(maze_lighting, "CACHE_VERSION", maze_lighting.CACHE_VERSION + 1)
+    assert BakedLighting(cache_dir=str(tmp_path)).load(block, 0, 0) is None
+    assert old.load(block, 0, 0) is not None
+
+
+def test_the_cache_stays_under_its_cap_dropping_the_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(maze_lighting, "PRUNE_EVERY", 1)
+    baked = np.zeros((64, 6), dtype=np.float32)  # 1,664 bytes as .npy
+    lighting = BakedLighting(cache_dir=str(tmp_path), max_cache_bytes=5 * 1700)
+    blocks = [np.full((4, 4), i % 2 == 0) for i in range(12)]
+    for x0, block in enumerate(blocks):
+        lighting.store(block, x0, 0, baked)
+        os.utime(lighting._path(block, x0, 0), (x0, x0))  # Stored one second apart
+    assert len(baked_files(tmp_path)) <= 5
+    assert lighting.load(blocks[-1], len(blocks) - 1, 0) is not None
+    assert lighting.load(blocks[0], 0, 0) is None
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+maze_mesh = pytest.importorskip("maze_mesh")
+
+
+@pytest.fixture
+def freed(monkeypatch):
+    keys = []
+    monkeypatch.setattr(maze_mesh.WallMesh, "_free", lambda self, key: keys.append(key))
+    return keys
+
+
+@pytest.mark.parametrize("cell, chunks", [
+    ((5, 5), {(0, 0)}),
+    ((0, 5), {(-1, 0), (0, 0)}),
+    ((31, 31), {(0, 0), (1, 0), (0, 1), (1, 1)}),
+    ((32, 0), {(0, -1), (1, -1), (0, 0), (1, 0)}),
+])
+def test_editing_a_cell_frees_every_chunk_that_reads_it(freed, cell, chunks):
+    maze_mesh.WallMesh(chunk_size=32).invalidate_cell(*cell)
+    assert set(freed) == chunks
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+main = pytest.importorskip("main")
+
+
+def play(game, frames):
+    game.max_frames = frames
+    game.run()
+    return game.player_state()
+
+
+def test_generated_maze_without_seed_records_a_concrete_seed():
+    game = main.MazeGame3D(renderer="raycast", headless=True)
+    game.generate_maze(41, 41)
+    assert isinstance(game.maze_source["seed"], int)
+
+
+def test_replay_of_unseeded_generated_maze_matches_recording(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    recorded = main.MazeGame3D(renderer="raycast", headless=True)
+    recorded.generate_maze(41, 41)
+    recorded.auto_walk = True
+    recorded.start_recording(path)
+    cells = recorded.maze.to_array().copy()
+    final = play(recorded, 120)
+
+    replayed = main.MazeGame3D(renderer="raycast", headless=True)
+    replayed.load_replay(path)
+    assert (replayed.maze.to_array() == cells).all()
+    assert play(replayed, None) == final
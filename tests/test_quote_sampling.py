@@ -0,0 +1,34 @@
+import math
+import random
+
+import pytest
+
+from quote_sampling import AliasSampler, BagState, bag_draw
+
+
+@pytest.mark.parametrize("weights", [[1, math.nan], [math.nan], [1, math.inf], [1, -1], [0, 0], [],
+                                     [1e308, 1e308]])
+def test_alias_sampler_rejects_unusable_weights(weights):
+    with pytest.raises(ValueError):
+        AliasSampler(weights)
+
+
+def test_alias_sampler_never_draws_a_zero_weight():
+    sampler = AliasSampler([0, 3, 0, 1])
+    rng = random.Random(0)
+    draws = [sampler.draw(rng) for _ in range(4000)]
+    assert set(draws) == {1, 3}
+    assert 0.7 < draws.count(1) / len(draws) < 0.8
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 1000])
+def test_a_bag_deals_every_index_once_before_repeating(size):
+    rng = random.Random(size)
+    state, dealt = None, []
+    for _ in range(size):
+        index, state = bag_draw(state, size, rng)
+        dealt.append(index)
+    assert sorted(dealt) == list(range(size))
+    assert BagState.parse(state.token()) == state
+    _, fresh = bag_draw(state, size, rng)
+    assert fresh.position == 1 and fresh.key != state.key  # The next bag is a new one
@@ -0,0 +1,59 @@
+import socket
+import sqlite3
+
+import pytest
+
+pytest.importorskip("werkzeug")
+
+from quote_server import Master
+
+
+class BrokenStore:
+    """A store whose corpus cannot be loaded"""
+    path = "broken.db"
+    max_id = 10
+
+    def weighted_sampler(self):
+        raise sqlite3.DatabaseError("database disk image is malformed")
+
+    def refresh(self):
+        raise sqlite3.DatabaseError("file is not a database")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def master(monkeypatch):
+    listener = socket.socket()
+    master = Master(None, BrokenStore(), listener, workers=2)
+    master.spawned = 0
+
+    def spawn():
+        master.spawned += 1
+
+    monkeypatch.setattr(master, "spawn", spawn)
+    yield master
+    listener.close()
+
+
+def test_a_failed_reload_keeps_the_current_workers(master, capsys):
+    master.workers = {101: 0, 102: 0}
+    master.reload_requested = True
+    master.reload()
+    assert master.spawned == 0 and master.generation == 0
+    assert master.workers == {101: 0, 102: 0}
+    assert not master.reload_requested
+    assert "reload failed" in capsys.readouterr().err
+
+
+def test_an_unreadable_replacement_is_logged_not_fatal(master, capsys):
+    assert master._corpus_replaced() is False
+    assert "cannot read the replaced corpus" in capsys.readouterr().err
+
+
+def test_startup_fails_before_forking(master):
+    with pytest.raises(SystemExit, match="cannot load broken.db"):
+        master.run()
+    assert master.spawned == 0
+    assert master.listener.fileno() == -1
@@ -0,0 +1,55 @@
+import pytest
+
+from quote_store import QuoteStore, create_store, read_quotes
+
+
+@pytest.mark.parametrize("weight", ["-1", "nan", "inf", "-inf"])
+def test_import_rejects_bad_weights_with_the_line(tmp_path, weight):
+    source = tmp_path / "quotes.txt"
+    source.write_text(f"Fine\tAda\t2\nBad\tGrace\t{weight}\n", encoding="utf-8")
+    with pytest.raises(ValueError, match=r"quotes\.txt:2:"):
+        list(read_quotes(str(source)))
+
+
+@pytest.mark.parametrize("weight", [-0.5, float("nan"), float("inf")])
+def test_create_store_rejects_bad_weights_and_leaves_no_file(tmp_path, weight):
+    path = tmp_path / "quotes.db"
+    with pytest.raises(ValueError, match="row 2"):
+        create_store(str(path), [("Fine", "Ada", 1.0), ("Bad", "Grace", weight)])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_weighted_draws_use_stored_weights(tmp_path):
+    path = str(tmp_path / "quotes.db")
+    create_store(path, [("Never", "", 0.0), ("Always", ""), ("Never either", "", 0)])
+    store = QuoteStore(path)
+    assert {store.weighted_id() for _ in range(50)} == {2}
+    store.close()
+
+
+def test_a_failing_source_leaves_no_files(tmp_path):
+    source = tmp_path / "quotes.txt"
+    source.write_text("Fine\tAda\nBroken\tGrace\tmany\n", encoding="utf-8")
+    store = tmp_path / "store" / "quotes.db"
+    store.parent.mkdir()
+    with pytest.raises(ValueError, match=r"quotes\.txt:2:"):
+        create_store(str(store), read_quotes(str(source)))
+    assert list(store.parent.iterdir()) == []
+
+
+def test_create_store_rejects_weights_that_add_up_to_zero(tmp_path):
+    path = tmp_path / "quotes.db"
+    with pytest.raises(ValueError, match="above zero"):
+        create_store(str(path), [("Never", "", 0), ("Nor this", "", 0.0)])
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_store_without_a_check_interval_never_refreshes(tmp_path):
+    path = str(tmp_path / "quotes.db")
+    create_store(path, [("One", "")])
+    watching, pinned = QuoteStore(path, check_interval=0), QuoteStore(path, check_interval=None)
+    create_store(path, [("One", ""), ("Two", "")])
+    assert watching.refresh() and watching.max_id == 2
+    assert not pinned.refresh() and pinned.max_id == 1
+    watching.close()
+    pinned.close()